@@ -1,13 +1,35 @@
 # folder_analyzer.py
 
+import sys
+
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    # Modo sin interfaz: se resuelve antes de importar tkinter y pyperclip.
+    from folder_analyzer_core import cli_main
+    sys.exit(cli_main(sys.argv[1:]))
+
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk # messagebox se mantiene para errores y confirmaciones
+from tkinter import font as tkfont
 import os
 import threading
 from datetime import datetime
 import pyperclip 
 import json
 import time
+import shutil
+import tempfile
+from folder_analyzer_core import (FolderAnalysisEngine, AnalysisOptions, AnalysisCancelled, NoFilesToAnalyze, GitError, ArchiveError, DaemonError,
+                                  ARCHIVE_EXTENSIONS, is_archive_path, create_report_spool,
+                                  ShardedReportOutput, compression_from_path, copy_report_sections, ReportPager, RenderCache, format_scan_errors, format_stalled_reads, AnalysisProfile, AnalysisIndex, DEFAULT_READ_WORKERS, DEFAULT_SCAN_WORKERS, DEFAULT_READ_TIMEOUT_SECONDS, DEFAULT_MAX_FILE_BYTES,
+                                  DEFAULT_MAX_TOTAL_BYTES)
+from folder_analyzer_watch import LiveReport, create_watcher
+from folder_analyzer_daemon import DaemonClient, DaemonUnavailable
+
+PROGRESS_POLL_MS = 100
+CONFIG_SAVE_DELAY_MS = 500 # los cambios de configuración se agrupan y se escriben tras esta pausa
+PREVIEW_MAX_LINE_CHARS = 2000 # las líneas más largas se recortan al mostrarlas (Tk se vuelve lento)
+PREVIEW_SEARCH_DELAY_MS = 250
+CONFIRM_ABOVE_DEFAULT_MB = 100 # por encima de este tamaño estimado se pregunta antes de generar el reporte
 
 class FolderAnalyzer:
     def __init__(self, root):
@@ -27,20 +49,33 @@ class FolderAnalyzer:
         self.selected_folder = tk.StringVar()
         self.output_location = tk.StringVar()
         self.progress_var = tk.DoubleVar()
-        self.analysis_result = ""
+        self.analysis_result = None # Reporte en un archivo temporal (en memoria si es pequeño)
+        self.analysis_index_path = None # Índice SQLite temporal del último análisis (opcional)
+        self.analyzed_folder = None # Carpeta del último análisis (la seleccionada puede cambiar después)
         self.ignored_items = set()
         self.config_file = os.path.join(os.path.expanduser("~"), ".folder_analyzer_config_v3.json")
+        self.config_save_job = None
+        self.pending_config = None # Última configuración pendiente de escribir por el hilo de guardado
+        self.config_writer_thread = None
+        self.config_write_lock = threading.Lock()
 
-        self.supported_extensions = {
-            '.py', '.js', '.jsx', '.ts', '.tsx', '.html', '.htm', '.css', '.scss', '.sass',
-            '.json', '.xml', '.yaml', '.yml', '.md', '.txt', '.csv', '.sql', '.php',
-            '.java', '.c', '.cpp', '.h', '.cs', '.rb', '.go', '.rs', '.swift', '.kt',
-            '.vue', '.svelte', '.r', '.m', '.sh', '.bat', '.ps1', '.dockerfile'
-        }
+        self.engine = None
+        self.local_engine = None # motor de respaldo cuando se pide el análisis al servicio local
+        self.last_profile = None # Perfil del último análisis (si se activó la medición de tiempos)
+        self.live_report = None # Reporte que se actualiza mientras se vigila la carpeta
+        self.watcher = None
+        self.report_lock = threading.Lock()
+        self.preview_pager = None # Índice de líneas del reporte para la vista previa (se crea al abrirla)
+        self.preview_generation = 0 # Invalida indexaciones y búsquedas en curso de la vista previa
+        self.preview_top = 0
+        self.preview_match = None # (línea, columna) de la coincidencia resaltada
+        self.preview_section_index = -1
+        self.preview_search_job = None
 
         self.last_analysis_timestamp = None
         self.timer_label_var = tk.StringVar(value="Último análisis: N/A")
         self.timer_update_job = None
+        self.progress_poll_job = None
 
         self.persist_selected_folder_var = tk.BooleanVar(value=True)
         self.persist_output_location_var = tk.BooleanVar(value=True)
@@ -50,6 +85,23 @@ class FolderAnalyzer:
         self.show_empty_files_var = tk.BooleanVar(value=False)
         self.add_line_numbers_var = tk.BooleanVar(value=False)
         self.show_directory_first_var = tk.BooleanVar(value=True)
+        self.read_workers_var = tk.IntVar(value=DEFAULT_READ_WORKERS)
+        self.scan_workers_var = tk.IntVar(value=DEFAULT_SCAN_WORKERS)
+        self.read_timeout_var = tk.IntVar(value=DEFAULT_READ_TIMEOUT_SECONDS)
+        self.use_gitignore_var = tk.BooleanVar(value=False)
+        self.use_cache_var = tk.BooleanVar(value=False)
+        self.watch_var = tk.BooleanVar(value=False)
+        self.skip_binary_var = tk.BooleanVar(value=False)
+        self.profile_var = tk.BooleanVar(value=False)
+        self.dedupe_var = tk.BooleanVar(value=False)
+        self.build_index_var = tk.BooleanVar(value=False)
+        self.git_files_var = tk.BooleanVar(value=False)
+        self.changed_since_var = tk.StringVar()
+        self.max_file_kb_var = tk.IntVar(value=DEFAULT_MAX_FILE_BYTES // 1024)
+        self.max_total_mb_var = tk.IntVar(value=DEFAULT_MAX_TOTAL_BYTES // (1024 * 1024))
+        self.confirm_above_mb_var = tk.IntVar(value=CONFIRM_ABOVE_DEFAULT_MB)
+        self.shard_kb_var = tk.IntVar(value=0)
+        self.use_daemon_var = tk.BooleanVar(value=False)
 
         self.setup_styles()
         self.setup_ui() 
@@ -64,6 +116,23 @@ class FolderAnalyzer:
         self.show_empty_files_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
         self.add_line_numbers_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
         self.show_directory_first_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.read_workers_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.scan_workers_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.read_timeout_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.use_gitignore_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.use_cache_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.watch_var.trace_add("write", self.on_watch_change)
+        self.skip_binary_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.profile_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.dedupe_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.build_index_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.git_files_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.changed_since_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.max_file_kb_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.max_total_mb_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.confirm_above_mb_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.shard_kb_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
+        self.use_daemon_var.trace_add("write", lambda *a: self.save_config_if_not_loading())
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
@@ -98,8 +167,17 @@ class FolderAnalyzer:
 
     def on_closing(self):
         if self.timer_update_job: self.root.after_cancel(self.timer_update_job)
+        self.stop_polling_progress()
         if self._notification_job: self.root.after_cancel(self._notification_job)
-        self.save_config(); self.root.destroy()
+        self.flush_config()
+        if self.config_writer_thread is not None: self.config_writer_thread.join(timeout=5)
+        self.discard_analysis_result(); self.root.destroy()
+
+    def on_watch_change(self, *a):
+        self.save_config_if_not_loading()
+        if not self.watch_var.get(): self.stop_watching()
+        elif self.analysis_result is not None and self.watcher is None and str(self.analyze_btn['state']) != 'disabled':
+            threading.Thread(target=self.start_watching, args=(self.analyzed_folder,), daemon=True).start()
 
     def on_selected_folder_change(self, *a):
         if not self.loading_config and self.persist_selected_folder_var.get(): self.save_config()
@@ -146,7 +224,10 @@ class FolderAnalyzer:
         persist_selected_cb.grid(row=0, column=2, padx=(0,3), pady=(10,8), sticky=tk.W)
         self.create_tooltip(persist_selected_cb, "Persistir esta ruta")
         browse_folder_btn = ttk.Button(paths_frame, text="📂 Examinar", command=self.browse_folder, compound=tk.LEFT)
-        browse_folder_btn.grid(row=0, column=3, pady=(10,8), padx=(0,10))
+        browse_folder_btn.grid(row=0, column=3, pady=(10,8), padx=(0,3))
+        browse_archive_btn = ttk.Button(paths_frame, text="🗜", width=3, command=self.browse_archive)
+        browse_archive_btn.grid(row=0, column=4, pady=(10,8), padx=(0,10))
+        self.create_tooltip(browse_archive_btn, "Analizar un archivo .zip o .tar (sin extraerlo)")
 
         ttk.Label(paths_frame, text="Guardar resultado en:").grid(row=1, column=0, sticky=tk.W, pady=(8,10), padx=10)
         output_entry = ttk.Entry(paths_frame, textvariable=self.output_location, width=60)
@@ -192,7 +273,7 @@ class FolderAnalyzer:
         remove_btn.pack(side=tk.LEFT, padx=(0,5))
         clear_btn = ttk.Button(ignore_list_buttons_frame, text="Limpiar", command=self.clear_ignore_list)
         clear_btn.pack(side=tk.LEFT)
-        format_info_label = ttk.Label(ignore_list_buttons_frame, text=" (ej: nombre.ext, carpeta/)", font=self.font_small_italic)
+        format_info_label = ttk.Label(ignore_list_buttons_frame, text=" (ej: nombre.ext, carpeta/, *.min.js, **/build*/, !conservar.py)", font=self.font_small_italic)
         format_info_label.pack(side=tk.LEFT, padx=(10,0), pady=(2,0))
 
         ttk.Separator(main_content_frame, orient='horizontal').pack(fill='x', pady=20, padx=5)
@@ -218,7 +299,12 @@ class FolderAnalyzer:
         self.save_btn = ttk.Button(buttons_control_frame, text="💾 Guardar", command=self.save_analysis, state='disabled', compound=tk.LEFT)
         self.save_btn.pack(side=tk.LEFT, padx=(0,8))
         self.copy_btn = ttk.Button(buttons_control_frame, text="📋 Copiar", command=self.copy_to_clipboard, state='disabled', compound=tk.LEFT)
-        self.copy_btn.pack(side=tk.LEFT)
+        self.copy_btn.pack(side=tk.LEFT, padx=(0,8))
+        self.profile_btn = ttk.Button(buttons_control_frame, text="📊 Perfil", command=self.show_profile, state='disabled', compound=tk.LEFT)
+        self.profile_btn.pack(side=tk.LEFT)
+        watch_check = ttk.Checkbutton(buttons_control_frame, text="👁 Vigilar cambios", variable=self.watch_var)
+        watch_check.pack(side=tk.LEFT, padx=(25,0))
+        self.create_tooltip(watch_check, "Después del análisis, actualiza el reporte automáticamente\ncuando cambian archivos de la carpeta.")
 
         def _on_mousewheel_scroll(event, scroll_canvas):
             direction = 0
@@ -231,6 +317,49 @@ class FolderAnalyzer:
             widget_to_bind.bind("<Button-5>", lambda e, c=canvas: _on_mousewheel_scroll(e, c))
         scrollable_frame.bind("<Enter>", lambda e: canvas.focus_set())
 
+        self.tab_preview = ttk.Frame(self.notebook, padding="10", style='Background.TFrame')
+        self.notebook.add(self.tab_preview, text=' Vista previa ')
+        preview_bar = ttk.Frame(self.tab_preview, style='Background.TFrame')
+        preview_bar.pack(fill='x', pady=(0,8))
+        ttk.Label(preview_bar, text="Ir a archivo:").pack(side=tk.LEFT, padx=(0,6))
+        self.preview_goto_entry = ttk.Entry(preview_bar, width=28)
+        self.preview_goto_entry.pack(side=tk.LEFT, padx=(0,15))
+        self.preview_goto_entry.bind("<Return>", lambda e: self.preview_goto_section())
+        self.create_tooltip(self.preview_goto_entry, "Parte de la ruta del archivo. Enter salta a la siguiente coincidencia.")
+        ttk.Label(preview_bar, text="Buscar:").pack(side=tk.LEFT, padx=(0,6))
+        self.preview_search_entry = ttk.Entry(preview_bar, width=28)
+        self.preview_search_entry.pack(side=tk.LEFT)
+        self.preview_search_entry.bind("<KeyRelease>", self.on_preview_search_key)
+        self.preview_search_entry.bind("<Return>", lambda e: self.preview_search())
+        self.preview_search_entry.bind("<Shift-Return>", lambda e: self.preview_search(backwards=True))
+        self.create_tooltip(self.preview_search_entry, "Busca mientras se escribe. Enter: siguiente, Shift+Enter: anterior.")
+        self.preview_status_label = ttk.Label(preview_bar, text="", font=self.font_small)
+        self.preview_status_label.pack(side=tk.RIGHT)
+        preview_frame = ttk.Frame(self.tab_preview)
+        preview_frame.pack(expand=True, fill='both')
+        preview_frame.columnconfigure(0, weight=1); preview_frame.rowconfigure(0, weight=1)
+        # El Text solo contiene las líneas visibles: la barra de desplazamiento representa el reporte
+        # completo y cada movimiento vuelve a pedir al índice la ventana que corresponde.
+        self.preview_text = tk.Text(preview_frame, wrap=tk.NONE, font=self.font_timer, relief='solid', borderwidth=1)
+        self.preview_text.grid(row=0, column=0, sticky="nsew")
+        self.preview_text.tag_configure("match", background="#FFE066")
+        self.preview_line_height = tkfont.Font(font=self.font_timer).metrics('linespace')
+        self.preview_scrollbar = ttk.Scrollbar(preview_frame, orient="vertical", command=self.on_preview_scroll)
+        self.preview_scrollbar.grid(row=0, column=1, sticky="ns")
+        preview_xscrollbar = ttk.Scrollbar(preview_frame, orient="horizontal", command=self.preview_text.xview)
+        preview_xscrollbar.grid(row=1, column=0, sticky="ew")
+        self.preview_text.configure(xscrollcommand=preview_xscrollbar.set, state='disabled')
+        self.preview_text.bind("<Configure>", lambda e: self.render_preview())
+        self.preview_text.bind("<MouseWheel>", lambda e: self.scroll_preview(-3 if e.delta > 0 else 3))
+        self.preview_text.bind("<Button-4>", lambda e: self.scroll_preview(-3))
+        self.preview_text.bind("<Button-5>", lambda e: self.scroll_preview(3))
+        for key, rows in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "-page"), ("<Next>", "page")):
+            self.preview_text.bind(key, lambda e, rows=rows: self.scroll_preview(rows))
+        self.preview_text.bind("<Control-Home>", lambda e: self.scroll_preview(-self.preview_top))
+        self.preview_text.bind("<Control-End>", lambda e: self.scroll_preview(self.preview_pager.total_lines if self.preview_pager else 0))
+        self.preview_text.bind("<Button-1>", lambda e: self.preview_text.focus_set())
+        self.notebook.bind("<<NotebookTabChanged>>", lambda e: self.refresh_preview())
+
         tab_opciones = ttk.Frame(self.notebook, padding="20", style='Background.TFrame')
         self.notebook.add(tab_opciones, text=' Opciones ')
         options_analysis_frame = ttk.LabelFrame(tab_opciones, text="Configuración del Análisis")
@@ -243,8 +372,69 @@ class FolderAnalyzer:
         line_numbers_check.grid(row=2, column=0, sticky=tk.W, pady=6, padx=10)
         directory_first_check = ttk.Checkbutton(options_analysis_frame, text="Mostrar directorio de archivos al inicio del reporte", variable=self.show_directory_first_var)
         directory_first_check.grid(row=3, column=0, sticky=tk.W, pady=6, padx=10)
+        gitignore_check = ttk.Checkbutton(options_analysis_frame, text="Respetar archivos .gitignore de la carpeta", variable=self.use_gitignore_var)
+        gitignore_check.grid(row=4, column=0, sticky=tk.W, pady=6, padx=10)
+        cache_check = ttk.Checkbutton(options_analysis_frame, text="Reutilizar archivos sin cambios (caché incremental)", variable=self.use_cache_var)
+        cache_check.grid(row=5, column=0, sticky=tk.W, pady=6, padx=10)
+        workers_frame = ttk.Frame(options_analysis_frame, style='Background.TFrame')
+        workers_frame.grid(row=6, column=0, sticky=tk.W, pady=6, padx=10)
+        ttk.Label(workers_frame, text="Hilos de lectura de archivos:").pack(side=tk.LEFT, padx=(0,8))
+        workers_spinbox = ttk.Spinbox(workers_frame, from_=1, to=64, width=5, textvariable=self.read_workers_var)
+        workers_spinbox.pack(side=tk.LEFT)
+        self.create_tooltip(workers_spinbox, "Lecturas simultáneas. Valores altos ayudan en unidades de red; 1 = lectura secuencial.")
+        ttk.Label(workers_frame, text="Carpetas listadas a la vez:").pack(side=tk.LEFT, padx=(20,8))
+        scan_workers_spinbox = ttk.Spinbox(workers_frame, from_=1, to=64, width=5, textvariable=self.scan_workers_var)
+        scan_workers_spinbox.pack(side=tk.LEFT)
+        self.create_tooltip(scan_workers_spinbox, "Acelera el escaneo de carpetas en unidades de red (NFS, SMB),\ndonde cada listado espera al servidor. 1 = recorrido secuencial.")
+        ttk.Label(workers_frame, text="Plazo por lectura (s):").pack(side=tk.LEFT, padx=(20,8))
+        read_timeout_spinbox = ttk.Spinbox(workers_frame, from_=0, to=3600, increment=10, width=5, textvariable=self.read_timeout_var)
+        read_timeout_spinbox.pack(side=tk.LEFT)
+        self.create_tooltip(read_timeout_spinbox, "Un archivo cuya lectura no termina en este plazo (unidad de red caída) se omite\ncon una marca en el reporte y el análisis continúa. 0 = sin plazo.")
+        binary_check = ttk.Checkbutton(options_analysis_frame, text="Omitir archivos binarios", variable=self.skip_binary_var)
+        binary_check.grid(row=7, column=0, sticky=tk.W, pady=6, padx=10)
+        limits_frame = ttk.Frame(options_analysis_frame, style='Background.TFrame')
+        limits_frame.grid(row=8, column=0, sticky=tk.W, pady=6, padx=10)
+        ttk.Label(limits_frame, text="Tamaño máximo por archivo (KB):").pack(side=tk.LEFT, padx=(0,8))
+        max_file_spinbox = ttk.Spinbox(limits_frame, from_=0, to=1048576, increment=256, width=8, textvariable=self.max_file_kb_var)
+        max_file_spinbox.pack(side=tk.LEFT, padx=(0,20))
+        self.create_tooltip(max_file_spinbox, "Los archivos más grandes se recortan mostrando su inicio y final. 0 = sin límite.")
+        ttk.Label(limits_frame, text="Límite total (MB):").pack(side=tk.LEFT, padx=(0,8))
+        max_total_spinbox = ttk.Spinbox(limits_frame, from_=0, to=102400, increment=10, width=8, textvariable=self.max_total_mb_var)
+        max_total_spinbox.pack(side=tk.LEFT, padx=(0,20))
+        self.create_tooltip(max_total_spinbox, "Contenido máximo del reporte; los archivos que ya no entran se omiten. 0 = sin límite.")
+        ttk.Label(limits_frame, text="Confirmar si supera (MB):").pack(side=tk.LEFT, padx=(0,8))
+        confirm_above_spinbox = ttk.Spinbox(limits_frame, from_=0, to=102400, increment=10, width=8, textvariable=self.confirm_above_mb_var)
+        confirm_above_spinbox.pack(side=tk.LEFT)
+        self.create_tooltip(confirm_above_spinbox, "Tras el escaneo se estima el tamaño del reporte. Si supera este valor, se muestran\nlos archivos y carpetas que más aportan y se pregunta si generarlo completo,\nlimitado a este tamaño o cancelarlo. 0 = no preguntar.")
         options_info_label = ttk.Label(options_analysis_frame, text="\nNota: Estas opciones se guardan automáticamente.", font=self.font_small_italic)
-        options_info_label.grid(row=4, column=0, sticky=tk.W, pady=(15,5), padx=10)
+        dedupe_check = ttk.Checkbutton(options_analysis_frame, text="Mostrar una sola vez el contenido de archivos idénticos", variable=self.dedupe_var)
+        dedupe_check.grid(row=9, column=0, sticky=tk.W, pady=6, padx=10)
+        self.create_tooltip(dedupe_check, "Los archivos con el mismo contenido que uno anterior (LICENSE, __init__.py, copias)\nse muestran como una referencia a la primera aparición.")
+        index_check = ttk.Checkbutton(options_analysis_frame, text="Generar también un índice SQLite con búsqueda de texto completo", variable=self.build_index_var)
+        index_check.grid(row=10, column=0, sticky=tk.W, pady=6, padx=10)
+        self.create_tooltip(index_check, "Al guardar, elija el tipo \"Índice SQLite\" para obtener una base con una fila por archivo\n(ruta, lenguaje, tamaño, líneas, contenido) que se puede consultar sin volver a analizar.")
+        profile_check = ttk.Checkbutton(options_analysis_frame, text="Medir tiempos por fase (perfil del análisis)", variable=self.profile_var)
+        profile_check.grid(row=11, column=0, sticky=tk.W, pady=6, padx=10)
+        self.create_tooltip(profile_check, "Registra el tiempo de cada fase y los archivos y carpetas más lentos.\nSe consulta con el botón \"📊 Perfil\" al terminar.")
+        git_frame = ttk.Frame(options_analysis_frame, style='Background.TFrame')
+        git_frame.grid(row=12, column=0, sticky=tk.W, pady=6, padx=10)
+        git_check = ttk.Checkbutton(git_frame, text="Solo archivos seguidos por git", variable=self.git_files_var)
+        git_check.pack(side=tk.LEFT, padx=(0,20))
+        self.create_tooltip(git_check, "Lista los archivos con git en lugar de recorrer la carpeta:\nse omiten compilados y archivos sin seguir.")
+        ttk.Label(git_frame, text="Solo cambios desde (commit/rama):").pack(side=tk.LEFT, padx=(0,8))
+        changed_since_entry = ttk.Entry(git_frame, textvariable=self.changed_since_var, width=18)
+        changed_since_entry.pack(side=tk.LEFT)
+        self.create_tooltip(changed_since_entry, "Ej: main, HEAD~3. Analiza solo los archivos modificados respecto de esa\nreferencia y los nuevos sin seguir. Vacío = todos los archivos.")
+        shard_frame = ttk.Frame(options_analysis_frame, style='Background.TFrame')
+        shard_frame.grid(row=13, column=0, sticky=tk.W, pady=6, padx=10)
+        ttk.Label(shard_frame, text="Al guardar, dividir en partes de (KB):").pack(side=tk.LEFT, padx=(0,8))
+        shard_spinbox = ttk.Spinbox(shard_frame, from_=0, to=1048576, increment=256, width=8, textvariable=self.shard_kb_var)
+        shard_spinbox.pack(side=tk.LEFT)
+        self.create_tooltip(shard_spinbox, "Cada parte contiene archivos completos y se guarda un manifiesto JSON\ncon los archivos de cada parte. 0 = un solo archivo.\nPara comprimir, elija .txt.gz o .txt.xz en el diálogo de guardado.")
+        daemon_check = ttk.Checkbutton(options_analysis_frame, text="Pedir el análisis al servicio local (folder_analyzer_daemon.py)", variable=self.use_daemon_var)
+        daemon_check.grid(row=14, column=0, sticky=tk.W, pady=6, padx=10)
+        self.create_tooltip(daemon_check, "El servicio mantiene en memoria los listados y las secciones de las carpetas ya analizadas:\nrepetir un análisis solo relee los archivos modificados. Si no está en ejecución,\nse analiza en esta ventana. No se usa al generar un índice SQLite.")
+        options_info_label.grid(row=15, column=0, sticky=tk.W, pady=(15,5), padx=10)
         
         self.notification_label = ttk.Label(self.root, text="", style='Notification.TLabel', anchor='center')
 
@@ -366,20 +556,75 @@ class FolderAnalyzer:
             if self.persist_ignored_items_var.get(): self.save_config()
 
     def save_config(self):
+        # Escritura diferida: cada cambio (una tecla en la ruta, una casilla, un ignorado) solo
+        # reprograma el guardado, que ocurre una vez pasada la ráfaga de cambios.
+        if self.loading_config: return
+        if self.config_save_job: self.root.after_cancel(self.config_save_job)
+        self.config_save_job = self.root.after(CONFIG_SAVE_DELAY_MS, self.flush_config)
+
+    def flush_config(self):
+        # Las variables de Tk se leen en este hilo; el archivo se escribe en otro para que un
+        # directorio personal lento (perfiles móviles, NFS) no congele la interfaz.
+        if self.config_save_job: self.root.after_cancel(self.config_save_job)
+        self.config_save_job = None
         if self.loading_config: return
+        try: config = self.collect_config()
+        except Exception as e: print(f"Error al guardar configuración: {e}"); return
+        with self.config_write_lock:
+            self.pending_config = config
+            if self.config_writer_thread is None:
+                self.config_writer_thread = threading.Thread(target=self._config_writer, daemon=True)
+                self.config_writer_thread.start()
+
+    def _config_writer(self):
+        while True:
+            with self.config_write_lock:
+                config, self.pending_config = self.pending_config, None
+                if config is None: self.config_writer_thread = None; return
+            try: self._write_config_file(self.config_file, config)
+            except Exception as e: print(f"Error al guardar configuración: {e}")
+
+    @staticmethod
+    def _write_config_file(path, config):
+        # Temporal en la misma carpeta y renombrado: un corte a mitad de escritura no deja un JSON roto.
+        tmp_path = f"{path}.tmp{os.getpid()}"
         try:
-            config = {"persist_selected_folder": self.persist_selected_folder_var.get(),
-                      "persist_output_location": self.persist_output_location_var.get(),
-                      "persist_ignored_items": self.persist_ignored_items_var.get(),
-                      "include_subdirs": self.include_subdirs_var.get(),
-                      "show_empty_files": self.show_empty_files_var.get(),
-                      "add_line_numbers": self.add_line_numbers_var.get(),
-                      "show_directory_first": self.show_directory_first_var.get()}
-            if config["persist_selected_folder"]: config["last_selected_folder"] = self.selected_folder.get()
-            if config["persist_output_location"]: config["last_output_location"] = self.output_location.get()
-            if config["persist_ignored_items"]: config["ignored_items"] = list(self.ignored_items)
-            with open(self.config_file, 'w', encoding='utf-8') as f: json.dump(config, f, indent=4)
-        except Exception as e: print(f"Error al guardar configuración: {e}")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False, separators=(",", ":")); f.flush(); os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+
+    def collect_config(self):
+        config = {"persist_selected_folder": self.persist_selected_folder_var.get(),
+                  "persist_output_location": self.persist_output_location_var.get(),
+                  "persist_ignored_items": self.persist_ignored_items_var.get(),
+                  "include_subdirs": self.include_subdirs_var.get(),
+                  "show_empty_files": self.show_empty_files_var.get(),
+                  "add_line_numbers": self.add_line_numbers_var.get(),
+                  "show_directory_first": self.show_directory_first_var.get(),
+                  "read_workers": self.get_read_workers(),
+                  "scan_workers": self.get_scan_workers(),
+                  "read_timeout": self.get_spinbox_value(self.read_timeout_var, DEFAULT_READ_TIMEOUT_SECONDS),
+                  "use_gitignore": self.use_gitignore_var.get(),
+                  "use_cache": self.use_cache_var.get(),
+                  "watch_changes": self.watch_var.get(),
+                  "skip_binary": self.skip_binary_var.get(),
+                  "profile_analysis": self.profile_var.get(),
+                  "dedupe_identical": self.dedupe_var.get(),
+                  "build_index": self.build_index_var.get(),
+                  "git_files": self.git_files_var.get(),
+                  "changed_since": self.changed_since_var.get(),
+                  "max_file_kb": self.get_spinbox_value(self.max_file_kb_var, DEFAULT_MAX_FILE_BYTES // 1024),
+                  "max_total_mb": self.get_spinbox_value(self.max_total_mb_var, DEFAULT_MAX_TOTAL_BYTES // (1024 * 1024)),
+                  "confirm_above_mb": self.get_spinbox_value(self.confirm_above_mb_var, CONFIRM_ABOVE_DEFAULT_MB),
+                  "shard_kb": self.get_spinbox_value(self.shard_kb_var, 0),
+                  "use_daemon": self.use_daemon_var.get()}
+        if config["persist_selected_folder"]: config["last_selected_folder"] = self.selected_folder.get()
+        if config["persist_output_location"]: config["last_output_location"] = self.output_location.get()
+        if config["persist_ignored_items"]: config["ignored_items"] = list(self.ignored_listbox.get(0, tk.END))
+        return config
 
     def load_config(self):
         self.loading_config = True
@@ -395,14 +640,32 @@ class FolderAnalyzer:
                 self.output_location.set(config.get("last_output_location", default_output) if self.persist_output_location_var.get() else default_output)
                 if self.persist_ignored_items_var.get():
                     self.ignored_items.clear(); self.ignored_listbox.delete(0, tk.END)
-                    for item in config.get("ignored_items", []):
-                        if item not in self.ignored_items: self.ignored_items.add(item); self.ignored_listbox.insert(tk.END, item)
+                    items = list(dict.fromkeys(config.get("ignored_items", [])))
+                    self.ignored_items.update(items)
+                    if items: self.ignored_listbox.insert(tk.END, *items) # una sola llamada a Tk para toda la lista
                 else: 
                     self.ignored_items.clear(); self.ignored_listbox.delete(0, tk.END)
                 self.include_subdirs_var.set(config.get("include_subdirs", True))
                 self.show_empty_files_var.set(config.get("show_empty_files", False))
                 self.add_line_numbers_var.set(config.get("add_line_numbers", False))
                 self.show_directory_first_var.set(config.get("show_directory_first", True))
+                self.read_workers_var.set(config.get("read_workers", DEFAULT_READ_WORKERS))
+                self.scan_workers_var.set(config.get("scan_workers", DEFAULT_SCAN_WORKERS))
+                self.read_timeout_var.set(config.get("read_timeout", DEFAULT_READ_TIMEOUT_SECONDS))
+                self.use_gitignore_var.set(config.get("use_gitignore", False))
+                self.use_cache_var.set(config.get("use_cache", False))
+                self.watch_var.set(config.get("watch_changes", False))
+                self.skip_binary_var.set(config.get("skip_binary", False))
+                self.profile_var.set(config.get("profile_analysis", False))
+                self.dedupe_var.set(config.get("dedupe_identical", False))
+                self.build_index_var.set(config.get("build_index", False))
+                self.git_files_var.set(config.get("git_files", False))
+                self.changed_since_var.set(config.get("changed_since", ""))
+                self.max_file_kb_var.set(config.get("max_file_kb", DEFAULT_MAX_FILE_BYTES // 1024))
+                self.max_total_mb_var.set(config.get("max_total_mb", DEFAULT_MAX_TOTAL_BYTES // (1024 * 1024)))
+                self.confirm_above_mb_var.set(config.get("confirm_above_mb", CONFIRM_ABOVE_DEFAULT_MB))
+                self.shard_kb_var.set(config.get("shard_kb", 0))
+                self.use_daemon_var.set(config.get("use_daemon", False))
             else: 
                 self.selected_folder.set("")
                 self.output_location.set(default_output)
@@ -418,6 +681,11 @@ class FolderAnalyzer:
         f = filedialog.askdirectory(title="Seleccionar carpeta para analizar")
         if f: self.selected_folder.set(f)
 
+    def browse_archive(self):
+        f = filedialog.askopenfilename(title="Seleccionar archivo comprimido para analizar",
+                                       filetypes=[("Archivos comprimidos", " ".join("*" + ext for ext in ARCHIVE_EXTENSIONS)), ("Todos los archivos", "*.*")])
+        if f: self.selected_folder.set(f)
+
     def browse_output(self):
         f = filedialog.askdirectory(title="Seleccionar carpeta para guardar el resultado")
         if f: self.output_location.set(f)
@@ -426,132 +694,276 @@ class FolderAnalyzer:
         if not self.selected_folder.get(): 
             self.show_notification("Seleccione una carpeta para analizar.", msg_type="error")
             return
-        if not os.path.isdir(self.selected_folder.get()): 
+        if not os.path.isdir(self.selected_folder.get()) and not is_archive_path(self.selected_folder.get()): 
             self.show_notification("Ruta de carpeta a analizar inválida.", msg_type="error")
             return
+        if is_archive_path(self.selected_folder.get()) and (self.git_files_var.get() or self.changed_since_var.get().strip()):
+            self.show_notification("Las opciones de git no se aplican a archivos comprimidos.", msg_type="error")
+            return
         
         self.analyze_btn.config(state='disabled'); self.cancel_btn.config(state='normal')
-        self.save_btn.config(state='disabled'); self.copy_btn.config(state='disabled')
-        self.cancel_flag = False; self.analysis_result = ""
+        self.save_btn.config(state='disabled'); self.copy_btn.config(state='disabled'); self.profile_btn.config(state='disabled')
+        self.cancel_flag = False; self.discard_analysis_result()
         self.last_analysis_timestamp = datetime.now(); self.update_timer_display()
+        cache = RenderCache() if self.use_cache_var.get() else None
+        self.last_profile = AnalysisProfile() if self.profile_var.get() else None
+        index = None
+        if self.build_index_var.get():
+            index_fd, self.analysis_index_path = tempfile.mkstemp(prefix="folder_analyzer_", suffix=".sqlite"); os.close(index_fd)
+            index = AnalysisIndex(self.analysis_index_path)
+        self.engine = FolderAnalysisEngine(self.get_analysis_options(), cache=cache, profile=self.last_profile, index=index)
+        # Con el servicio local, el motor de esta ventana queda de respaldo por si no responde.
+        self.local_engine = None
+        if self.use_daemon_var.get() and index is None: self.local_engine, self.engine = self.engine, DaemonClient(self.engine.options)
+        confirm_above_bytes = self.get_spinbox_value(self.confirm_above_mb_var, CONFIRM_ABOVE_DEFAULT_MB) * 1024 * 1024
+        for engine in (self.engine, self.local_engine):
+            if engine is not None: engine.confirm_estimate = self.confirm_estimate; engine.confirm_above_bytes = confirm_above_bytes
         threading.Thread(target=self.analyze_folder, daemon=True).start()
+        self.poll_progress()
 
     def cancel_analysis(self):
-        self.cancel_flag = True; self.update_progress("Cancelando análisis...", self.progress_var.get())
+        self.cancel_flag = True
+        if self.engine: self.engine.cancel_flag = True; self.engine.update_progress("Cancelando análisis...", self.progress_var.get())
+
+    def confirm_estimate(self, estimate):
+        # Se llama desde el hilo del análisis: la pregunta se hace en el hilo de la interfaz y el
+        # análisis espera la respuesta. "No" aplica el umbral como límite total de contenido.
+        limit_mb = self.get_spinbox_value(self.confirm_above_mb_var, CONFIRM_ABOVE_DEFAULT_MB)
+        answer = []; answered = threading.Event()
+        def _ask():
+            try:
+                answer.append(messagebox.askyesnocancel("Reporte grande",
+                    f"{estimate.summary(limit=5)}\n\n¿Generar el reporte completo?\n\nSí: generarlo completo.\n"
+                    f"No: limitar el contenido a {limit_mb} MB (los archivos que no entren se omiten).\nCancelar: no generarlo.", icon=messagebox.WARNING))
+            finally: answered.set()
+        self.root.after(0, _ask); answered.wait()
+        if not answer or answer[0] is None: return False
+        if answer[0] is False: self.engine.options.max_total_bytes = limit_mb * 1024 * 1024
+        return True
+
+    def get_read_workers(self):
+        try: return max(1, self.read_workers_var.get())
+        except tk.TclError: return DEFAULT_READ_WORKERS
+
+    def get_scan_workers(self):
+        try: return max(1, self.scan_workers_var.get())
+        except tk.TclError: return DEFAULT_SCAN_WORKERS
+
+    def get_spinbox_value(self, var, default):
+        try: return max(0, var.get())
+        except tk.TclError: return default
+
+    def get_analysis_options(self):
+        return AnalysisOptions(include_subdirs=self.include_subdirs_var.get(),
+                               show_empty_files=self.show_empty_files_var.get(),
+                               add_line_numbers=self.add_line_numbers_var.get(),
+                               show_directory_first=self.show_directory_first_var.get(),
+                               ignored_items=self.ignored_listbox.get(0, tk.END),
+                               read_workers=self.get_read_workers(),
+                               scan_workers=self.get_scan_workers(),
+                               read_timeout=self.get_spinbox_value(self.read_timeout_var, DEFAULT_READ_TIMEOUT_SECONDS),
+                               use_gitignore=self.use_gitignore_var.get(),
+                               skip_binary=self.skip_binary_var.get(),
+                               dedupe_identical=self.dedupe_var.get(),
+                               git_files=self.git_files_var.get(),
+                               changed_since=self.changed_since_var.get().strip() or None,
+                               max_file_bytes=self.get_spinbox_value(self.max_file_kb_var, DEFAULT_MAX_FILE_BYTES // 1024) * 1024,
+                               max_total_bytes=self.get_spinbox_value(self.max_total_mb_var, DEFAULT_MAX_TOTAL_BYTES // (1024 * 1024)) * 1024 * 1024)
 
     def analyze_folder(self):
+        final_message = None
         try:
-            folder_path = self.selected_folder.get()
-            self.update_progress("Escaneando archivos...", 0) 
-            files_to_analyze = self.get_files_list(folder_path)
-
-            if self.cancel_flag: self.reset_ui_after_analysis("Análisis cancelado (escaneo)"); return
-            if not files_to_analyze:
-                self.reset_ui_after_analysis("Sin archivos para analizar"); return
-
-            self.update_progress(f"Preparando análisis de {len(files_to_analyze)} archivos...", 5)
-            result_lines = [f"ANÁLISIS DE CARPETA\n{'='*80}",
-                            f"Carpeta analizada: {folder_path}",
-                            f"Fecha de análisis: {self.last_analysis_timestamp.strftime('%Y-%m-%d %H:%M:%S')}",
-                            f"Total de archivos analizados: {len(files_to_analyze)}",
-                            f"Incluye subdirectorios: {'Sí' if self.include_subdirs_var.get() else 'No'}",
-                            f"Mostrar archivos vacíos: {'Sí' if self.show_empty_files_var.get() else 'No'}",
-                            f"Agregar números de línea: {'Sí' if self.add_line_numbers_var.get() else 'No'}",
-                            f"Mostrar directorio primero: {'Sí' if self.show_directory_first_var.get() else 'No'}"]
-            if self.ignored_items:
-                result_lines.extend(["", "ELEMENTOS IGNORADOS", "-"*40])
-                result_lines.extend([f"  • {item}" for item in sorted(list(self.ignored_items))])
-            result_lines.append("\n" + "=" * 80)
-            
-            base_prog_content = 5
-            if self.show_directory_first_var.get():
-                result_lines.extend(["\nDIRECTORIO DE ARCHIVOS", "="*80])
-                for idx, fp_list_item in enumerate(files_to_analyze):
-                    if self.cancel_flag: break
-                    self.update_progress(f"Listando: {os.path.basename(fp_list_item)}", 5 + (idx/len(files_to_analyze))*15)
-                    result_lines.append(f"• {os.path.relpath(fp_list_item, os.path.dirname(folder_path))}")
-                result_lines.extend(["\n" + "="*80, "CONTENIDO DE ARCHIVOS", "="*80])
-                base_prog_content = 20
-            
-            if self.cancel_flag: self.reset_ui_after_analysis("Análisis cancelado (directorio)"); return
-
-            for i, file_path_content in enumerate(files_to_analyze):
-                if self.cancel_flag: break
-                prog = base_prog_content + (i/len(files_to_analyze))*(95-base_prog_content)
-                self.update_progress(f"Procesando: {os.path.basename(file_path_content)}", prog)
-                self.analyze_file_to_result(result_lines, file_path_content, folder_path)
-            
-            if not self.cancel_flag:
-                result_lines.append(f"\n{'='*80}\nFIN DEL ANÁLISIS\nGenerado el: {self.last_analysis_timestamp.strftime('%Y-%m-%d %H:%M:%S')}\n{'='*80}")
-                self.analysis_result = "\n".join(result_lines)
-                self.update_progress("¡Análisis completado!", 100)
-                self.root.after(0, lambda: [self.save_btn.config(state='normal'), self.copy_btn.config(state='normal')])
-                self.root.after(100, lambda: self.show_notification("Análisis finalizado con éxito.", msg_type="success"))
-            else: 
-                self.update_progress("Análisis cancelado durante el procesamiento.", self.progress_var.get())
+            folder_path = self.analyzed_folder = self.selected_folder.get()
+            report = create_report_spool()
+            try:
+                try: self.engine.analyze(folder_path, report, self.last_analysis_timestamp)
+                except DaemonUnavailable as e:
+                    self.root.after(0, lambda: self.show_notification(f"{e}\nSe analiza sin el servicio.", msg_type="info", duration=4000))
+                    self.local_engine.cancel_flag = self.cancel_flag; self.engine = self.local_engine
+                    self.engine.analyze(folder_path, report, self.last_analysis_timestamp)
+            except BaseException: report.close(); raise
+            self.analysis_result = report
+            self.engine.update_progress("¡Análisis completado!", 100)
+            success_message = "Análisis finalizado con éxito."
+            if self.engine.cache: success_message += f"\n{self.engine.cache.summary()}"
+            if isinstance(self.engine, DaemonClient): success_message += f"\n{self.engine.summary()}"; self.last_profile = None
+            if self.engine.duplicates: success_message += f"\nArchivos idénticos a uno anterior: {len(self.engine.duplicates.duplicate_of)}"
+            if self.engine.scan_errors: success_message += f"\n{format_scan_errors(self.engine.scan_errors, limit=3)}"
+            if self.engine.stalled_reads: success_message += f"\n{format_stalled_reads(self.engine.stalled_reads, limit=3)}"
+            self.engine.profile = None # las actualizaciones del modo vigilancia no se perfilan
+            if self.watch_var.get(): self.start_watching(folder_path)
+            self.root.after(0, lambda: [self.save_btn.config(state='normal'), self.copy_btn.config(state='normal')])
+            if self.last_profile: self.root.after(0, lambda: self.profile_btn.config(state='normal'))
+            self.root.after(100, lambda: self.show_notification(success_message, msg_type="success"))
+        except (AnalysisCancelled, NoFilesToAnalyze) as e:
+            final_message = str(e)
+        except GitError as e:
+            final_message = str(e)
+            self.root.after(0, lambda: self.show_notification(f"No se pudieron listar los archivos con git:\n{e}", msg_type="error", duration=5000))
+        except (ArchiveError, DaemonError) as e:
+            final_message = str(e)
+            self.root.after(0, lambda: self.show_notification(str(e), msg_type="error", duration=5000))
         except Exception as e:
             self.root.after(0, lambda: messagebox.showerror("Error Crítico", f"Ocurrió un error durante el análisis:\n{e}"))
             self.update_progress(f"Error: {e}", self.progress_var.get())
         finally: 
-            self.reset_ui_after_analysis()
-
-    def get_files_list(self, folder_path):
-        files = []
-        deep_ignored_folder_names = {item.rstrip('/') for item in self.ignored_items if item.endswith('/') and '/' not in item.rstrip('/')}
-        ignored_file_names = {item for item in self.ignored_items if not item.endswith('/') and '/' not in item}
-        relative_ignored_paths = {os.path.normpath(item) for item in self.ignored_items if '/' in item}
-        if self.include_subdirs_var.get():
-            for root, dirs, fnames in os.walk(folder_path, topdown=True):
-                current_rel_root = os.path.relpath(root, folder_path); current_rel_root = "" if current_rel_root == '.' else current_rel_root
-                dirs_to_remove = []
-                for d_name in dirs:
-                    if d_name in deep_ignored_folder_names or os.path.normpath(os.path.join(current_rel_root, d_name + "/")) in relative_ignored_paths:
-                        dirs_to_remove.append(d_name)
-                dirs[:] = [d for d in dirs if d not in dirs_to_remove]
-                for filename in fnames:
-                    if filename in ignored_file_names or os.path.normpath(os.path.join(current_rel_root, filename)) in relative_ignored_paths: continue
-                    if self.is_supported_file(filename): files.append(os.path.join(root, filename))
-        else: 
-            for item_name in os.listdir(folder_path):
-                item_abs_path = os.path.join(folder_path, item_name)
-                if os.path.isdir(item_abs_path):
-                    if item_name in deep_ignored_folder_names or os.path.normpath(item_name + "/") in relative_ignored_paths: continue
-                elif os.path.isfile(item_abs_path):
-                    if item_name in ignored_file_names or os.path.normpath(item_name) in relative_ignored_paths: continue
-                    if self.is_supported_file(item_name): files.append(item_abs_path)
-        return sorted(files)
-
-    def is_supported_file(self, filename):
-        return os.path.splitext(filename)[1].lower() in self.supported_extensions
-
-    def analyze_file_to_result(self, result_lines, file_path, base_folder):
-        try:
-            rel_path = os.path.relpath(file_path, os.path.dirname(base_folder))
-            filename = os.path.basename(file_path)
-            result_lines.append(f"\n{'='*80}\nArchivo: {filename}\nRuta: {rel_path}\n{'-'*40}")
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f: content = f.read()
-            if not content.strip() and not self.show_empty_files_var.get():
-                result_lines.append("(Archivo vacío - omitido según configuración)"); return
-            language = self.get_language_from_extension(os.path.splitext(filename)[1].lower())
-            result_lines.append(f"Contenido ({language}):\n```{language}")
-            if self.add_line_numbers_var.get():
-                for i, line in enumerate(content.splitlines(), 1): result_lines.append(f"{i:4d}| {line}")
-            else: result_lines.append(content)
-            result_lines.append("```")
-        except Exception as e: result_lines.append(f"(Error al leer o procesar el archivo '{os.path.basename(file_path)}': {e})")
-
-    def get_language_from_extension(self, ext):
-        lang_map = {'.py': 'python', '.js': 'javascript', '.jsx': 'jsx', '.ts': 'typescript', 
-                    '.tsx': 'tsx', '.html': 'html', '.htm': 'html', '.css': 'css', '.scss': 'scss', 
-                    '.sass': 'sass', '.json': 'json', '.xml': 'xml', '.yaml': 'yaml', '.yml': 'yaml',
-                    '.md': 'markdown', '.txt': 'text', '.sql': 'sql', '.php': 'php', '.java': 'java',
-                    '.c': 'c', '.cpp': 'cpp', '.h': 'c', '.cs': 'csharp', '.rb': 'ruby', '.go': 'go',
-                    '.rs': 'rust', '.swift': 'swift', '.kt': 'kotlin', '.vue': 'vue', '.svelte': 'svelte',
-                    '.sh': 'bash', '.bat': 'batch', '.ps1': 'powershell', '.dockerfile': 'dockerfile'}
-        return lang_map.get(ext, 'text') 
-    
+            self.reset_ui_after_analysis(final_message)
+
+    def discard_analysis_result(self):
+        self.stop_watching()
+        with self.report_lock:
+            if self.live_report is not None: self.live_report.spool.close()
+            if self.analysis_result is not None: self.analysis_result.close()
+            self.live_report = None; self.analysis_result = None
+        self.preview_pager = None; self.preview_generation += 1; self.preview_match = None; self.preview_section_index = -1
+        if self.analysis_index_path is not None and os.path.exists(self.analysis_index_path): os.remove(self.analysis_index_path)
+        self.analysis_index_path = None
+
+    def current_report(self):
+        # Llamar con report_lock tomado: al vigilar, el reporte se reemplaza con cada actualización.
+        return self.live_report.spool if self.live_report is not None else self.analysis_result
+
+    def start_watching(self, folder_path):
+        # Se llama desde un hilo secundario: registrar las carpetas puede tardar en árboles grandes.
+        if is_archive_path(folder_path): return # un archivo comprimido no se vigila
+        engine = self.engine
+        with self.report_lock:
+            if self.analysis_result is None or self.watcher is not None: return
+            if self.live_report is None:
+                self.live_report = LiveReport(engine, folder_path, self.analysis_result, engine.sections,
+                                              self.last_analysis_timestamp, self.report_lock)
+            live_report = self.live_report
+        try: watcher = create_watcher(engine, folder_path, lambda dirty, rescan: self.on_folder_changes(live_report, dirty, rescan))
+        except Exception as e:
+            self.root.after(0, lambda: self.show_notification(f"No se pudo vigilar la carpeta:\n{e}", msg_type="error"))
+            return
+        with self.report_lock:
+            if self.live_report is live_report and self.watch_var.get(): self.watcher = watcher
+        if self.watcher is not watcher: watcher.close(); return
+        watcher.start()
+        self.update_progress(f"Análisis completado. Vigilando cambios en la carpeta ({watcher.mode})...", 100)
+
+    def stop_watching(self):
+        watcher, self.watcher = self.watcher, None
+        if watcher is not None: watcher.stop()
+
+    def on_folder_changes(self, live_report, dirty_paths, rescan):
+        changed = live_report.apply_changes(dirty_paths, rescan)
+        if not changed: return
+        def _refresh():
+            if self.live_report is not live_report: return
+            self.last_analysis_timestamp = live_report.timestamp; self.update_timer_display()
+            self.show_notification(f"Reporte actualizado: {changed} archivo(s) modificado(s).", msg_type="info")
+            self.refresh_preview()
+        self.update_progress(f"Reporte actualizado ({len(live_report.sections)} archivos). Vigilando cambios...", 100)
+        self.root.after(0, _refresh)
+
+    def preview_is_visible(self):
+        return self.notebook.select() == str(self.tab_preview)
+
+    def refresh_preview(self):
+        # Si el reporte cambió (nuevo análisis o actualización del modo vigilancia) se vuelve a
+        # indexar en segundo plano; mientras tanto se conserva la posición de lectura.
+        if not self.preview_is_visible(): return
+        with self.report_lock:
+            report = self.current_report()
+            sections = self.live_report.sections if self.live_report is not None else (self.engine.sections if self.engine else [])
+        if report is None or str(self.analyze_btn['state']) == 'disabled':
+            self.preview_pager = None; self.show_preview_lines([], "Sin análisis para mostrar." if report is None else "Análisis en curso...")
+            return
+        if self.preview_pager is not None and self.preview_pager.report is report: self.render_preview(); return
+        self.preview_generation += 1; generation = self.preview_generation
+        pager = ReportPager(report, sections, self.analyzed_folder, self.report_lock)
+        self.preview_status_label.config(text="Indexando reporte...")
+        def _build():
+            try: built = pager.build(cancel=lambda: generation != self.preview_generation)
+            except (ValueError, OSError): built = False # el reporte se reemplazó mientras se indexaba
+            def _done():
+                if generation != self.preview_generation: return
+                if not built: self.preview_pager = None; self.root.after(PROGRESS_POLL_MS, self.refresh_preview); return
+                self.preview_pager = pager; self.render_preview()
+            self.root.after(0, _done)
+        threading.Thread(target=_build, daemon=True).start()
+
+    def preview_visible_rows(self):
+        return max(1, (self.preview_text.winfo_height() - 4) // max(1, self.preview_line_height))
+
+    def render_preview(self):
+        pager = self.preview_pager
+        if pager is None or not self.preview_is_visible(): return
+        rows = self.preview_visible_rows()
+        self.preview_top = max(0, min(self.preview_top, pager.total_lines - rows))
+        try: lines = pager.get_lines(self.preview_top, rows, blocking=False)
+        except (ValueError, OSError): lines = None
+        if lines is None: self.root.after(PROGRESS_POLL_MS, self.refresh_preview); return # reporte ocupado o reemplazado
+        lines = [line if len(line) <= PREVIEW_MAX_LINE_CHARS else line[:PREVIEW_MAX_LINE_CHARS] + " …" for line in lines]
+        last = self.preview_top + len(lines)
+        status = f"Líneas {self.preview_top + 1:,}-{last:,} de {pager.total_lines:,}".replace(",", ".") if pager.total_lines else "Reporte vacío"
+        self.show_preview_lines(lines, status)
+        if pager.total_lines: self.preview_scrollbar.set(self.preview_top / pager.total_lines, last / pager.total_lines)
+        if self.preview_match and self.preview_top <= self.preview_match[0] < last:
+            line, column = self.preview_match; row = line - self.preview_top + 1
+            self.preview_text.tag_add("match", f"{row}.{column}", f"{row}.{column + len(self.preview_search_entry.get())}")
+            self.preview_text.see(f"{row}.{column}")
+
+    def show_preview_lines(self, lines, status):
+        self.preview_text.config(state='normal')
+        self.preview_text.delete("1.0", tk.END); self.preview_text.insert("1.0", "\n".join(lines))
+        self.preview_text.config(state='disabled')
+        self.preview_status_label.config(text=status)
+        if not lines: self.preview_scrollbar.set(0, 1)
+
+    def scroll_preview(self, rows):
+        if self.preview_pager is None: return "break"
+        if rows in ("page", "-page"): rows = (1 if rows == "page" else -1) * max(1, self.preview_visible_rows() - 1)
+        self.preview_top = max(0, self.preview_top + rows); self.render_preview()
+        return "break"
+
+    def on_preview_scroll(self, *args):
+        if self.preview_pager is None: return
+        if args[0] == "moveto": self.preview_top = int(float(args[1]) * self.preview_pager.total_lines); self.render_preview()
+        elif args[0] == "scroll": self.scroll_preview(int(args[1]) * (max(1, self.preview_visible_rows() - 1) if args[2] == "pages" else 1))
+
+    def preview_goto_section(self):
+        pager = self.preview_pager; text = self.preview_goto_entry.get().strip()
+        if pager is None or not text: return
+        index = pager.find_section(text, self.preview_section_index)
+        if index is None: self.preview_status_label.config(text="Ningún archivo coincide."); return
+        self.preview_section_index = index; self.preview_top = pager.section_lines[index]; self.render_preview()
+        self.preview_status_label.config(text=f"{pager.paths[index]} ({index + 1} de {len(pager.paths)})")
+
+    def on_preview_search_key(self, event):
+        if event.keysym in ("Return", "Shift_L", "Shift_R"): return
+        if self.preview_search_job: self.root.after_cancel(self.preview_search_job)
+        self.preview_search_job = self.root.after(PREVIEW_SEARCH_DELAY_MS, lambda: self.preview_search(incremental=True))
+
+    def preview_search(self, backwards=False, incremental=False):
+        # La búsqueda recorre el reporte por bloques en un hilo; escribir de nuevo cancela la anterior.
+        self.preview_search_job = None
+        pager = self.preview_pager; query = self.preview_search_entry.get()
+        if pager is None: return
+        if not query: self.preview_match = None; self.render_preview(); return
+        if self.preview_match is None: start = self.preview_top
+        elif incremental: start = self.preview_match[0]
+        else: start = self.preview_match[0] + (-1 if backwards else 1)
+        start %= max(1, pager.total_lines)
+        self.preview_generation += 1; generation = self.preview_generation
+        self.preview_status_label.config(text="Buscando...")
+        def _search():
+            try: match = pager.find(query, start, backwards, cancel=lambda: generation != self.preview_generation)
+            except (ValueError, OSError): return
+            def _done():
+                if generation != self.preview_generation or pager is not self.preview_pager: return
+                self.preview_match = match
+                if match is None: self.render_preview(); self.preview_status_label.config(text="Sin coincidencias."); return
+                rows = self.preview_visible_rows()
+                if not self.preview_top <= match[0] < self.preview_top + rows: self.preview_top = max(0, match[0] - rows // 3)
+                self.render_preview()
+            self.root.after(0, _done)
+        threading.Thread(target=_search, daemon=True).start()
+
     def save_analysis(self):
-        if not self.analysis_result: 
+        if self.analysis_result is None: 
             self.show_notification("No hay análisis para guardar.", msg_type="error")
             return
         try:
@@ -562,28 +974,88 @@ class FolderAnalyzer:
             if not (output_dir and os.path.isdir(output_dir)): 
                 output_dir = os.path.join(os.path.expanduser("~"), "Desktop")
             
+            filetypes = [("Archivos de Texto", "*.txt"), ("Texto comprimido gzip", "*.txt.gz"), ("Texto comprimido xz", "*.txt.xz"), ("Todos los Archivos", "*.*")]
+            if self.analysis_index_path and os.path.exists(self.analysis_index_path): filetypes.insert(1, ("Índice SQLite", "*.sqlite"))
             file_path_save = filedialog.asksaveasfilename(
                 title="Guardar Análisis Como...", initialdir=output_dir, initialfile=suggested_name, 
-                defaultextension=".txt", filetypes=[("Archivos de Texto", "*.txt"), ("Todos los Archivos", "*.*")])
+                defaultextension=".txt", filetypes=filetypes)
             
-            if file_path_save:
-                with open(file_path_save, 'w', encoding='utf-8') as f: f.write(self.analysis_result)
+            if file_path_save and os.path.splitext(file_path_save)[1].lower() in (".sqlite", ".db"):
+                if not (self.analysis_index_path and os.path.exists(self.analysis_index_path)):
+                    self.show_notification("Active \"Generar también un índice SQLite\" y vuelva a analizar.", msg_type="error", duration=4000)
+                    return
+                shutil.copyfile(self.analysis_index_path, file_path_save)
+                self.show_notification(f"Índice guardado en:\n{os.path.basename(file_path_save)}", msg_type="success", duration=4000)
+            elif file_path_save and (compression_from_path(file_path_save) or self.get_spinbox_value(self.shard_kb_var, 0)):
+                output = ShardedReportOutput(file_path_save, compression_from_path(file_path_save), self.get_spinbox_value(self.shard_kb_var, 0) * 1024)
+                try:
+                    with self.report_lock:
+                        sections = self.live_report.sections if self.live_report is not None else self.engine.sections
+                        copy_report_sections(self.current_report(), sections, output, self.analyzed_folder)
+                    output.close()
+                except BaseException: output.close(completed=False); raise
+                if output.sharded: saved_message = f"Análisis guardado en {len(output.shards)} partes.\nManifiesto: {os.path.basename(output.manifest_path)}"
+                else: saved_message = f"Análisis guardado en:\n{os.path.basename(file_path_save)}"
+                self.show_notification(saved_message, msg_type="success", duration=4000)
+            elif file_path_save:
+                with self.report_lock, open(file_path_save, 'w', encoding='utf-8') as f:
+                    report = self.current_report(); report.seek(0); shutil.copyfileobj(report, f)
                 self.show_notification(f"Análisis guardado en:\n{os.path.basename(file_path_save)}", msg_type="success", duration=4000)
         except Exception as e: 
             messagebox.showerror("Error al Guardar", f"No se pudo guardar el archivo:\n{e}")
 
     def copy_to_clipboard(self):
-        if not self.analysis_result: 
+        if self.analysis_result is None: 
             self.show_notification("No hay análisis para copiar.", msg_type="error")
             return
         try: 
-            pyperclip.copy(self.analysis_result)
+            with self.report_lock:
+                report = self.current_report(); report.seek(0); report_text = report.read()
+            pyperclip.copy(report_text)
             self.show_notification("Análisis copiado al portapapeles.", msg_type="success")
         except pyperclip.PyperclipException as e:
              messagebox.showerror("Error de Portapapeles", f"No se pudo copiar al portapapeles:\n{e}\nAsegúrese de tener un gestor de portapapeles (ej. xclip o xsel en Linux).")
         except Exception as e: 
             messagebox.showerror("Error al Copiar", f"Ocurrió un error desconocido al copiar:\n{e}")
 
+    def poll_progress(self):
+        # Mientras dura el análisis, la barra y la etiqueta se refrescan a ritmo fijo leyendo los
+        # contadores del motor, en lugar de encolar un evento de Tk por cada archivo procesado.
+        if self.engine is not None:
+            text, value = self.engine.progress.snapshot()
+            self.progress_label.config(text=text); self.progress_var.set(value)
+        self.progress_poll_job = self.root.after(PROGRESS_POLL_MS, self.poll_progress)
+
+    def stop_polling_progress(self):
+        if self.progress_poll_job: self.root.after_cancel(self.progress_poll_job)
+        self.progress_poll_job = None
+
+    def show_profile(self):
+        if self.last_profile is None:
+            self.show_notification("No hay un perfil del último análisis.", msg_type="error")
+            return
+        profile = self.last_profile
+        window = tk.Toplevel(self.root)
+        window.title("Perfil del análisis"); window.geometry("820x520")
+        text_frame = ttk.Frame(window, padding=10)
+        text_frame.pack(expand=True, fill=tk.BOTH)
+        text = tk.Text(text_frame, wrap=tk.NONE, font=self.font_timer)
+        scrollbar = ttk.Scrollbar(text_frame, orient=tk.VERTICAL, command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y); text.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        text.insert("1.0", profile.summary()); text.config(state='disabled')
+        def export_json():
+            folder_name_base = os.path.basename(self.selected_folder.get()) or "analisis"
+            file_path_save = filedialog.asksaveasfilename(
+                parent=window, title="Exportar Perfil Como...", initialfile=f"{folder_name_base}_perfil.json",
+                defaultextension=".json", filetypes=[("JSON", "*.json"), ("Todos los Archivos", "*.*")])
+            if not file_path_save: return
+            try:
+                profile.save_json(file_path_save)
+                self.show_notification(f"Perfil guardado en:\n{os.path.basename(file_path_save)}", msg_type="success", duration=4000)
+            except Exception as e: messagebox.showerror("Error al Guardar", f"No se pudo guardar el perfil:\n{e}", parent=window)
+        ttk.Button(window, text="💾 Exportar JSON", command=export_json).pack(side=tk.RIGHT, padx=10, pady=(0,10))
+
     def update_progress(self, text, value):
         def _update_gui():
             if hasattr(self, 'progress_label') and self.progress_label.winfo_exists(): self.progress_label.config(text=text)
@@ -593,15 +1065,19 @@ class FolderAnalyzer:
     def reset_ui_after_analysis(self, explicit_message=None):
         def _reset_gui_elements():
             if not (hasattr(self, 'root') and self.root.winfo_exists()): return
+            self.stop_polling_progress()
+            if self.engine is not None: self.progress_var.set(self.engine.progress.snapshot()[1])
             if hasattr(self,'analyze_btn') and self.analyze_btn.winfo_exists(): self.analyze_btn.config(state='normal')
             if hasattr(self,'cancel_btn') and self.cancel_btn.winfo_exists(): self.cancel_btn.config(state='disabled')
             final_message_to_display = "Listo para una nueva acción."
             if explicit_message: final_message_to_display = explicit_message
-            elif self.analysis_result and not self.cancel_flag: final_message_to_display = "Análisis completado. " + final_message_to_display
+            elif self.watcher is not None: final_message_to_display = f"Análisis completado. Vigilando cambios en la carpeta ({self.watcher.mode})..."
+            elif self.analysis_result is not None and not self.cancel_flag: final_message_to_display = "Análisis completado. " + final_message_to_display
             elif self.cancel_flag: pass 
             if hasattr(self, 'progress_label') and self.progress_label.winfo_exists(): self.progress_label.config(text=final_message_to_display)
             if self.cancel_flag and self.progress_var.get() < 5:
                  if hasattr(self, 'progress_bar') and self.progress_bar.winfo_exists(): self.progress_var.set(0)
+            self.refresh_preview()
         if hasattr(self, 'root') and self.root.winfo_exists(): self.root.after(0, _reset_gui_elements)
 
 def main():
@@ -0,0 +1,195 @@
+# folder_analyzer_batch.py
+#
+# Análisis por lotes: genera los reportes de muchas carpetas repartiéndolas en un grupo de
+# procesos (uno por núcleo), cada una con sus propias opciones y lista de ignorados.
+#
+#   python folder_analyzer_batch.py proyectos.json -o reportes/
+#   python folder_analyzer_batch.py ~/src/app ~/src/api -o reportes/ --line-numbers -i node_modules/
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from folder_analyzer_core import (FolderAnalysisEngine, AnalysisOptions, AnalysisCancelled, NoFilesToAnalyze, GitError, ArchiveError,
+                                  ShardedReportOutput, COMPRESSION_SUFFIXES, compression_from_path, is_archive_path, format_size, format_duration)
+
+BATCH_FORMAT_VERSION = 1
+
+
+class BatchJob:
+    # Una carpeta del lote: dónde se guarda su reporte y con qué opciones (AnalysisOptions.to_dict()).
+    def __init__(self, folder, output, options):
+        self.folder = folder
+        self.output = output
+        self.options = options
+
+
+def load_manifest(path):
+    # JSON: {"defaults": {opciones}, "roots": ["carpeta", {"folder": ..., "output": ..., "options": {...}}]},
+    # o un texto con una carpeta por línea (las líneas vacías y las que empiezan con # se ignoran).
+    # Las rutas relativas parten de la carpeta del manifiesto.
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8') as f: text = f.read()
+    if path.lower().endswith(".json"):
+        document = json.loads(text)
+        if isinstance(document, list): document = {"roots": document}
+    else:
+        document = {"roots": [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]}
+    roots = []
+    for root in document.get("roots", []):
+        if isinstance(root, str): root = {"folder": root}
+        roots.append(dict(root, folder=os.path.join(base, os.path.expanduser(root["folder"]))))
+    return document.get("defaults", {}), roots
+
+
+def merge_options(*layers):
+    # Cada capa reemplaza las opciones de la anterior, salvo los ignorados, que se acumulan.
+    merged = {}; ignored_items = []
+    for layer in layers:
+        for key, value in layer.items():
+            if key == "ignored_items": ignored_items.extend(value)
+            else: merged[key] = value
+    merged["ignored_items"] = ignored_items
+    return AnalysisOptions.from_dict(merged).to_dict()
+
+
+def plan_jobs(entries, cli_options, output_dir, compression=None):
+    # `entries`: (carpeta del manifiesto, opciones por defecto de su manifiesto). Prioridad de las
+    # opciones: las de la carpeta, luego las de la línea de comandos y luego las del manifiesto.
+    # Los reportes se llaman como la carpeta; si dos carpetas tienen el mismo nombre se numeran.
+    jobs = []; used = set()
+    for root, defaults in entries:
+        folder = os.path.abspath(root["folder"])
+        suffix = COMPRESSION_SUFFIXES[compression] if compression else ""
+        output = root.get("output")
+        if output is None:
+            stem = os.path.basename(folder.rstrip(os.sep)) or "raiz"
+            output = f"{stem}.txt{suffix}"; counter = 2
+            while output in used: output = f"{stem}_{counter}.txt{suffix}"; counter += 1
+        elif not output.lower().endswith(suffix): output += suffix
+        used.add(output)
+        jobs.append(BatchJob(folder, os.path.join(output_dir, output), merge_options(defaults, cli_options, root.get("options", {}))))
+    return jobs
+
+
+def run_job(job):
+    # Se ejecuta en un proceso del grupo. Devuelve un diccionario (serializable) con el resultado.
+    started = time.perf_counter()
+    result = {"folder": job.folder, "output": job.output, "files": 0, "bytes": 0, "seconds": 0.0, "error": None, "scan_errors": [], "stalled_reads": []}
+    if not os.path.isdir(job.folder) and not is_archive_path(job.folder):
+        result["error"] = "Ruta de carpeta a analizar inválida"
+        return result
+    engine = FolderAnalysisEngine(AnalysisOptions.from_dict(job.options))
+    out = None
+    try:
+        os.makedirs(os.path.dirname(job.output) or ".", exist_ok=True)
+        out = ShardedReportOutput(job.output, compression_from_path(job.output))
+        result["files"] = engine.analyze(job.folder, out)
+        out.close()
+        result["bytes"] = engine.progress.bytes_done
+        result["scan_errors"] = sorted(engine.scan_errors)
+        result["stalled_reads"] = engine.stalled_reads
+    except (AnalysisCancelled, NoFilesToAnalyze, GitError, ArchiveError, OSError) as e:
+        result["error"] = str(e)
+    except Exception as e:
+        result["error"] = f"Error inesperado: {e}"
+    finally:
+        if out is not None and not out.closed: out.close(completed=False)
+        result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def order_by_previous(jobs, previous_path):
+    # Las carpetas que más tardaron en la ejecución anterior empiezan primero: así la última en
+    # terminar no es una grande que arrancó al final. Las nuevas van delante (tiempo desconocido).
+    with open(previous_path, 'r', encoding='utf-8') as f: previous = json.load(f)
+    seconds = {entry["folder"]: entry["seconds"] for entry in previous.get("results", [])}
+    return sorted(jobs, key=lambda job: -seconds.get(job.folder, float("inf")))
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Analiza muchas carpetas en paralelo y guarda un reporte por carpeta.")
+    parser.add_argument("roots", nargs="+", metavar="CARPETA_O_MANIFIESTO",
+                        help="Carpetas a analizar, o un manifiesto (.json con opciones por carpeta, o .txt con una carpeta por línea)")
+    parser.add_argument("-o", "--output-dir", required=True, metavar="CARPETA", help="Carpeta donde se guardan los reportes")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, metavar="N",
+                        help=f"Procesos simultáneos (por defecto, uno por núcleo: {os.cpu_count() or 1})")
+    parser.add_argument("--workers", dest="read_workers", type=int, metavar="N", help="Hilos de lectura de cada proceso")
+    parser.add_argument("--scan-workers", type=int, metavar="N", help="Carpetas que cada proceso lista a la vez (unidades de red)")
+    parser.add_argument("--read-timeout", type=int, metavar="S", help="Segundos que puede tardar la lectura de un archivo antes de omitirlo (0 = sin plazo)")
+    parser.add_argument("--line-numbers", dest="add_line_numbers", action="store_true", default=None, help="Agregar números de línea al contenido")
+    parser.add_argument("--gitignore", dest="use_gitignore", action="store_true", default=None, help="Respetar los archivos .gitignore")
+    parser.add_argument("-i", "--ignore", dest="ignored_items", action="append", default=[], metavar="PATRÓN",
+                        help="Patrón a ignorar en todas las carpetas (se suma a los del manifiesto). Se puede repetir.")
+    parser.add_argument("--compress", choices=sorted(COMPRESSION_SUFFIXES), help="Comprimir los reportes")
+    parser.add_argument("--json", metavar="RUTA", help="Guardar los tiempos y resultados de cada carpeta en JSON")
+    parser.add_argument("--previous", metavar="RUTA", help="Resultados JSON de una ejecución anterior: las carpetas más lentas empiezan primero")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    cli_options = {key: value for key, value in (("read_workers", args.read_workers), ("scan_workers", args.scan_workers),
+                                                 ("read_timeout", args.read_timeout),
+                                                 ("add_line_numbers", args.add_line_numbers),
+                                                 ("use_gitignore", args.use_gitignore)) if value is not None}
+    cli_options["ignored_items"] = args.ignored_items
+    entries = []
+    try:
+        for root in args.roots:
+            if os.path.isfile(root) and not is_archive_path(root):
+                defaults, manifest_roots = load_manifest(root)
+                entries.extend((manifest_root, defaults) for manifest_root in manifest_roots)
+            else:
+                entries.append(({"folder": root}, {}))
+        jobs = plan_jobs(entries, cli_options, args.output_dir, args.compress)
+        if args.previous: jobs = order_by_previous(jobs, args.previous)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"No se pudo leer el manifiesto: {e}", file=sys.stderr)
+        return 1
+    if len({job.output for job in jobs}) < len(jobs):
+        print("Dos carpetas del lote escriben el mismo reporte; indique \"output\" en el manifiesto.", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.perf_counter(); results = []; failed = 0
+    jobs_count = max(1, min(args.jobs, len(jobs)))
+    print(f"Analizando {len(jobs)} carpetas con {jobs_count} procesos...", file=sys.stderr)
+    executor = ProcessPoolExecutor(max_workers=jobs_count)
+    try:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result(); results.append(result)
+            elapsed = time.perf_counter() - started
+            remaining = elapsed / len(results) * (len(jobs) - len(results))
+            name = os.path.basename(result["folder"])
+            if result["error"]:
+                failed += 1
+                print(f"[{len(results)}/{len(jobs)}] {name}: ERROR {result['error']}", file=sys.stderr)
+            else:
+                unlisted = f" ({len(result['scan_errors'])} carpetas sin listar)" if result["scan_errors"] else ""
+                if result["stalled_reads"]: unlisted += f" ({len(result['stalled_reads'])} lecturas vencidas)"
+                print(f"[{len(results)}/{len(jobs)}] {name}: {result['files']} archivos, {format_size(result['bytes'])} en "
+                      f"{result['seconds']:.1f} s{unlisted} · ETA {format_duration(remaining)}", file=sys.stderr)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print("Lote interrumpido.", file=sys.stderr)
+        return 1
+    executor.shutdown()
+
+    wall_seconds = time.perf_counter() - started
+    busy_seconds = sum(result["seconds"] for result in results)
+    print(f"\n{len(results) - failed} reportes en {args.output_dir}, {failed} con error. Tiempo total {wall_seconds:.1f} s "
+          f"(suma de carpetas {busy_seconds:.1f} s, {busy_seconds / wall_seconds if wall_seconds else 0:.1f}x)", file=sys.stderr)
+    for result in sorted(results, key=lambda result: -result["seconds"])[:10]:
+        print(f"  {result['seconds']:8.2f} s  {result['folder']}", file=sys.stderr)
+    if args.json:
+        document = {"version": BATCH_FORMAT_VERSION, "jobs": jobs_count, "wall_seconds": wall_seconds, "results": results}
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump(document, f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# folder_analyzer_bench.py
+#
+# Banco de pruebas de rendimiento: genera un árbol de código sintético y reproducible, ejecuta el
+# motor de análisis con distintas combinaciones de opciones y compara contra una línea base.
+#
+#   python folder_analyzer_bench.py --files 20000 --save-baseline base.json
+#   python folder_analyzer_bench.py --files 20000 --baseline base.json
+
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import itertools
+import platform
+import time
+import tracemalloc
+from folder_analyzer_core import FolderAnalysisEngine, AnalysisOptions, AnalysisProfile, format_size
+
+BENCH_FORMAT_VERSION = 3
+DEFAULT_FILES = 5000
+DEFAULT_DEPTH = 4
+DEFAULT_FANOUT = 6
+DEFAULT_MEDIAN_SIZE = 2048
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.10 # 10% más lento que la línea base se considera una regresión
+TREE_EXTENSIONS = (".py", ".js", ".ts", ".md", ".json", ".css", ".html", ".txt", ".sql", ".yml")
+WORDS = ("def", "return", "import", "class", "value", "self", "data", "result", "for", "in", "if", "else",
+         "config", "items", "path", "name", "ñandú", "año", "usuario", "índice")
+
+
+class NullReport:
+    # Destino del reporte que solo cuenta bytes, para no medir el disco. Como un archivo de salida
+    # (-o), acepta bytes: el motor usa la misma copia directa del UTF-8 que con un archivo.
+    def __init__(self):
+        self.nbytes = 0
+
+    def write(self, text):
+        self.nbytes += len(text.encode('utf-8'))
+        return len(text)
+
+    def write_bytes(self, data):
+        self.nbytes += len(data)
+
+
+def generate_tree(root, files=DEFAULT_FILES, depth=DEFAULT_DEPTH, fanout=DEFAULT_FANOUT, median_size=DEFAULT_MEDIAN_SIZE,
+                  empty_ratio=0.03, non_utf8_ratio=0.01, ignored_ratio=0.15, seed=0):
+    # Árbol determinista para una misma semilla: carpetas anidadas hasta `depth` niveles, tamaños
+    # con distribución log-normal (muchos archivos chicos y algunos grandes), archivos vacíos,
+    # archivos Latin-1 (no UTF-8) y una parte de los archivos dentro de node_modules/.
+    rng = random.Random(seed)
+    directories = [root]
+    frontier = [root]
+    for level in range(depth):
+        next_frontier = []
+        for parent in frontier:
+            for i in range(rng.randint(1, fanout)):
+                next_frontier.append(os.path.join(parent, f"pkg{level}_{i}"))
+        directories.extend(next_frontier); frontier = next_frontier
+    ignored_roots = [os.path.join(d, "node_modules") for d in rng.sample(directories, max(1, len(directories) // 10))]
+    for directory in directories + ignored_roots: os.makedirs(directory, exist_ok=True)
+
+    total_bytes = 0
+    for index in range(files):
+        directory = rng.choice(ignored_roots if rng.random() < ignored_ratio else directories)
+        path = os.path.join(directory, f"file{index}{rng.choice(TREE_EXTENSIONS)}")
+        kind = rng.random()
+        if kind < empty_ratio: data = b""
+        else:
+            size = max(16, int(rng.lognormvariate(0, 1.2) * median_size))
+            data = _synthetic_text(rng, size).encode("latin-1" if kind < empty_ratio + non_utf8_ratio else "utf-8")
+        with open(path, "wb") as f: f.write(data)
+        total_bytes += len(data)
+    return {"files": files, "directories": len(directories) + len(ignored_roots), "bytes": total_bytes}
+
+
+def _synthetic_text(rng, size):
+    lines = []; length = 0
+    while length < size:
+        line = "    " * rng.randint(0, 3) + " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 12)))
+        lines.append(line); length += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def option_combinations():
+    for include_subdirs, add_line_numbers, show_directory_first in itertools.product((True, False), repeat=3):
+        yield {"include_subdirs": include_subdirs, "add_line_numbers": add_line_numbers, "show_directory_first": show_directory_first}
+
+
+def combination_name(combination):
+    return ",".join(f"{key}={int(value)}" for key, value in combination.items())
+
+
+def measure(func, trace_memory):
+    # Devuelve (segundos, pico de memoria en bytes o None, resultado).
+    if trace_memory: tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory: tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def run_combination(tree_root, combination, repeat, ignored_items, read_workers, trace_memory):
+    # Se toma la mejor de `repeat` ejecuciones (la menos afectada por ruido del sistema). El
+    # escaneo se mide aparte con get_files_list; el análisis completo lo incluye de nuevo. Con
+    # memoria, el perfil toma además en cada etapa del análisis la variación de la memoria y el pico
+    # alcanzado hasta su final (el pico no se reinicia entre etapas).
+    options = AnalysisOptions(ignored_items=ignored_items, read_workers=read_workers, max_file_bytes=0, **combination)
+    best = None
+    for _ in range(repeat):
+        scan_engine = FolderAnalysisEngine(options)
+        scan_seconds, scan_peak, files = measure(lambda: scan_engine.get_files_list(tree_root), trace_memory)
+        profile = AnalysisProfile(top_n=5)
+        engine = FolderAnalysisEngine(options, profile=profile)
+        report = NullReport()
+        total_seconds, total_peak, _ = measure(lambda: engine.analyze(tree_root, report), trace_memory)
+        run = {"scan_seconds": scan_seconds, "scan_peak_bytes": scan_peak,
+               "total_seconds": total_seconds, "total_peak_bytes": total_peak,
+               "files": len(files), "bytes_read": profile.bytes_read, "report_bytes": report.nbytes,
+               "files_per_second": len(files) / total_seconds if total_seconds else 0.0,
+               "bytes_per_second": profile.bytes_read / total_seconds if total_seconds else 0.0,
+               "phases": {phase: round(seconds, 6) for phase, seconds in profile.phases.items()},
+               "stage_growth_bytes": {stage: memory["diferencia"] for stage, memory in profile.memory_stages.items()} if trace_memory else None,
+               "stage_peak_so_far_bytes": {stage: memory["pico"] for stage, memory in profile.memory_stages.items()} if trace_memory else None}
+        if best is None or run["total_seconds"] < best["total_seconds"]: best = run
+    return best
+
+
+def compare_with_baseline(results, baseline, threshold):
+    # Lista de regresiones (combinación, métrica, valor base, valor actual).
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None: continue
+        for metric in ("scan_seconds", "total_seconds"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append((name, metric, previous[metric], current[metric]))
+        for metric in ("scan_peak_bytes", "total_peak_bytes"):
+            if previous.get(metric) and current.get(metric) and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append((name, metric, previous[metric], current[metric]))
+        # Un pico que sube al final de una etapa indica que esa etapa marcó el nuevo máximo.
+        previous_stages = previous.get("stage_peak_so_far_bytes") or {}
+        for stage, peak in (current.get("stage_peak_so_far_bytes") or {}).items():
+            if previous_stages.get(stage) and peak > previous_stages[stage] * (1 + threshold):
+                regressions.append((name, f"pico de memoria hasta [{stage}]", previous_stages[stage], peak))
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Mide el rendimiento del analizador sobre un árbol sintético reproducible.")
+    parser.add_argument("--tree", metavar="CARPETA", help="Usar (o crear, si no existe) el árbol en esta carpeta en lugar de uno temporal")
+    parser.add_argument("--files", type=int, default=DEFAULT_FILES, help=f"Cantidad de archivos a generar (por defecto {DEFAULT_FILES})")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help=f"Profundidad de carpetas (por defecto {DEFAULT_DEPTH})")
+    parser.add_argument("--fanout", type=int, default=DEFAULT_FANOUT, help=f"Subcarpetas máximas por carpeta (por defecto {DEFAULT_FANOUT})")
+    parser.add_argument("--median-size", type=int, default=DEFAULT_MEDIAN_SIZE, metavar="BYTES",
+                        help=f"Tamaño mediano de archivo (por defecto {DEFAULT_MEDIAN_SIZE})")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del generador (por defecto 0)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"Ejecuciones por combinación; se toma la mejor (por defecto {DEFAULT_REPEAT})")
+    parser.add_argument("--workers", type=int, default=AnalysisOptions().read_workers, help="Hilos de lectura")
+    parser.add_argument("--only", metavar="COMBINACIÓN", action="append",
+                        help="Ejecutar solo estas combinaciones (ej: include_subdirs=1,add_line_numbers=0,show_directory_first=1)")
+    parser.add_argument("--memory", action="store_true", help="Medir el pico de memoria con tracemalloc (hace todo más lento)")
+    parser.add_argument("--json", metavar="RUTA", help="Guardar los resultados en JSON")
+    parser.add_argument("--save-baseline", metavar="RUTA", help="Guardar los resultados como línea base")
+    parser.add_argument("--baseline", metavar="RUTA", help="Comparar contra una línea base y salir con código 1 si hay regresiones")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Margen tolerado antes de marcar una regresión (por defecto {DEFAULT_THRESHOLD:.2f})")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    temporary_root = None
+    if args.tree: tree_root = args.tree
+    else: temporary_root = tempfile.mkdtemp(prefix="folder_analyzer_bench_"); tree_root = os.path.join(temporary_root, "src")
+    tree_parameters = {"files": args.files, "depth": args.depth, "fanout": args.fanout, "median_size": args.median_size, "seed": args.seed}
+    try:
+        if not os.path.isdir(tree_root) or not os.listdir(tree_root):
+            print(f"Generando árbol sintético en {tree_root}...", file=sys.stderr)
+            tree_info = generate_tree(tree_root, **tree_parameters)
+            print(f"  {tree_info['files']} archivos, {tree_info['directories']} carpetas, {format_size(tree_info['bytes'])}", file=sys.stderr)
+
+        results = {}
+        for combination in option_combinations():
+            name = combination_name(combination)
+            if args.only and name not in args.only: continue
+            run = run_combination(tree_root, combination, args.repeat, ["node_modules/"], args.workers, args.memory)
+            results[name] = run
+            memory = ""
+            if run["total_peak_bytes"] is not None:
+                stages = ", ".join(f"{stage} {format_size(peak)}" for stage, peak in run["stage_peak_so_far_bytes"].items())
+                memory = f"  pico {format_size(run['total_peak_bytes'])} (hasta el final de: {stages})"
+            print(f"{name:<62} escaneo {run['scan_seconds']:7.3f} s  total {run['total_seconds']:7.3f} s  "
+                  f"{run['files_per_second']:8.0f} archivos/s  {format_size(run['bytes_per_second'])}/s{memory}")
+
+        document = {"version": BENCH_FORMAT_VERSION, "tree": tree_parameters, "python": platform.python_version(),
+                    "platform": platform.platform(), "repeat": args.repeat, "workers": args.workers, "memory": args.memory, "results": results}
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f: json.dump(document, f, ensure_ascii=False, indent=2)
+        if args.save_baseline:
+            with open(args.save_baseline, 'w', encoding='utf-8') as f: json.dump(document, f, ensure_ascii=False, indent=2)
+            print(f"Línea base guardada en: {args.save_baseline}", file=sys.stderr)
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f: baseline = json.load(f)
+            if baseline.get("tree") != tree_parameters:
+                print("Aviso: la línea base se generó con otro árbol; la comparación puede no ser válida.", file=sys.stderr)
+            if baseline.get("memory", False) != args.memory:
+                print("Aviso: la medición de memoria (--memory) no coincide con la línea base y altera los tiempos.", file=sys.stderr)
+            regressions = compare_with_baseline(results, baseline, args.threshold)
+            for name, metric, previous, current in regressions:
+                print(f"REGRESIÓN {name} {metric}: {previous:.4g} -> {current:.4g} (+{(current / previous - 1) * 100:.1f}%)")
+            if regressions: return 1
+            print("Sin regresiones respecto a la línea base.", file=sys.stderr)
+        return 0
+    finally:
+        if temporary_root: shutil.rmtree(temporary_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
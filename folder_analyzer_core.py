@@ -0,0 +1,2328 @@
+# folder_analyzer_core.py
+#
+# Motor de análisis sin interfaz gráfica. No importa tkinter ni pyperclip para
+# poder ejecutarse en CI o en servidores sin pantalla.
+
+import os
+import sys
+import argparse
+import gzip
+import hashlib
+import io
+import heapq
+import json
+import lzma
+import queue
+import re
+import posixpath
+import shutil
+import sqlite3
+import stat
+import subprocess
+import tarfile
+import zipfile
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+import mmap
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from pathlib import Path
+
+SUPPORTED_EXTENSIONS = {
+    '.py', '.js', '.jsx', '.ts', '.tsx', '.html', '.htm', '.css', '.scss', '.sass',
+    '.json', '.xml', '.yaml', '.yml', '.md', '.txt', '.csv', '.sql', '.php',
+    '.java', '.c', '.cpp', '.h', '.cs', '.rb', '.go', '.rs', '.swift', '.kt',
+    '.vue', '.svelte', '.r', '.m', '.sh', '.bat', '.ps1', '.dockerfile'
+}
+
+LANGUAGE_MAP = {'.py': 'python', '.js': 'javascript', '.jsx': 'jsx', '.ts': 'typescript',
+                '.tsx': 'tsx', '.html': 'html', '.htm': 'html', '.css': 'css', '.scss': 'scss',
+                '.sass': 'sass', '.json': 'json', '.xml': 'xml', '.yaml': 'yaml', '.yml': 'yaml',
+                '.md': 'markdown', '.txt': 'text', '.sql': 'sql', '.php': 'php', '.java': 'java',
+                '.c': 'c', '.cpp': 'cpp', '.h': 'c', '.cs': 'csharp', '.rb': 'ruby', '.go': 'go',
+                '.rs': 'rust', '.swift': 'swift', '.kt': 'kotlin', '.vue': 'vue', '.svelte': 'svelte',
+                '.sh': 'bash', '.bat': 'batch', '.ps1': 'powershell', '.dockerfile': 'dockerfile'}
+
+# Reportes más pequeños que esto se mantienen en memoria; los mayores pasan a un archivo temporal.
+REPORT_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+REPORT_COPY_CHUNK_CHARS = 1024 * 1024
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "xz": ".xz"}
+GZIP_COMPRESS_LEVEL = 6 # el nivel 9 por defecto es varias veces más lento y apenas comprime más texto
+SHARD_MANIFEST_VERSION = 1
+PAGER_CHECKPOINT_LINES = 256
+
+CONFIG_DIR = os.path.expanduser("~")
+DEFAULT_CACHE_PATH = os.path.join(CONFIG_DIR, ".folder_analyzer_cache_v3.sqlite3")
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_DAEMON_SOCKET = os.path.join(CONFIG_DIR, ".folder_analyzer.sock")
+# Cambiar si varía el formato de las secciones renderizadas, para no reutilizar entradas viejas.
+RENDER_FORMAT_VERSION = 1
+INDEX_FORMAT_VERSION = 2
+INDEX_STATUS_TRUNCATED = "recortado" # estado en el índice de un archivo con contenido incompleto
+INDEX_STATUS_SKIPPED = "omitido"
+INDEX_STATUS_ERROR = "error de lectura"
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+DEFAULT_READ_WORKERS = 4
+DEFAULT_SCAN_WORKERS = 1
+SCAN_AHEAD_DIRS_PER_WORKER = 64 # listados adelantados que esperan al recorrido, por hilo de escaneo
+DEFAULT_READ_AHEAD_BYTES = 64 * 1024 * 1024
+DEFAULT_READ_TIMEOUT_SECONDS = 60 # una lectura que no termina en este plazo se abandona (0 = sin plazo)
+READ_WAIT_POLL_SECONDS = 0.1 # al esperar una lectura se revisa la cancelación con este intervalo
+DEFAULT_MAX_FILE_BYTES = 0 # sin límite; con un límite, los archivos más grandes se recortan (inicio y final)
+DEFAULT_MAX_TOTAL_BYTES = 0 # 0 = sin límite para el contenido total del reporte
+BINARY_SNIFF_BYTES = 8192
+LINE_PREFIX_TABLE_LINES = 20000
+UNCOMMON_LINE_BREAKS = "\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029" # str.splitlines() también corta en estos
+ASCII_BLANK_RE = re.compile(rb"[\t-\r\x1c- ]*\Z") # los espacios ASCII de str.isspace()
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+ARCHIVE_STREAM_CHUNK = 1024 * 1024
+PROGRESS_PRINT_INTERVAL_SECONDS = 0.5
+DEFAULT_PROFILE_TOP_N = 20
+PROGRESS_RATE_MIN_SECONDS = 0.5 # no se muestran velocidades ni ETA hasta tener una muestra mínima
+PROGRESS_FILE_OVERHEAD_BYTES = 16 * 1024 # en el progreso, abrir un archivo y escribir su encabezado cuenta como leer estos bytes
+ESTIMATE_BYTES_PER_LINE = 40 # promedio para estimar las líneas del reporte antes de leer los archivos
+ESTIMATE_SECTION_CHARS = 170 # encabezado y marco de cada sección, sin el nombre ni la ruta del archivo
+ESTIMATE_FRAME_CHARS = 800 # datos del análisis al inicio y cierre del reporte
+DEFAULT_ESTIMATE_TOP_N = 10
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+class ReportEstimateDeclined(AnalysisCancelled):
+    # Quien revisa la estimación (confirm_estimate) decidió no generar el reporte.
+    def __init__(self, message, estimate):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+class NoFilesToAnalyze(Exception):
+    pass
+
+
+class ReadStalled(TimeoutError):
+    # Una lectura, listado o stat que superó options.read_timeout (se trata como un OSError).
+    pass
+
+
+class GitError(Exception):
+    pass
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class DaemonError(Exception):
+    pass
+
+
+class Utf8Content:
+    # Contenido UTF-8 válido y sin "\r" que se copia al reporte tal como está en disco, sin
+    # decodificarlo ni volver a codificarlo. Solo se usa con destinos que aceptan bytes
+    # (`write_bytes`). `parts` son los bloques que se escriben uno tras otro (sin concatenarlos),
+    # `chars` el largo en caracteres (para las posiciones del reporte) y `blank` indica si solo
+    # contiene espacios.
+    __slots__ = ('parts', 'chars', 'blank')
+
+    def __init__(self, parts, chars, blank=False):
+        self.parts = parts; self.chars = chars; self.blank = blank
+
+
+class SkippedContent(str):
+    # Texto que reemplaza el contenido de un archivo que no se incluye (binario, fuera del
+    # presupuesto total). `cacheable` indica si depende solo del archivo y puede ir a la caché.
+    def __new__(cls, text, cacheable=True):
+        obj = super().__new__(cls, text)
+        obj.cacheable = cacheable
+        return obj
+
+
+class ReportWriter:
+    # Escribe cada bloque del reporte en el destino a medida que se produce. El resultado
+    # es idéntico a "\n".join(bloques), pero sin mantener el reporte completo en memoria.
+    # `position` cuenta los caracteres escritos, para ubicar cada sección dentro del reporte.
+    def __init__(self, stream):
+        self.stream = stream
+        self.started = False
+        self.position = 0
+        self.on_section = getattr(stream, "begin_section", None)
+
+    def append(self, text):
+        if self.started: self.stream.write("\n"); self.position += 1
+        else: self.started = True
+        if isinstance(text, Utf8Content):
+            for part in text.parts: self.stream.write_bytes(part)
+            self.position += text.chars
+        else: self.stream.write(text); self.position += len(text)
+
+    def write_raw(self, text):
+        # Texto ya formateado (incluye su propio separador inicial), p. ej. una sección copiada.
+        self.stream.write(text); self.position += len(text)
+
+    def extend(self, lines):
+        for line in lines: self.append(line)
+
+    def begin_section(self, file_path=None, base_folder=None):
+        # Avisa al destino que empieza la sección de un archivo (None: el cierre del reporte). Solo
+        # lo usan los destinos divididos en partes, que únicamente cortan entre secciones.
+        if self.on_section: self.on_section(os.path.relpath(file_path, os.path.dirname(base_folder)) if file_path else None)
+
+
+_line_prefix_tables = {} # str/bytes -> ["   1| ", "\n   2| ", "\n   3| ", ...]
+_line_prefix_lock = threading.Lock()
+
+
+def _line_prefixes(count, kind):
+    table = _line_prefix_tables.get(kind)
+    if table is None:
+        with _line_prefix_lock:
+            prefixes = ["   1| "] + ["\n{:4d}| ".format(i) for i in range(2, LINE_PREFIX_TABLE_LINES + 1)]
+            table = _line_prefix_tables.setdefault(kind, prefixes if kind is str else [p.encode('ascii') for p in prefixes])
+    if count <= len(table): return table[:count]
+    extra = map("\n{:4d}| ".format, range(len(table) + 1, count + 1))
+    return table + (list(extra) if kind is str else [p.encode('ascii') for p in extra])
+
+
+def number_lines(text):
+    # Igual que "\n".join(f"{i:4d}| {línea}" for i, línea in enumerate(text.splitlines(), 1)), pero
+    # sin un bucle de Python por línea: los prefijos (que ya incluyen el salto de la línea anterior)
+    # salen de una tabla y se intercalan con las líneas en una lista que se une de una sola vez.
+    # Con bytes solo coincide si el texto no tiene "\r" ni UNCOMMON_LINE_BREAKS.
+    lines = text.splitlines()
+    parts = [None] * (2 * len(lines))
+    parts[0::2] = _line_prefixes(len(lines), type(text)); parts[1::2] = lines
+    return type(text)().join(parts)
+
+
+def create_report_spool():
+    return tempfile.SpooledTemporaryFile(max_size=REPORT_SPOOL_MAX_SIZE, mode='w+', encoding='utf-8', newline='')
+
+
+def compression_from_path(path):
+    lower = path.lower()
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if lower.endswith(suffix): return compression
+    return None
+
+
+class ShardedReportOutput:
+    # Destino del reporte con compresión gzip/xz opcional y, si se indica un tamaño de parte
+    # (`shard_bytes`, en bytes UTF-8 sin comprimir, o `shard_lines`), dividido en archivos
+    # "nombre.part001.txt[.gz]". Solo se corta entre secciones: cada archivo analizado queda entero
+    # en una parte (una sección más grande que una parte ocupa la suya) y concatenar las partes
+    # reproduce el reporte. Todo se escribe en una pasada; el manifiesto "nombre.manifest.json"
+    # indica qué archivos contiene cada parte.
+    def __init__(self, output_path, compression=None, shard_bytes=0, shard_lines=0):
+        self.output_path = output_path
+        self.compression = compression
+        self.shard_bytes = shard_bytes
+        self.shard_lines = shard_lines
+        self.sharded = bool(shard_bytes or shard_lines)
+        self.shards = [] # {"path", "bytes", "lines", "files"} de cada parte escrita
+        self.pending = []; self.pending_bytes = self.pending_lines = 0; self.pending_label = None
+        self.streaming = False # la sección actual ya ocupa una parte propia: se escribe sin acumular
+        self._file = None
+        self.closed = False
+        suffix = COMPRESSION_SUFFIXES.get(compression, "")
+        base = output_path[:-len(suffix)] if suffix and output_path.lower().endswith(suffix) else output_path
+        self.stem, self.extension = os.path.splitext(base)
+        self.manifest_path = f"{self.stem}.manifest.json" if self.sharded else None
+        if not self.sharded: self._open(output_path)
+
+    def _open(self, path):
+        if self.compression == "gzip": self._file = gzip.open(path, 'wb', compresslevel=GZIP_COMPRESS_LEVEL)
+        elif self.compression == "xz": self._file = lzma.open(path, 'wb')
+        else: self._file = open(path, 'wb')
+
+    def write(self, text):
+        self.write_bytes(text.encode('utf-8'))
+        return len(text)
+
+    def write_bytes(self, data):
+        if not self.sharded: self._file.write(data)
+        elif self.streaming: self._write_shard(data)
+        else:
+            self.pending.append(data); self.pending_bytes += len(data); self.pending_lines += data.count(b"\n")
+            if self._exceeds(self.pending_bytes, self.pending_lines): self._flush_pending(); self.streaming = True
+
+    def begin_section(self, label):
+        if not self.sharded: return
+        self._flush_pending(); self.streaming = False; self.pending_label = label
+
+    def _exceeds(self, size, lines):
+        return bool((self.shard_bytes and size > self.shard_bytes) or (self.shard_lines and lines > self.shard_lines))
+
+    def _flush_pending(self):
+        if not self.pending: return
+        shard = self.shards[-1] if self.shards else None
+        if shard is None or (shard["bytes"] and self._exceeds(shard["bytes"] + self.pending_bytes, shard["lines"] + self.pending_lines)):
+            self._next_shard()
+        for data in self.pending: self._write_shard(data)
+        if self.pending_label is not None: self.shards[-1]["files"].append(self.pending_label)
+        self.pending = []; self.pending_bytes = self.pending_lines = 0
+
+    def _write_shard(self, data):
+        shard = self.shards[-1]
+        self._file.write(data); shard["bytes"] += len(data); shard["lines"] += data.count(b"\n")
+
+    def _next_shard(self):
+        if self._file: self._file.close()
+        path = f"{self.stem}.part{len(self.shards) + 1:03d}{self.extension}{COMPRESSION_SUFFIXES.get(self.compression, '')}"
+        self._open(path)
+        self.shards.append({"path": os.path.basename(path), "bytes": 0, "lines": 0, "files": []})
+
+    def written_paths(self):
+        if not self.sharded: return [self.output_path]
+        directory = os.path.dirname(self.output_path)
+        return [os.path.join(directory, shard["path"]) for shard in self.shards] + [self.manifest_path]
+
+    def close(self, completed=True):
+        # Un reporte incompleto (cancelado o con error) no deja archivos a medias.
+        if self.closed: return
+        self.closed = True
+        try:
+            if completed and self.sharded: self._flush_pending()
+        finally:
+            if self._file: self._file.close(); self._file = None
+        if not completed:
+            for path in self.written_paths():
+                if os.path.exists(path): os.remove(path)
+            return
+        if self.sharded:
+            manifest = {"version": SHARD_MANIFEST_VERSION, "compression": self.compression, "shard_bytes": self.shard_bytes,
+                        "shard_lines": self.shard_lines, "shards": self.shards}
+            with open(self.manifest_path, 'w', encoding='utf-8') as f: json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def copy_report_sections(report, sections, output, folder_path):
+    # Copia un reporte ya generado (el temporal de la interfaz) a `output` en una sola pasada
+    # secuencial, marcando el inicio de cada sección para que las partes corten entre archivos.
+    writer = ReportWriter(output); report.seek(0); position = 0
+    def copy_until(target):
+        nonlocal position
+        while target is None or position < target:
+            chunk = report.read(REPORT_COPY_CHUNK_CHARS if target is None else min(target - position, REPORT_COPY_CHUNK_CHARS))
+            if not chunk: break
+            writer.write_raw(chunk); position += len(chunk)
+    for file_path, start, end, _ in sections:
+        copy_until(start); writer.begin_section(file_path, folder_path)
+    if sections: copy_until(sections[-1][2])
+    writer.begin_section(None); copy_until(None)
+
+
+class ReportPager:
+    # Acceso por líneas a un reporte guardado en un archivo temporal, sin cargarlo en memoria: una
+    # pasada inicial guarda la posición de cada bloque de PAGER_CHECKPOINT_LINES líneas y la línea
+    # donde empieza cada sección. Leer una página o buscar solo toca los bloques necesarios. Cada
+    # lectura toma `lock` por un bloque a la vez, para no frenar al modo vigilancia.
+    def __init__(self, report, sections, folder_path, lock=None):
+        self.report = report
+        self.lock = lock or threading.Lock()
+        self.paths = [os.path.relpath(path, os.path.dirname(folder_path)) for path, _, _, _ in sections]
+        self.section_starts = [start for _, start, _, _ in sections]
+        self.section_lines = []
+        self.checkpoints = [] # posición (tell) del inicio de cada bloque
+        self.total_lines = 0
+
+    def build(self, cancel=None):
+        # Devuelve False si se canceló. Una sección comienza en la primera línea posterior a su
+        # posición (el separador "\n" con que empieza pertenece a la línea anterior).
+        position = 0; line_number = 0; section = 0; next_position = 0
+        while True:
+            if cancel and cancel(): return False
+            block_position = next_position
+            with self.lock:
+                self.report.seek(block_position)
+                lines = [line for line in (self.report.readline() for _ in range(PAGER_CHECKPOINT_LINES)) if line]
+                next_position = self.report.tell()
+            if not lines: break
+            self.checkpoints.append(block_position)
+            for line in lines:
+                while section < len(self.section_starts) and self.section_starts[section] < position:
+                    self.section_lines.append(line_number); section += 1
+                position += len(line); line_number += 1
+            if len(lines) < PAGER_CHECKPOINT_LINES: break
+        self.section_lines.extend([max(0, line_number - 1)] * (len(self.section_starts) - section))
+        self.total_lines = line_number
+        return True
+
+    def _read_block(self, block, blocking=True):
+        if not self.lock.acquire(blocking): return None
+        try:
+            self.report.seek(self.checkpoints[block])
+            return [self.report.readline().rstrip("\n") for _ in range(PAGER_CHECKPOINT_LINES)]
+        finally: self.lock.release()
+
+    def get_lines(self, start, count, blocking=True):
+        # Líneas [start, start + count) sin el salto final; None si el reporte está ocupado y no se espera.
+        start = max(0, min(start, self.total_lines)); end = min(self.total_lines, start + count)
+        lines = []; block = start // PAGER_CHECKPOINT_LINES
+        while start + len(lines) < end:
+            block_lines = self._read_block(block, blocking)
+            if block_lines is None: return None
+            offset = (start + len(lines)) - block * PAGER_CHECKPOINT_LINES
+            lines.extend(block_lines[offset:offset + end - start - len(lines)]); block += 1
+        return lines
+
+    def find(self, query, start_line, backwards=False, cancel=None):
+        # Primera coincidencia (línea, columna) desde `start_line` (incluida) en el sentido pedido,
+        # volviendo a empezar por el otro extremo. Sin distinguir mayúsculas; None si no hay.
+        needle = query.lower()
+        if not needle or not self.total_lines: return None
+        block_count = (self.total_lines + PAGER_CHECKPOINT_LINES - 1) // PAGER_CHECKPOINT_LINES
+        first_block = min(start_line, self.total_lines - 1) // PAGER_CHECKPOINT_LINES
+        for step in range(block_count + 1):
+            if cancel and cancel(): return None
+            block = (first_block - step if backwards else first_block + step) % block_count
+            block_lines = self._read_block(block)
+            base = block * PAGER_CHECKPOINT_LINES
+            indexes = range(len(block_lines) - 1, -1, -1) if backwards else range(len(block_lines))
+            for i in indexes:
+                line_number = base + i
+                if line_number >= self.total_lines: continue
+                # El primer bloque se revisa en dos tramos: desde start_line al principio y el resto al final.
+                if step == 0 and (line_number > start_line if backwards else line_number < start_line): continue
+                if step == block_count and not (line_number > start_line if backwards else line_number < start_line): continue
+                column = block_lines[i].lower().find(needle)
+                if column >= 0: return line_number, column
+        return None
+
+    def find_section(self, text, after=-1):
+        # Índice de la siguiente sección (después de `after`) cuya ruta contiene `text`.
+        needle = text.lower()
+        for step in range(1, len(self.paths) + 1):
+            index = (after + step) % len(self.paths)
+            if needle in self.paths[index].lower(): return index
+        return None
+
+
+def _glob_to_regex(pattern):
+    # Traduce un glob estilo .gitignore a una expresión regular: "*" y "?" no cruzan "/",
+    # "**/" inicial o intermedio equivale a cero o más carpetas y "/**" final a todo el contenido.
+    parts = []; i = 0; n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i) and (i == 0 or pattern[i-1] == '/') and (i + 2 == n or pattern[i+2] == '/'):
+                if i + 2 == n: parts.append('.*'); i += 2
+                else: parts.append('(?:.*/)?'); i += 3
+                continue
+            parts.append('[^/]*'); i += 1
+        elif c == '?': parts.append('[^/]'); i += 1
+        elif c == '[':
+            k = i + 1
+            if pattern[k:k+1] in ('!', '^'): k += 1
+            if pattern[k:k+1] == ']': k += 1
+            j = pattern.find(']', k)
+            if j == -1: parts.append('\\['); i += 1; continue
+            body = pattern[i+1:j]
+            if body[:1] in ('!', '^'): body = '^' + body[1:]
+            parts.append('[' + body.replace('\\', '\\\\').replace('[', '\\[') + ']'); i = j + 1
+        elif c == '\\' and i + 1 < n: parts.append(re.escape(pattern[i+1])); i += 2
+        else: parts.append(re.escape(c)); i += 1
+    return ''.join(parts)
+
+
+def _combine_globs(globs):
+    # Alternativas en orden inverso: la primera que coincide es la del patrón más reciente.
+    if not globs: return None
+    return re.compile("|".join(f"(?P<p{index}>{regex})" for index, regex in reversed(globs)), re.DOTALL)
+
+
+def _best_match(regex, text, best):
+    m = regex.fullmatch(text)
+    return max(best, int(m.lastgroup[1:])) if m else best
+
+
+class _PatternNode:
+    # Nodo del trie de segmentos. Las aristas literales se resuelven con un diccionario, las de
+    # glob con una expresión regular por segmento y "**" con un nodo `star` que sigue activo en
+    # todas las subcarpetas. Los patrones que terminan en un nodo hijo guardan su índice en
+    # `indices`; los que terminan en un glob se combinan en `terminal_regex`.
+    __slots__ = ('children', 'glob_children', 'star', 'is_star', 'indices', 'all_indices',
+                 'terminal_globs', 'terminal_regex', 'is_useful')
+
+    def __init__(self, is_star=False):
+        self.children = {}
+        self.glob_children = {}
+        self.star = None
+        self.is_star = is_star
+        self.indices = [-1, -1] # Índice 0: archivos, 1: carpetas
+        self.all_indices = [-1, -1] # Patrones terminados en "/**": todo lo que haya debajo
+        self.terminal_globs = ([], [])
+
+    def compile(self):
+        self.terminal_regex = tuple(_combine_globs(globs) for globs in self.terminal_globs)
+        self.is_useful = bool(self.children or self.glob_children or self.star or any(self.terminal_regex)
+                              or max(self.all_indices) >= 0)
+        for child in self.children.values(): child.compile()
+        for _, child in self.glob_children.values(): child.compile()
+        if self.star is not None: self.star.compile()
+
+
+class IgnoreMatcher:
+    # Compila una lista de patrones de ignorados una sola vez: los nombres literales van a un
+    # diccionario y el resto a un trie de segmentos, de modo que el costo por entrada no depende
+    # del largo de la lista. Como en .gitignore, si varios patrones coinciden gana el último, lo
+    # que permite reincluir elementos con "!patrón".
+    #
+    # Un "/" final limita el patrón a carpetas y un "/" inicial o intermedio lo ancla a la
+    # carpeta base. En la lista de la aplicación (legacy=True) un patrón sin "/" solo afecta a
+    # archivos, como siempre; en archivos .gitignore afecta a archivos y carpetas.
+    def __init__(self, patterns, legacy=True):
+        self.negated = []
+        self.name_literals = ({}, {})
+        self.root = _PatternNode()
+        for raw in patterns:
+            parsed = self._parse(raw, legacy)
+            if parsed is None: continue
+            negated, pattern, anchored, kinds = parsed
+            index = len(self.negated); self.negated.append(negated)
+            if not anchored and not self._is_glob(pattern):
+                for kind in kinds: self.name_literals[kind][pattern] = index
+            else:
+                self._insert(pattern.split('/') if anchored else ['**', pattern], kinds, index)
+        self.root.compile()
+        self.root_states = self._add_state([], self.root)
+
+    def _insert(self, segments, kinds, index):
+        node = self.root
+        last = len(segments) - 1
+        for position, segment in enumerate(segments):
+            if segment == '**':
+                if node.star is None: node.star = _PatternNode(is_star=True)
+                node = node.star
+                if position == last:
+                    for kind in kinds: node.all_indices[kind] = index
+            elif position == last and self._is_glob(segment):
+                for kind in kinds: node.terminal_globs[kind].append((index, _glob_to_regex(segment)))
+            elif position == last:
+                node = node.children.setdefault(segment, _PatternNode())
+                for kind in kinds: node.indices[kind] = index
+            elif self._is_glob(segment):
+                if segment not in node.glob_children:
+                    node.glob_children[segment] = (re.compile(_glob_to_regex(segment), re.DOTALL), _PatternNode())
+                node = node.glob_children[segment][1]
+            else:
+                node = node.children.setdefault(segment, _PatternNode())
+
+    @staticmethod
+    def _is_glob(text):
+        return any(c in text for c in '*?[\\')
+
+    @staticmethod
+    def _parse(raw, legacy):
+        item = raw if legacy else raw.rstrip()
+        if not item or (not legacy and item.startswith('#')): return None
+        negated = item.startswith('!')
+        if negated: item = item[1:]
+        elif item[:2] in ('\\!', '\\#'): item = item[1:]
+        dirs_only = item.endswith('/')
+        item = item.rstrip('/')
+        if not item: return None
+        anchored = '/' in item
+        item = posixpath.normpath(item).lstrip('/')
+        if item.startswith('**/') and '/' not in item[3:]: item = item[3:]; anchored = False
+        if item in ('', '.', '**'): return None
+        if dirs_only: kinds = (1,)
+        elif legacy and not anchored: kinds = (0,)
+        else: kinds = (0, 1)
+        return negated, item, anchored, kinds
+
+    @staticmethod
+    def _add_state(states, node):
+        # Entrar en un nodo también activa su "**" (que puede no abarcar ninguna carpeta).
+        while node is not None:
+            if node.is_useful and node not in states: states.append(node)
+            node = node.star
+        return states
+
+    def child_states(self, states, name):
+        result = []
+        for node in states:
+            child = node.children.get(name)
+            if child is not None: self._add_state(result, child)
+            for regex, glob_node in node.glob_children.values():
+                if regex.fullmatch(name): self._add_state(result, glob_node)
+            if node.is_star: self._add_state(result, node)
+        return result
+
+    def match(self, name, is_dir, states):
+        # Devuelve el índice del último patrón que coincide con la entrada, o -1. `states` son los
+        # nodos del trie activos en la carpeta que la contiene.
+        kind = 1 if is_dir else 0
+        best = self.name_literals[kind].get(name, -1)
+        for node in states:
+            child = node.children.get(name)
+            if child is not None and child.indices[kind] > best: best = child.indices[kind]
+            if node.all_indices[kind] > best: best = node.all_indices[kind]
+            regex = node.terminal_regex[kind]
+            if regex is not None: best = _best_match(regex, name, best)
+        return best
+
+    @classmethod
+    def from_gitignore(cls, gitignore_path):
+        try:
+            with open(gitignore_path, 'r', encoding='utf-8', errors='replace') as f: lines = f.read().splitlines()
+        except OSError: return None
+        matcher = cls(lines, legacy=False)
+        return matcher if matcher.negated else None
+
+
+class IgnoreContext:
+    # Estado de los ignorados para una carpeta del recorrido: por cada matcher, los nodos de su
+    # trie activos en esta carpeta. Las capas de archivos .gitignore van de la más superficial a
+    # la más profunda y la lista de la aplicación va al final, así que tiene la última palabra.
+    __slots__ = ('layers',)
+
+    def __init__(self, layers):
+        self.layers = layers
+
+    @classmethod
+    def for_root(cls, matcher):
+        return cls(((matcher, matcher.root_states),))
+
+    def is_ignored(self, name, is_dir):
+        for matcher, states in reversed(self.layers):
+            index = matcher.match(name, is_dir, states)
+            if index >= 0: return not matcher.negated[index]
+        return False
+
+    def child(self, name):
+        return IgnoreContext(tuple((matcher, matcher.child_states(states, name) if states else states)
+                                   for matcher, states in self.layers))
+
+    def with_gitignore(self, dir_path):
+        matcher = IgnoreMatcher.from_gitignore(os.path.join(dir_path, '.gitignore'))
+        if matcher is None: return self
+        return IgnoreContext(self.layers[:-1] + ((matcher, matcher.root_states), self.layers[-1]))
+
+
+class ReadWorkerPool:
+    # Hilos de lectura de tipo daemon: una lectura colgada (un montaje NFS caído, un dispositivo) no
+    # se puede interrumpir, y ThreadPoolExecutor espera a sus hilos al cerrar el proceso. Cada tarea
+    # anota en su Future cuándo empezó (`started`) para medir su plazo; abandon() reemplaza un hilo
+    # que quedó colgado para no perder capacidad de lectura. Varios hilos pueden encolar a la vez
+    # (el escaneo en paralelo); lo que se encola después de shutdown() se cancela.
+    def __init__(self, workers, thread_name_prefix):
+        self.tasks = queue.SimpleQueue()
+        self.thread_name_prefix = thread_name_prefix
+        self.lock = threading.Lock()
+        self.closed = False
+        self.threads = 0
+        for _ in range(workers): self._spawn()
+
+    def _spawn(self):
+        with self.lock: self.threads += 1; number = self.threads
+        threading.Thread(target=self._run, name=f"{self.thread_name_prefix}_{number}", daemon=True).start()
+
+    def _run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None: return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel(): continue
+            future.started = time.monotonic()
+            try: future.set_result(fn(*args))
+            except BaseException as e: future.set_exception(e)
+
+    def submit(self, fn, *args):
+        future = Future(); future.started = None
+        with self.lock:
+            if self.closed: future.cancel()
+            else: self.tasks.put((future, fn, args))
+        return future
+
+    def abandon(self):
+        self._spawn()
+
+    def shutdown(self):
+        # Cancela las tareas que no empezaron; los hilos libres terminan y los colgados se abandonan.
+        with self.lock:
+            self.closed = True
+            while True:
+                try: task = self.tasks.get_nowait()
+                except queue.Empty: break
+                if task is not None: task[0].cancel()
+            for _ in range(self.threads): self.tasks.put(None)
+
+
+class ReadAheadReader:
+    # Lee archivos en un grupo de hilos manteniendo lecturas en curso por delante del
+    # renderizado. Los resultados se entregan en el orden en que se añadieron con feed().
+    # Se limitan tanto la cantidad de lecturas pendientes como sus bytes (según el tamaño
+    # en disco); siempre se permite al menos una lectura pendiente. Los archivos cuya sección
+    # está vigente en la caché, o que ya no entran en el límite total de contenido, no se leen.
+    # Aun con un solo hilo no se lee en el hilo del reporte: una lectura colgada se puede
+    # abandonar por su plazo o por la cancelación.
+    def __init__(self, engine, workers, read_ahead_bytes):
+        self.engine = engine
+        self.read_ahead_bytes = read_ahead_bytes
+        self.max_pending = workers * 4
+        self.pool = ReadWorkerPool(workers, "folder_analyzer_reader")
+        self.queued = deque()
+        self.pending = deque()
+        self.pending_bytes = 0
+
+    def feed(self, file_path):
+        self.queued.append(file_path)
+        self._fill()
+
+    def _fill(self):
+        while self.queued and len(self.pending) < self.max_pending and (not self.pending or self.pending_bytes < self.read_ahead_bytes):
+            if self.engine.cancel_flag: return
+            file_path = self.queued.popleft()
+            file_stat = self.engine._stat_file(file_path)
+            if not self.engine._charge_budget(file_stat):
+                skipped = Future(); skipped.set_result((self.engine.budget_skipped_content(), None))
+                self.pending.append((file_path, file_stat, 0, skipped)); continue
+            if self.engine._is_cached(file_path, file_stat):
+                self.pending.append((file_path, file_stat, 0, None)); continue
+            # Los hashes van al índice vigente al pedir la lectura: una lectura descartada por
+            # restart() no puede pisar el hash de la que la reemplaza.
+            digests = self.engine.duplicates.digests if self.engine._wants_hash(file_stat) else None
+            size = self.engine._budget_size(file_stat)
+            self.pending.append((file_path, file_stat, size, self.pool.submit(self.engine._read_file_safely, file_path, digests)))
+            self.pending_bytes += size
+
+    def __iter__(self):
+        # Entrega (ruta, stat, contenido, error de lectura, en_caché).
+        while self.queued or self.pending:
+            if self.engine.cancel_flag: return
+            self._fill()
+            file_path, file_stat, size, future = self.pending.popleft()
+            if future is None:
+                self._fill()
+                yield file_path, file_stat, None, None, True
+                continue
+            wait_started = time.perf_counter()
+            result = self.engine._wait_for_read(file_path, future, self.pool)
+            if result is None: return # cancelado durante la espera
+            content, read_error = result
+            if self.engine.profile: self.engine.profile.add("espera de lecturas", time.perf_counter() - wait_started)
+            self.pending_bytes -= size
+            self._fill()
+            yield file_path, file_stat, content, read_error, False
+
+    def restart(self, files):
+        # Descarta las lecturas adelantadas y vuelve a empezar con `files` (cambió el límite total).
+        for _, _, _, future in self.pending:
+            if future is not None: future.cancel()
+        self.pending.clear(); self.pending_bytes = 0
+        self.queued = deque(files)
+        self._fill()
+
+    def close(self):
+        self.pool.shutdown()
+        self.queued.clear(); self.pending.clear()
+
+
+def is_archive_path(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+class ArchiveMemberStat:
+    __slots__ = ('st_size', 'st_mtime', 'st_mtime_ns')
+
+    def __init__(self, size, mtime):
+        self.st_size = size; self.st_mtime = mtime; self.st_mtime_ns = int(mtime * 1e9)
+
+
+class ArchiveSource:
+    # Un .zip o .tar (.gz/.bz2/.xz) analizado como si fuera una carpeta: los miembros se leen
+    # directamente del archivo comprimido, sin extraerlos a disco. Cada miembro aparece en el
+    # reporte como "archivo.zip/ruta/interna". Los zip admiten lecturas en paralelo. Un tar
+    # comprimido solo se puede leer hacia adelante (volver atrás descomprime de nuevo desde el
+    # inicio): tras expect() se recorre una sola vez en el orden del archivo, y los miembros que el
+    # reporte todavía no pidió se guardan en memoria hasta el límite de lectura adelantada y, más
+    # allá, en un archivo temporal.
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.members = {} # ruta en el reporte -> (ruta interna, miembro, stat)
+        self.lock = threading.Lock()
+        self.zip = self.tar = None
+        self.expected = set() # miembros del tar que el reporte va a pedir y todavía no pidió
+        self.tar_order = [] # esos miembros en el orden del archivo
+        self.tar_position = 0
+        self.passed = {} # ruta -> bytes, o (posición, tamaño) en `spool`
+        self.passed_bytes = 0
+        self.max_passed_bytes = 0
+        self.spool = None
+        try:
+            if archive_path.lower().endswith('.zip'):
+                self.zip = zipfile.ZipFile(archive_path)
+                for info in self.zip.infolist():
+                    if not info.is_dir(): self._add(self._zip_name(info), info, info.file_size, time.mktime(info.date_time + (0, 0, -1)))
+            else:
+                self.tar = tarfile.open(archive_path, 'r:*')
+                for info in self.tar.getmembers():
+                    if info.isfile(): self._add(info.name, info, info.size, info.mtime)
+        except (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+            self.close()
+            raise ArchiveError(f"No se pudo abrir el archivo comprimido: {e}")
+
+    @staticmethod
+    def _zip_name(info):
+        # Sin la marca UTF-8 (bit 11) zipfile decodifica como cp437, pero muchas herramientas guardan UTF-8 igual.
+        if info.flag_bits & 0x800: return info.filename
+        try: return info.filename.encode('cp437').decode('utf-8')
+        except UnicodeError: return info.filename
+
+    def _add(self, name, info, size, mtime):
+        parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+        if not parts or '..' in parts: return # rutas que saldrían del archivo
+        self.members[os.path.join(self.archive_path, *parts)] = ('/'.join(parts), info, ArchiveMemberStat(size, mtime))
+
+    def rel_paths(self):
+        return [rel_path for rel_path, _, _ in self.members.values()]
+
+    def stat(self, file_path):
+        member = self.members.get(file_path)
+        return member[2] if member else None
+
+    def expect(self, files, max_buffer_bytes):
+        # `files`: los archivos que se van a leer. Se puede volver a llamar (otra pasada desde el inicio).
+        if self.tar is None: return
+        with self.lock:
+            self._reset_pass()
+            self.expected = set(files) & self.members.keys()
+            self.tar_order = sorted(self.expected, key=lambda path: self.members[path][1].offset_data)
+            self.max_passed_bytes = max_buffer_bytes
+
+    @contextmanager
+    def open(self, file_path):
+        _, info, _ = self.members[file_path]
+        if self.zip is not None:
+            with self.zip.open(info) as f: yield f
+            return
+        with self.lock:
+            data = self._passed_member(file_path) if file_path in self.expected else None
+            if data is None:
+                # Es el siguiente de la pasada (o no se esperaba): se lee directamente del tar.
+                with self.tar.extractfile(info) as f: yield f
+                return
+        with io.BytesIO(data) as f: yield f
+
+    def _passed_member(self, file_path):
+        # Avanza la pasada hasta `file_path` guardando los miembros esperados que quedan atrás.
+        self.expected.discard(file_path)
+        while file_path not in self.passed and self.tar_position < len(self.tar_order):
+            path = self.tar_order[self.tar_position]; self.tar_position += 1
+            if path == file_path: return None
+            if path in self.expected: self._keep(path)
+        kept = self.passed.pop(file_path, None)
+        if kept is None or isinstance(kept, bytes):
+            if kept is not None: self.passed_bytes -= len(kept)
+            return kept
+        offset, size = kept
+        self.spool.seek(offset)
+        return self.spool.read(size)
+
+    def _keep(self, path):
+        _, info, _ = self.members[path]
+        with self.tar.extractfile(info) as f:
+            if self.passed_bytes + info.size <= self.max_passed_bytes:
+                self.passed[path] = f.read(); self.passed_bytes += info.size
+                return
+            if self.spool is None: self.spool = tempfile.TemporaryFile(prefix="folder_analyzer_tar_")
+            offset = self.spool.seek(0, os.SEEK_END)
+            shutil.copyfileobj(f, self.spool, ARCHIVE_STREAM_CHUNK)
+            self.passed[path] = (offset, info.size)
+
+    def _reset_pass(self):
+        self.passed.clear(); self.passed_bytes = 0; self.tar_position = 0
+        if self.spool is not None: self.spool.close(); self.spool = None
+
+    def close(self):
+        if self.zip is not None: self.zip.close()
+        if self.tar is not None: self.tar.close()
+        self._reset_pass()
+
+
+class AnalysisIndex:
+    # Escribe el análisis en una base SQLite: una fila por archivo (ruta relativa, lenguaje,
+    # tamaño, fecha de modificación, líneas, contenido, si el contenido está incompleto y la sección
+    # tal como aparece en el reporte) más un índice de texto completo FTS5 sobre la ruta y el contenido. Desde la base se
+    # puede volver a generar el reporte plano (export_index_report) o buscar (search_index).
+    #
+    # La conexión se abre en el hilo que ejecuta el análisis. Si el análisis no termina, la base
+    # se elimina.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = None
+        self.fts = False
+        self.files = 0
+
+    def open(self, folder_path, options, timestamp):
+        if os.path.exists(self.db_path): os.remove(self.db_path)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE files (id INTEGER PRIMARY KEY, file_path TEXT NOT NULL, path TEXT NOT NULL, name TEXT NOT NULL,
+                                language TEXT NOT NULL, size INTEGER, mtime REAL, lines INTEGER, content TEXT, status TEXT,
+                                body TEXT NOT NULL);
+            CREATE INDEX files_path ON files (path);
+            CREATE INDEX files_language_size ON files (language, size);""")
+        try:
+            self.conn.execute("CREATE VIRTUAL TABLE files_fts USING fts5(path, content, content='files', content_rowid='id')")
+            self.fts = True
+        except sqlite3.OperationalError: self.fts = False # SQLite compilado sin FTS5
+        self.conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                              [("version", str(INDEX_FORMAT_VERSION)), ("folder", folder_path),
+                               ("timestamp", timestamp.strftime(TIMESTAMP_FORMAT)),
+                               ("options", json.dumps(options.to_dict(), ensure_ascii=False)), ("fts", str(int(self.fts)))])
+        self.files = 0
+
+    def add_file(self, file_path, base_folder, file_stat, language, content, body, status=None):
+        # `content` es None si el archivo no se leyó (error, binario, fuera de presupuesto). `status`
+        # es None si el contenido está completo, o INDEX_STATUS_* si se recortó, se omitió o falló la lectura.
+        lines = None if content is None else content.count("\n") + (1 if content and not content.endswith("\n") else 0)
+        self.conn.execute("INSERT INTO files (file_path, path, name, language, size, mtime, lines, content, status, body) "
+                          "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          (file_path, os.path.relpath(file_path, os.path.dirname(base_folder)), os.path.basename(file_path), language,
+                           file_stat.st_size if file_stat is not None else None, file_stat.st_mtime if file_stat is not None else None,
+                           lines, content, status, body))
+        self.files += 1
+
+    def close(self, completed):
+        if self.conn is None: return
+        try:
+            if completed:
+                if self.fts: self.conn.execute("INSERT INTO files_fts (files_fts) VALUES ('rebuild')")
+                self.conn.execute("INSERT INTO meta VALUES ('files', ?)", (str(self.files),))
+                self.conn.commit()
+        finally:
+            self.conn.close(); self.conn = None
+            if not completed and os.path.exists(self.db_path): os.remove(self.db_path)
+
+
+def _open_index_readonly(db_path):
+    # La ruta va como URI (file:///...): sin codificar, un "?" o "#" en el nombre cortaría la ruta.
+    if not os.path.isfile(db_path): raise FileNotFoundError(f"No existe el índice: {db_path}")
+    return sqlite3.connect(f"{Path(os.path.abspath(db_path)).as_uri()}?mode=ro", uri=True)
+
+
+def export_index_report(db_path, out):
+    # Vuelve a generar el reporte plano, idéntico al original, a partir de un índice SQLite.
+    conn = _open_index_readonly(db_path)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        engine = FolderAnalysisEngine(AnalysisOptions.from_dict(json.loads(meta["options"])))
+        folder_path = meta["folder"]
+        timestamp = datetime.strptime(meta["timestamp"], TIMESTAMP_FORMAT)
+        files = [file_path for file_path, in conn.execute("SELECT file_path FROM files ORDER BY id")]
+        result_lines = ReportWriter(out)
+        engine.write_report_preamble(result_lines, folder_path, files, timestamp)
+        for file_path, body in conn.execute("SELECT file_path, body FROM files ORDER BY id"):
+            result_lines.append(engine.file_section_header(file_path, folder_path)); result_lines.append(body)
+        engine.write_report_footer(result_lines, timestamp)
+        return len(files)
+    finally:
+        conn.close()
+
+
+def search_index(db_path, query, limit=50):
+    # Devuelve [(ruta, fragmento, estado)] de los archivos que coinciden con una consulta FTS5 (o, si
+    # la base no tiene FTS5, que contienen el texto). `estado` es None si el contenido está completo
+    # (y siempre en las bases de la versión 1, que no lo guardaban).
+    conn = _open_index_readonly(db_path)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        status = "files.status" if int(meta["version"]) >= 2 else "NULL"
+        if meta["fts"] == "1":
+            return conn.execute(f"SELECT files.path, snippet(files_fts, 1, '[', ']', '...', 12), {status} FROM files_fts "
+                                "JOIN files ON files.id = files_fts.rowid WHERE files_fts MATCH ? ORDER BY rank LIMIT ?", (query, limit)).fetchall()
+        return conn.execute(f"SELECT path, '', {status} FROM files WHERE instr(content, ?) > 0 OR instr(path, ?) > 0 ORDER BY id LIMIT ?",
+                            (query, query, limit)).fetchall()
+    finally:
+        conn.close()
+
+
+class DuplicateIndex:
+    # Detecta archivos con contenido idéntico a uno anterior del reporte. El hash se calcula en los
+    # hilos de lectura sobre los mismos bytes que se renderizan (también dentro de zip y tar), así
+    # que nunca se vuelve a abrir un archivo: un archivo sin hash no se compara. Terminado el
+    # escaneo solo se calcula el de los tamaños que se repiten; mientras el escaneo continúa no se
+    # sabe y se calcula el de todo lo que se lee por adelantado.
+    def __init__(self, size_counts=None):
+        self.size_counts = size_counts # tamaño -> archivos del reporte con ese tamaño (None durante el escaneo)
+        self.digests = {} # ruta -> hash calculado en la lectura (desde los hilos de lectura)
+        self.by_digest = {}
+        self.duplicate_of = {} # duplicado -> original
+
+    def count_sizes(self, file_stats):
+        self.size_counts = Counter(file_stat.st_size for file_stat in file_stats if file_stat is not None)
+
+    def wants_hash(self, size):
+        return self.size_counts is None or self.size_counts[size] > 1
+
+    def find_original(self, file_path, size):
+        # Se llama en el orden del reporte; devuelve la ruta del archivo idéntico anterior o None.
+        digest = self.digests.pop(file_path, None)
+        if digest is None: return None
+        original = self.by_digest.setdefault((size, digest), file_path)
+        if original == file_path: return None
+        self.duplicate_of[file_path] = original
+        return original
+
+    @staticmethod
+    def digest(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def render_options_key(options):
+    # Opciones que cambian el cuerpo renderizado de una sección (no su encabezado).
+    return (f"v{RENDER_FORMAT_VERSION}:n{int(options.add_line_numbers)}:e{int(options.show_empty_files)}"
+            f":m{options.max_file_bytes}:b{int(options.skip_binary)}")
+
+
+class RenderCache:
+    # Caché persistente (SQLite) de las secciones ya renderizadas, indexada por ruta absoluta,
+    # tamaño, fecha de modificación y las opciones que afectan al renderizado. En un nuevo
+    # análisis solo se consulta el stat de cada archivo; los que no cambiaron no se vuelven a
+    # leer. El tamaño total se limita expulsando las entradas usadas hace más tiempo (LRU).
+    #
+    # La conexión se abre en el hilo que ejecuta el análisis; el índice en memoria
+    # (ruta -> tamaño, mtime) se puede consultar desde cualquier hilo.
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.conn = None
+        self.options_key = None
+        self.index = {}
+        self.hits = 0
+        self.misses = 0
+        self._used = []
+
+    def open(self, folder_path, options):
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS sections (
+                                 path TEXT NOT NULL, options TEXT NOT NULL, size INTEGER NOT NULL,
+                                 mtime_ns INTEGER NOT NULL, body TEXT NOT NULL, nbytes INTEGER NOT NULL,
+                                 last_used REAL NOT NULL, PRIMARY KEY (path, options))""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sections_last_used ON sections (last_used)")
+        self.options_key = render_options_key(options)
+        self.hits = self.misses = 0; self._used = []
+        # Rango de rutas bajo la carpeta: todas empiezan con "carpeta" + separador.
+        prefix = os.path.join(os.path.abspath(folder_path), "")
+        rows = self.conn.execute("SELECT path, size, mtime_ns FROM sections WHERE options = ? AND path >= ? AND path < ?",
+                                 (self.options_key, prefix, prefix + "\U0010ffff"))
+        self.index = {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def is_fresh(self, file_path, file_stat):
+        return self.index.get(os.path.abspath(file_path)) == (file_stat.st_size, file_stat.st_mtime_ns)
+
+    def get(self, file_path):
+        abs_path = os.path.abspath(file_path)
+        row = self.conn.execute("SELECT body FROM sections WHERE path = ? AND options = ?", (abs_path, self.options_key)).fetchone()
+        if row is None: return None
+        self.hits += 1; self._used.append(abs_path)
+        return row[0]
+
+    def put(self, file_path, file_stat, body):
+        self.misses += 1
+        self.conn.execute("INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (os.path.abspath(file_path), self.options_key, file_stat.st_size, file_stat.st_mtime_ns,
+                           body, len(body), time.time()))
+
+    def close(self):
+        if self.conn is None: return
+        try:
+            now = time.time()
+            self.conn.executemany("UPDATE sections SET last_used = ? WHERE path = ? AND options = ?",
+                                  ((now, path, self.options_key) for path in self._used))
+            self.evict()
+            self.conn.commit()
+        finally:
+            self.conn.close(); self.conn = None; self.index = {}
+
+    def evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM sections").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0: return
+        doomed = []
+        for rowid, nbytes in self.conn.execute("SELECT rowid, nbytes FROM sections ORDER BY last_used"):
+            doomed.append((rowid,)); excess -= nbytes
+            if excess <= 0: break
+        self.conn.executemany("DELETE FROM sections WHERE rowid = ?", doomed)
+
+    def summary(self):
+        return f"Caché: {self.hits} aciertos, {self.misses} fallos"
+
+
+def format_size(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB": break
+        num_bytes /= 1024
+    return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+
+
+def format_scan_errors(scan_errors, limit=10):
+    # Aviso para las carpetas que no se pudieron listar (su contenido falta en el reporte).
+    lines = [f"Aviso: no se pudieron listar {len(scan_errors)} carpeta(s); su contenido no está en el reporte:"]
+    lines.extend(f"  {dir_path}: {error}" for dir_path, error in sorted(scan_errors)[:limit])
+    if len(scan_errors) > limit: lines.append(f"  ... y {len(scan_errors) - limit} más")
+    return "\n".join(lines)
+
+
+def format_stalled_reads(stalled_reads, limit=10):
+    lines = [f"Aviso: la lectura de {len(stalled_reads)} archivo(s) superó el plazo y se omitieron del reporte:"]
+    lines.extend(f"  {file_path}" for file_path in stalled_reads[:limit])
+    if len(stalled_reads) > limit: lines.append(f"  ... y {len(stalled_reads) - limit} más")
+    return "\n".join(lines)
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60: return f"{seconds}s"
+    if seconds < 3600: return f"{seconds//60}m {seconds%60:02d}s"
+    return f"{seconds//3600}h {(seconds%3600)//60:02d}m"
+
+
+class AnalysisProgress:
+    # Contadores compartidos entre el hilo de análisis y quien muestra el progreso. El análisis
+    # solo actualiza atributos (sin formatear textos ni notificar a nadie); la interfaz o la
+    # consola llaman a snapshot() a su propio ritmo. El porcentaje y el tiempo restante se ponderan
+    # por bytes (más un costo fijo por archivo): un archivo enorme avanza la barra según su tamaño.
+    def __init__(self):
+        self.phase = ""
+        self.percent = 0.0
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.current_file = None
+        self.processing_started = None
+        self.base_percent = 0.0
+        self.end_percent = 100.0
+
+    def set_phase(self, text, percent):
+        self.phase = text; self.percent = percent; self.current_file = None
+
+    def start_processing(self, files_total, bytes_total, base_percent, end_percent):
+        self.files_total = files_total; self.files_done = 0; self.bytes_total = bytes_total; self.bytes_done = 0
+        self.base_percent = base_percent; self.end_percent = end_percent
+        self.processing_started = time.monotonic()
+        self.set_phase("Procesando", base_percent)
+
+    def file_done(self, file_path, num_bytes):
+        self.files_done += 1; self.bytes_done += num_bytes; self.current_file = file_path
+
+    def snapshot(self):
+        # Devuelve (texto, porcentaje) con archivos/s, bytes/s y tiempo restante estimado.
+        current_file = self.current_file
+        if current_file is None: return self.phase, self.percent
+        done, total = self.files_done, self.files_total
+        work_done = self.bytes_done + done * PROGRESS_FILE_OVERHEAD_BYTES
+        work_total = self.bytes_total + total * PROGRESS_FILE_OVERHEAD_BYTES
+        percent = self.base_percent + min(1.0, work_done / work_total) * (self.end_percent - self.base_percent) if work_total else self.percent
+        text = f"{self.phase} {done}/{total}"
+        elapsed = time.monotonic() - self.processing_started
+        if elapsed >= PROGRESS_RATE_MIN_SECONDS and done:
+            text += f" · {done / elapsed:.0f} archivos/s · {format_size(self.bytes_done / elapsed)}/s"
+            text += f" · ETA {format_duration(max(0, work_total - work_done) * elapsed / work_done)}"
+        return f"{text} · {os.path.basename(current_file)}", percent
+
+
+class AnalysisProfile:
+    # Tiempos por fase y por archivo de un análisis (opcional: el motor solo mide si recibe un
+    # perfil). Las lecturas ocurren en varios hilos, así que sus fases suman el tiempo de todos
+    # los hilos y pueden superar el tiempo total; "espera de lecturas" es lo que el reporte
+    # estuvo detenido esperándolas.
+    PHASES = ("escaneo", "directorio", "espera de lecturas", "lectura (suma de hilos)", "decodificación (suma de hilos)",
+              "renderizado", "numeración de líneas", "escritura del reporte")
+
+    def __init__(self, top_n=DEFAULT_PROFILE_TOP_N):
+        self.top_n = top_n
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.total_seconds = 0.0
+        self.files = 0
+        self.bytes_read = 0
+        self.read_times = {}
+        self.render_times = {}
+        self.directories = {} # carpeta -> [archivos, segundos, bytes]
+        self.memory_stages = {} # etapa -> {"diferencia", "pico"} en bytes (solo con tracemalloc activo)
+        self._stage_memory = None
+        self._slowest = [] # montículo con los `top_n` archivos más lentos
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds, nbytes=0):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            self.bytes_read += nbytes
+
+    def begin_stages(self):
+        self._stage_memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+    def end_stage(self, stage):
+        # Límite entre etapas del análisis: guarda cuánto varió la memoria trazada en la etapa y el
+        # pico alcanzado hasta ese momento. El pico es el de todo el proceso desde que quien activó
+        # tracemalloc lo hizo (no se reinicia: reset_peak() le cambiaría la medición a ese otro
+        # código); la etapa en que sube es la que marcó el máximo. La lectura, el renderizado y la
+        # escritura se solapan archivo por archivo: son una sola etapa.
+        if self._stage_memory is None or not tracemalloc.is_tracing(): return
+        current, peak = tracemalloc.get_traced_memory()
+        self.memory_stages[stage] = {"diferencia": current - self._stage_memory, "pico": peak}
+        self._stage_memory = current
+
+    def note_bytes(self, nbytes):
+        self.add("lectura (suma de hilos)", 0.0, nbytes)
+
+    def note_read(self, file_path, seconds):
+        self.read_times[file_path] = seconds
+        self.add("lectura (suma de hilos)", seconds)
+
+    def note_render(self, file_path, seconds):
+        self.render_times[file_path] = seconds
+        self.add("renderizado", seconds)
+
+    def record_file(self, file_path, file_stat, section_seconds):
+        # `section_seconds` es el tiempo en el hilo del reporte (renderizado + escritura).
+        read_seconds = self.read_times.pop(file_path, 0.0)
+        render_seconds = self.render_times.pop(file_path, 0.0)
+        size = file_stat.st_size if file_stat is not None else 0
+        self.files += 1
+        self.add("escritura del reporte", section_seconds - render_seconds)
+        directory = self.directories.setdefault(os.path.dirname(file_path), [0, 0.0, 0])
+        directory[0] += 1; directory[1] += read_seconds + section_seconds; directory[2] += size
+        entry = (read_seconds + section_seconds, self.files, file_path, size, read_seconds, render_seconds)
+        if len(self._slowest) < self.top_n: heapq.heappush(self._slowest, entry)
+        elif entry > self._slowest[0]: heapq.heapreplace(self._slowest, entry)
+
+    def slowest_files(self):
+        return [{"ruta": path, "bytes": size, "segundos": round(total, 6), "lectura": round(read, 6), "renderizado": round(render, 6)}
+                for total, _, path, size, read, render in sorted(self._slowest, reverse=True)]
+
+    def slowest_directories(self):
+        slowest = heapq.nlargest(self.top_n, self.directories.items(), key=lambda item: item[1][1])
+        return [{"carpeta": path, "archivos": files, "bytes": size, "segundos": round(seconds, 6)}
+                for path, (files, seconds, size) in slowest]
+
+    def to_dict(self):
+        return {"total_segundos": round(self.total_seconds, 6), "archivos": self.files, "bytes_leidos": self.bytes_read,
+                "fases": {phase: round(seconds, 6) for phase, seconds in self.phases.items()}, "memoria": self.memory_stages,
+                "archivos_mas_lentos": self.slowest_files(), "carpetas_mas_lentas": self.slowest_directories()}
+
+    def save_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f: json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def summary(self):
+        lines = [f"PERFIL DEL ANÁLISIS\n{'='*60}",
+                 f"Tiempo total: {self.total_seconds:.3f} s · {self.files} archivos · {format_size(self.bytes_read)} leídos", "",
+                 "FASES", "-"*60]
+        lines.extend(f"  {phase:<34}{seconds:10.3f} s" for phase, seconds in self.phases.items())
+        if self.memory_stages:
+            lines.extend(["", "MEMORIA (variación en la etapa / pico del proceso hasta el final de la etapa)", "-"*60])
+            lines.extend(f"  {stage:<34}{('-' if memory['diferencia'] < 0 else '+') + format_size(abs(memory['diferencia'])):>12} / {format_size(memory['pico'])}"
+                         for stage, memory in self.memory_stages.items())
+        lines.extend(["", f"ARCHIVOS MÁS LENTOS (lectura / renderizado / total)", "-"*60])
+        lines.extend(f"  {item['lectura']:.3f} / {item['renderizado']:.3f} / {item['segundos']:.3f} s  {format_size(item['bytes']):>9}  {item['ruta']}"
+                     for item in self.slowest_files())
+        lines.extend(["", "CARPETAS MÁS LENTAS", "-"*60])
+        lines.extend(f"  {item['segundos']:8.3f} s  {item['archivos']:6d} archivos  {item['carpeta']}" for item in self.slowest_directories())
+        return "\n".join(lines)
+
+
+class ReportEstimate:
+    # Tamaño aproximado del reporte, calculado tras el escaneo y antes de leer los archivos: con los
+    # tamaños en disco y los mismos límites por archivo y total que el análisis. Las líneas del
+    # contenido se estiman con un promedio de bytes por línea. `weights` (bytes de contenido de cada
+    # archivo, en el orden del reporte) pondera el progreso y no se serializa.
+    def __init__(self, top_n=DEFAULT_ESTIMATE_TOP_N):
+        self.top_n = top_n
+        self.files = 0
+        self.report_chars = 0
+        self.lines = 0
+        self.content_bytes = 0
+        self.truncated = 0 # archivos que se recortarán por el límite por archivo
+        self.omitted = 0 # archivos que no entran en el límite total
+        self.omitted_bytes = 0
+        self.largest_files = [] # (bytes, ruta relativa)
+        self.largest_directories = [] # (bytes, carpeta relativa)
+        self.weights = []
+
+    def to_dict(self):
+        return {"archivos": self.files, "caracteres": self.report_chars, "lineas": self.lines, "bytes_contenido": self.content_bytes,
+                "recortados": self.truncated, "omitidos": self.omitted, "bytes_omitidos": self.omitted_bytes,
+                "archivos_mas_grandes": [{"ruta": path, "bytes": size} for size, path in self.largest_files],
+                "carpetas_mas_grandes": [{"carpeta": path, "bytes": size} for size, path in self.largest_directories]}
+
+    @classmethod
+    def from_dict(cls, data):
+        estimate = cls()
+        estimate.files, estimate.report_chars, estimate.lines = data["archivos"], data["caracteres"], data["lineas"]
+        estimate.content_bytes, estimate.truncated = data["bytes_contenido"], data["recortados"]
+        estimate.omitted, estimate.omitted_bytes = data["omitidos"], data["bytes_omitidos"]
+        estimate.largest_files = [(item["bytes"], item["ruta"]) for item in data["archivos_mas_grandes"]]
+        estimate.largest_directories = [(item["bytes"], item["carpeta"]) for item in data["carpetas_mas_grandes"]]
+        return estimate
+
+    def headline(self):
+        return f"reporte de aprox. {format_size(self.report_chars)} y ~{self.lines} líneas"
+
+    def summary(self, limit=None):
+        limit = self.top_n if limit is None else limit
+        lines = [f"Estimación: {self.headline()} ({self.files} archivos, {format_size(self.content_bytes)} de contenido)"]
+        if self.truncated: lines.append(f"  {self.truncated} archivo(s) se recortarán por el límite por archivo")
+        if self.omitted: lines.append(f"  {self.omitted} archivo(s) ({format_size(self.omitted_bytes)}) no entran en el límite total y se omitirán")
+        if self.largest_files:
+            lines.append("Archivos que más aportan:")
+            lines.extend(f"  {format_size(size):>9}  {path}" for size, path in self.largest_files[:limit])
+        if self.largest_directories:
+            lines.append("Carpetas que más aportan:")
+            lines.extend(f"  {format_size(size):>9}  {path}" for size, path in self.largest_directories[:limit])
+        return "\n".join(lines)
+
+
+class AnalysisOptions:
+    def __init__(self, include_subdirs=True, show_empty_files=False, add_line_numbers=False,
+                 show_directory_first=True, ignored_items=(), read_workers=DEFAULT_READ_WORKERS,
+                 read_ahead_bytes=DEFAULT_READ_AHEAD_BYTES, use_gitignore=False, max_file_bytes=DEFAULT_MAX_FILE_BYTES,
+                 max_total_bytes=DEFAULT_MAX_TOTAL_BYTES, skip_binary=False, dedupe_identical=False, git_files=False,
+                 changed_since=None, scan_workers=DEFAULT_SCAN_WORKERS, read_timeout=DEFAULT_READ_TIMEOUT_SECONDS):
+        self.include_subdirs = include_subdirs
+        self.show_empty_files = show_empty_files
+        self.add_line_numbers = add_line_numbers
+        self.show_directory_first = show_directory_first
+        self.ignored_items = list(dict.fromkeys(ignored_items)) # El orden importa para las negaciones "!"
+        self.read_workers = read_workers
+        self.read_ahead_bytes = read_ahead_bytes
+        self.use_gitignore = use_gitignore
+        self.max_file_bytes = max_file_bytes # 0 = sin límite
+        self.max_total_bytes = max_total_bytes # 0 = sin límite
+        self.skip_binary = skip_binary
+        self.dedupe_identical = dedupe_identical
+        self.git_files = git_files # listar los archivos desde git en lugar de recorrer la carpeta
+        self.changed_since = changed_since or None # solo archivos cambiados desde esta referencia de git
+        self.scan_workers = scan_workers # carpetas que se listan a la vez (1 = recorrido secuencial)
+        self.read_timeout = read_timeout # segundos por lectura antes de abandonarla (0 = sin plazo)
+
+    def to_dict(self):
+        return {"include_subdirs": self.include_subdirs,
+                "show_empty_files": self.show_empty_files,
+                "add_line_numbers": self.add_line_numbers,
+                "show_directory_first": self.show_directory_first,
+                "ignored_items": list(self.ignored_items),
+                "read_workers": self.read_workers,
+                "read_ahead_bytes": self.read_ahead_bytes,
+                "use_gitignore": self.use_gitignore,
+                "max_file_bytes": self.max_file_bytes,
+                "max_total_bytes": self.max_total_bytes,
+                "skip_binary": self.skip_binary,
+                "dedupe_identical": self.dedupe_identical,
+                "git_files": self.git_files,
+                "changed_since": self.changed_since,
+                "scan_workers": self.scan_workers,
+                "read_timeout": self.read_timeout}
+
+    @classmethod
+    def from_dict(cls, data):
+        defaults = cls()
+        return cls(**{key: data.get(key, value) for key, value in defaults.to_dict().items()})
+
+
+class FolderAnalysisEngine:
+    def __init__(self, options=None, cache=None, profile=None, index=None):
+        self.options = options or AnalysisOptions()
+        self.profile = profile
+        self.index = index
+        self.progress = AnalysisProgress()
+        self.cache = cache
+        self.sections = [] # (ruta, inicio, fin, stat) de cada sección en el último reporte
+        self.supported_extensions = SUPPORTED_EXTENSIONS
+        self.cancel_flag = False
+        self.budget_spent = 0
+        self.duplicates = None
+        self.archive = None # ArchiveSource mientras se analiza un .zip/.tar
+        self.raw_output = False # el destino acepta bytes: el contenido UTF-8 válido se copia sin decodificar
+        self.scan_errors = [] # (carpeta, error) de las carpetas que no se pudieron listar en el último recorrido
+        self.scanned_stats = None # ruta -> stat obtenido en el escaneo (solo durante un análisis)
+        self.metadata_pool = None # hilos para listar carpetas y tomar stat con plazo (ver _call_with_deadline)
+        self.stalled_reads = [] # archivos cuya lectura superó el plazo en el último análisis (omitidos)
+        self.estimate = None # ReportEstimate del último análisis
+        # Si la estimación supera `confirm_above_bytes`, se llama a confirm_estimate(estimación) antes de
+        # generar el reporte: devuelve False para no generarlo y puede cambiar options.max_total_bytes.
+        self.confirm_estimate = None
+        self.confirm_above_bytes = 0
+
+    def update_progress(self, text, value):
+        self.progress.set_phase(text, value)
+
+    def analyze(self, folder_path, out, timestamp=None, files=None):
+        # `files`: lista de archivos ya conocida (p. ej. guardada por el servicio local); se omite el escaneo.
+        opts = self.options
+        timestamp = timestamp or datetime.now()
+        self.update_progress("Escaneando archivos...", 0)
+        self.budget_spent = 0
+        self.scanned_stats = {}; self.estimate = None; self.stalled_reads = []
+        self.duplicates = DuplicateIndex() if opts.dedupe_identical else None
+        # La caché y el índice trabajan con el texto decodificado.
+        self.raw_output = hasattr(out, "write_bytes") and not (self.cache or self.index)
+        self.archive = None; reader = None
+        started = time.perf_counter(); completed = False
+        try:
+            # Dentro del try: si falla la apertura de uno (un archivo comprimido dañado, una base que
+            # no se puede crear), el finally cierra los que ya se abrieron.
+            self._open_metadata_pool()
+            if self.cache: self.cache.open(folder_path, opts)
+            if is_archive_path(folder_path): self.archive = ArchiveSource(folder_path)
+            if self.index: self.index.open(folder_path, opts, timestamp)
+            reader = ReadAheadReader(self, opts.read_workers, opts.read_ahead_bytes)
+            file_count = self._analyze_with_reader(folder_path, out, timestamp, reader, files)
+            completed = True
+            return file_count
+        finally:
+            if reader is not None: reader.close()
+            self._close_metadata_pool()
+            self.scanned_stats = None
+            if self.cache: self.cache.close()
+            if self.index: self.index.close(completed)
+            if self.archive: self.archive.close(); self.archive = None
+            if self.profile: self.profile.total_seconds = time.perf_counter() - started
+
+    def _analyze_with_reader(self, folder_path, out, timestamp, reader, files=None):
+        # Las lecturas comienzan mientras el escaneo continúa; el reporte se escribe cuando se
+        # conoce el total de archivos.
+        opts = self.options
+        profile = self.profile
+        phase_started = time.perf_counter()
+        if profile: profile.begin_stages()
+        files_to_analyze = []
+        source = self.iter_files(folder_path) if files is None else files
+        if self.archive is not None:
+            # Un tar se lee en el orden del archivo: hace falta la lista completa (ya está en memoria).
+            source = list(source); self.archive.expect(source, opts.read_ahead_bytes)
+        for file_path in source:
+            files_to_analyze.append(file_path); reader.feed(file_path)
+        if profile: profile.add("escaneo", time.perf_counter() - phase_started); profile.end_stage("escaneo")
+
+        if self.cancel_flag: raise AnalysisCancelled("Análisis cancelado (escaneo)")
+        if not files_to_analyze: raise NoFilesToAnalyze("Sin archivos para analizar")
+
+        estimate = self.estimate = self.estimate_report(folder_path, files_to_analyze)
+        if self.duplicates is not None: self.duplicates.count_sizes(self._stat_file(file_path) for file_path in files_to_analyze)
+        if self.confirm_estimate and self.confirm_above_bytes and estimate.report_chars > self.confirm_above_bytes:
+            estimate = self._confirm_estimate(folder_path, files_to_analyze, reader)
+        if profile: profile.end_stage("estimación")
+        self.update_progress(f"Preparando análisis de {len(files_to_analyze)} archivos ({estimate.headline()})...", 5)
+        result_lines = ReportWriter(out)
+        phase_started = time.perf_counter()
+        self.write_report_preamble(result_lines, folder_path, files_to_analyze, timestamp, report_progress=True)
+        if profile: profile.add("directorio", time.perf_counter() - phase_started); profile.end_stage("directorio")
+        base_prog_content = 20 if opts.show_directory_first else 5
+
+        if self.cancel_flag: raise AnalysisCancelled("Análisis cancelado (directorio)")
+
+        self.sections = []
+        self.progress.start_processing(len(files_to_analyze), sum(estimate.weights), base_prog_content, 95)
+        for position, (file_path_content, file_stat, content, read_error, cached) in enumerate(reader):
+            if self.cancel_flag: break
+            body = self.cache.get(file_path_content) if cached else None
+            if self.duplicates and read_error is None and file_stat is not None and not isinstance(content, SkippedContent):
+                original = self.duplicates.find_original(file_path_content, file_stat.st_size)
+                if original is not None: body = self.duplicate_reference(original, folder_path)
+            result_lines.begin_section(file_path_content, folder_path)
+            section_start = result_lines.position
+            if profile: section_started = time.perf_counter()
+            written_body, rendered = self.analyze_file_to_result(result_lines, file_path_content, folder_path, content, read_error, body)
+            if profile: profile.record_file(file_path_content, file_stat, time.perf_counter() - section_started)
+            if self.index:
+                indexed_content = content if read_error is None and not isinstance(content, SkippedContent) else None
+                self.index.add_file(file_path_content, folder_path, file_stat,
+                                    self.get_language_from_extension(os.path.splitext(file_path_content)[1].lower()), indexed_content, written_body,
+                                    self._index_status(file_stat, content, read_error))
+            self.sections.append((file_path_content, section_start, result_lines.position, file_stat))
+            self.progress.file_done(file_path_content, estimate.weights[position])
+            if self.cache and body is None and rendered and file_stat is not None and getattr(content, "cacheable", True) \
+               and not self.cache.is_fresh(file_path_content, file_stat): # vigente pero releída (índice, --dedupe)
+                self.cache.put(file_path_content, file_stat, written_body)
+
+        if self.cancel_flag: raise AnalysisCancelled("Análisis cancelado durante el procesamiento.")
+        self.update_progress("Finalizando reporte...", 95)
+        result_lines.begin_section(None)
+        self.write_report_footer(result_lines, timestamp)
+        if profile: profile.end_stage("lectura, renderizado y escritura")
+        return len(files_to_analyze)
+
+    def _confirm_estimate(self, folder_path, files_to_analyze, reader):
+        # Si quien confirma cambió el límite total, las lecturas adelantadas (ya descontadas del
+        # límite anterior) se descartan y la lectura empieza de nuevo. El límite por archivo no se
+        # puede cambiar aquí: forma parte de la clave de la caché, que ya está abierta.
+        opts = self.options
+        max_total_bytes = opts.max_total_bytes
+        if not self.confirm_estimate(self.estimate):
+            raise ReportEstimateDeclined(f"Análisis cancelado: {self.estimate.headline()}", self.estimate)
+        if opts.max_total_bytes == max_total_bytes: return self.estimate
+        self.budget_spent = 0
+        if self.duplicates is not None: self.duplicates = DuplicateIndex(self.duplicates.size_counts)
+        if self.archive is not None: self.archive.expect(files_to_analyze, opts.read_ahead_bytes)
+        reader.restart(files_to_analyze)
+        self.estimate = self.estimate_report(folder_path, files_to_analyze)
+        return self.estimate
+
+    def estimate_report(self, folder_path, files_to_analyze):
+        # Usa los stat del escaneo; los que faltan (listas de git, listados del servicio local) se
+        # piden ahora y se guardan para la lectura. El límite total se simula en el orden del reporte.
+        opts = self.options
+        estimate = ReportEstimate()
+        estimate.report_chars = ESTIMATE_FRAME_CHARS
+        listing_base = os.path.dirname(folder_path)
+        budget = 0; contributions = []; directories = {}
+        for file_path in files_to_analyze:
+            file_stat = self._stat_file(file_path)
+            if self.scanned_stats is not None and file_stat is not None: self.scanned_stats[file_path] = file_stat
+            rel_path = os.path.relpath(file_path, listing_base)
+            size = self._budget_size(file_stat)
+            if opts.max_total_bytes and budget + size > opts.max_total_bytes:
+                estimate.omitted += 1; estimate.omitted_bytes += size; size = 0
+            else:
+                budget += size
+                if opts.max_file_bytes and file_stat is not None and file_stat.st_size > opts.max_file_bytes: estimate.truncated += 1
+            lines = -(-size // ESTIMATE_BYTES_PER_LINE)
+            chars = ESTIMATE_SECTION_CHARS + len(os.path.basename(file_path)) + len(rel_path) + size
+            if opts.add_line_numbers: chars += lines * 6 # prefijo "   1| "
+            if opts.show_directory_first: chars += len(rel_path) + 3; lines += 1
+            estimate.report_chars += chars; estimate.lines += lines + 8
+            estimate.weights.append(size)
+            if size:
+                contributions.append((size, rel_path))
+                directory = os.path.dirname(rel_path); directories[directory] = directories.get(directory, 0) + size
+        estimate.files = len(files_to_analyze); estimate.content_bytes = budget
+        # Con key, los empates conservan el orden del reporte.
+        estimate.largest_files = heapq.nlargest(estimate.top_n, contributions, key=lambda item: item[0])
+        estimate.largest_directories = heapq.nlargest(estimate.top_n, ((size, directory) for directory, size in directories.items()), key=lambda item: item[0])
+        return estimate
+
+    def estimate_folder(self, folder_path, files=None):
+        # Solo el escaneo y la estimación, sin leer ningún archivo (--estimate).
+        self.update_progress("Escaneando archivos...", 0)
+        self.scanned_stats = {}
+        self.archive = None
+        try:
+            if is_archive_path(folder_path): self.archive = ArchiveSource(folder_path)
+            files_to_analyze = list(self.iter_files(folder_path)) if files is None else files
+            if self.cancel_flag: raise AnalysisCancelled("Análisis cancelado (escaneo)")
+            if not files_to_analyze: raise NoFilesToAnalyze("Sin archivos para analizar")
+            self.estimate = self.estimate_report(folder_path, files_to_analyze)
+            return self.estimate
+        finally:
+            self.scanned_stats = None
+            if self.archive: self.archive.close(); self.archive = None
+
+    def write_report_preamble(self, result_lines, folder_path, files_to_analyze, timestamp, report_progress=False):
+        opts = self.options
+        result_lines.extend([f"ANÁLISIS DE CARPETA\n{'='*80}",
+                             f"Carpeta analizada: {folder_path}",
+                             f"Fecha de análisis: {timestamp.strftime(TIMESTAMP_FORMAT)}",
+                             f"Total de archivos analizados: {len(files_to_analyze)}",
+                             f"Incluye subdirectorios: {'Sí' if opts.include_subdirs else 'No'}",
+                             f"Mostrar archivos vacíos: {'Sí' if opts.show_empty_files else 'No'}",
+                             f"Agregar números de línea: {'Sí' if opts.add_line_numbers else 'No'}",
+                             f"Mostrar directorio primero: {'Sí' if opts.show_directory_first else 'No'}"])
+        if opts.use_gitignore: result_lines.append("Respetar archivos .gitignore: Sí")
+        if opts.max_file_bytes: result_lines.append(f"Límite por archivo: {format_size(opts.max_file_bytes)} (los más grandes se recortan)")
+        if opts.max_total_bytes: result_lines.append(f"Límite total de contenido: {format_size(opts.max_total_bytes)}")
+        if opts.skip_binary: result_lines.append("Omitir archivos binarios: Sí")
+        if opts.dedupe_identical: result_lines.append("Omitir contenido de archivos idénticos: Sí")
+        if opts.changed_since: result_lines.append(f"Solo archivos cambiados desde: {opts.changed_since}")
+        elif opts.git_files: result_lines.append("Solo archivos seguidos por git: Sí")
+        if opts.ignored_items:
+            result_lines.extend(["", "ELEMENTOS IGNORADOS", "-"*40])
+            result_lines.extend([f"  • {item}" for item in sorted(list(opts.ignored_items))])
+        result_lines.append("\n" + "=" * 80)
+
+        if opts.show_directory_first:
+            result_lines.extend(["\nDIRECTORIO DE ARCHIVOS", "="*80])
+            listing_base = os.path.dirname(folder_path)
+            if report_progress: self.update_progress(f"Listando {len(files_to_analyze)} archivos...", 5)
+            for fp_list_item in files_to_analyze:
+                if self.cancel_flag: break
+                result_lines.append(f"• {os.path.relpath(fp_list_item, listing_base)}")
+            result_lines.extend(["\n" + "="*80, "CONTENIDO DE ARCHIVOS", "="*80])
+
+    def write_report_footer(self, result_lines, timestamp):
+        result_lines.append(f"\n{'='*80}\nFIN DEL ANÁLISIS\nGenerado el: {timestamp.strftime(TIMESTAMP_FORMAT)}\n{'='*80}")
+
+    def get_files_list(self, folder_path):
+        return list(self.iter_files(folder_path))
+
+    def iter_files(self, folder_path, on_dir=None):
+        # Recorre la carpeta con os.scandir y entrega los archivos en el mismo orden que
+        # sorted() sobre las rutas completas: cada directorio se ordena usando "nombre" + os.sep
+        # como clave de las subcarpetas, lo que equivale al orden global de las rutas. Así los
+        # archivos se pueden consumir mientras el escaneo continúa. `on_dir` se llama con cada
+        # carpeta recorrida (incluida la raíz).
+        self.scan_errors = []
+        owns_pool = self._open_metadata_pool()
+        try: yield from self._iter_files(folder_path, on_dir)
+        finally:
+            if owns_pool: self._close_metadata_pool()
+
+    def _iter_files(self, folder_path, on_dir):
+        if is_archive_path(folder_path):
+            yield from self._iter_archive_files(folder_path, on_dir); return
+        if self.options.git_files or self.options.changed_since:
+            yield from self._iter_git_files(folder_path, on_dir); return
+        if on_dir: on_dir(folder_path)
+        is_supported_file = self.is_supported_file
+        root_entries = self._scan_sorted(folder_path)
+        root_context = IgnoreContext.for_root(IgnoreMatcher(self.options.ignored_items))
+        if self.options.use_gitignore and self._has_gitignore(root_entries): root_context = self._with_gitignore(root_context, folder_path)
+        if not self.options.include_subdirs:
+            for name, entry_path, is_dir, file_entry in root_entries:
+                if file_entry is not None and not root_context.is_ignored(name, False) and is_supported_file(name):
+                    self._remember_stat(entry_path, file_entry); yield entry_path
+            return
+        if self.options.scan_workers > 1:
+            yield from self._walk_parallel(root_entries, root_context, on_dir); return
+        yield from self._walk(root_entries, root_context, lambda name, dir_path, is_dir, context:
+                              self._open_dir(name, dir_path, context, on_dir) if self._descends(name, is_dir, context) else None)
+
+    def iter_subfolder_files(self, folder_path, dir_path, on_dir=None):
+        # Recorre una carpeta dentro de `folder_path` (una carpeta nueva en modo vigilancia) con los
+        # ignorados que tendría en el recorrido completo: los patrones siguen anclados a la raíz y no
+        # entrega nada si la carpeta o una superior se poda. No reinicia `scan_errors`.
+        opts = self.options
+        rel_path = os.path.relpath(dir_path, folder_path)
+        if rel_path == os.curdir or rel_path.startswith(os.pardir) or not opts.include_subdirs: return
+        owns_pool = self._open_metadata_pool()
+        try:
+            context = IgnoreContext.for_root(IgnoreMatcher(opts.ignored_items))
+            if opts.use_gitignore: context = self._with_gitignore(context, folder_path)
+            parent_path = folder_path
+            *parents, name = rel_path.split(os.sep)
+            for parent_name in parents:
+                if not self._descends(parent_name, True, context): return
+                parent_path = os.path.join(parent_path, parent_name); context = context.child(parent_name)
+                if opts.use_gitignore: context = self._with_gitignore(context, parent_path)
+            if not self._descends(name, "symlink" if os.path.islink(dir_path) else True, context): return
+            entries, context = self._open_dir(name, dir_path, context, on_dir)
+            yield from self._walk(entries, context, lambda name, dir_path, is_dir, context:
+                                  self._open_dir(name, dir_path, context, on_dir) if self._descends(name, is_dir, context) else None)
+        finally:
+            if owns_pool: self._close_metadata_pool()
+
+    def _walk(self, root_entries, root_context, open_child):
+        # Recorrido en profundidad en orden. `open_child(nombre, ruta, is_dir, contexto)` devuelve
+        # (entradas, contexto) de una subcarpeta, o None si la subcarpeta se poda.
+        is_supported_file = self.is_supported_file
+        stack = [(iter(root_entries), root_context)]
+        while stack:
+            entries, context = stack[-1]
+            entry = next(entries, None)
+            if entry is None: stack.pop(); continue
+            name, entry_path, is_dir, file_entry = entry
+            if is_dir:
+                if self.cancel_flag: return
+                child = open_child(name, entry_path, is_dir, context)
+                if child is not None: stack.append((iter(child[0]), child[1]))
+            elif not context.is_ignored(name, False) and is_supported_file(name):
+                self._remember_stat(entry_path, file_entry)
+                yield entry_path
+
+    def _walk_parallel(self, root_entries, root_context, on_dir):
+        # Para sistemas de archivos con mucha latencia (NFS, SMB): un grupo de hilos lista las
+        # carpetas por adelantado. Cada carpeta listada encola enseguida sus subcarpetas no
+        # ignoradas (la poda se decide antes de bajar, como en el recorrido secuencial), así que
+        # los hilos avanzan por todo el árbol a la vez; el recorrido en profundidad solo consume
+        # los listados en orden y entrega la misma secuencia de archivos.
+        #
+        # Los listados adelantados que el recorrido todavía no consumió se limitan con un semáforo
+        # (no crecen con el árbol). Sin lugar, la subcarpeta no se encola y la lista el propio
+        # recorrido al llegar a ella; no se espera a que se libere un lugar, porque el recorrido
+        # podría necesitar justo esa carpeta para liberarlo.
+        pool = ThreadPoolExecutor(max_workers=self.options.scan_workers, thread_name_prefix="folder_analyzer_scan")
+        listings = {} # ruta -> Future de (entradas, contexto)
+        slots = threading.Semaphore(self.options.scan_workers * SCAN_AHEAD_DIRS_PER_WORKER)
+        stopped = threading.Event()
+
+        def expand(entries, context):
+            for name, entry_path, is_dir, _ in entries:
+                if is_dir and self._descends(name, is_dir, context):
+                    if stopped.is_set() or self.cancel_flag: return
+                    if not slots.acquire(blocking=False): continue
+                    listings[entry_path] = pool.submit(open_dir, name, entry_path, context)
+
+        def open_dir(name, dir_path, parent_context):
+            entries, context = self._open_dir(name, dir_path, parent_context, on_dir)
+            expand(entries, context)
+            return entries, context
+
+        def open_child(name, dir_path, is_dir, context):
+            listing = listings.pop(dir_path, None)
+            if listing is not None:
+                try: return listing.result()
+                finally: slots.release()
+            return open_dir(name, dir_path, context) if self._descends(name, is_dir, context) else None
+
+        try:
+            expand(root_entries, root_context)
+            yield from self._walk(root_entries, root_context, open_child)
+        finally:
+            stopped.set(); pool.shutdown(wait=False, cancel_futures=True)
+
+    def _remember_stat(self, file_path, file_entry):
+        # Durante un análisis el stat se toma aquí, en el recorrido, y la lectura lo reutiliza en lugar
+        # de llamar a os.stat(). En Windows DirEntry.stat() sale del propio listado, sin otra llamada.
+        if self.scanned_stats is None or file_entry is None: return
+        try: self.scanned_stats[file_path] = file_entry.stat()
+        except OSError: pass
+
+    def _descends(self, name, is_dir, context):
+        return is_dir != "symlink" and not (self.options.use_gitignore and name == '.git') and not context.is_ignored(name, True)
+
+    def _open_dir(self, name, dir_path, parent_context, on_dir=None):
+        # Lista una subcarpeta que no se podó y arma su contexto de ignorados.
+        if on_dir: on_dir(dir_path)
+        entries = self._scan_sorted(dir_path)
+        context = parent_context.child(name)
+        if self.options.use_gitignore and self._has_gitignore(entries): context = self._with_gitignore(context, dir_path)
+        return entries, context
+
+    def _with_gitignore(self, context, dir_path):
+        # Un .gitignore que no se pudo leer a tiempo se anota como la carpeta que no se pudo listar.
+        try: return self._call_with_deadline(context.with_gitignore, dir_path)
+        except OSError as e:
+            self.scan_errors.append((os.path.join(dir_path, '.gitignore'), e.strerror or str(e)))
+            return context
+
+    def _iter_git_files(self, folder_path, on_dir=None):
+        # Lista los archivos desde git (seguidos o, con `changed_since`, modificados respecto de esa
+        # referencia más los nuevos sin seguir) sin recorrer la carpeta.
+        opts = self.options
+        if opts.changed_since:
+            rel_paths = set(self._git(folder_path, "diff", "--name-only", "-z", "--relative", "--diff-filter=d", opts.changed_since, "--"))
+            rel_paths.update(self._git(folder_path, "ls-files", "-z", "--others", "--exclude-standard"))
+        else:
+            rel_paths = set(self._git(folder_path, "ls-files", "-z", "--cached"))
+        # Los borrados sin confirmar siguen en el índice de git: solo se entregan los que existen.
+        return (file_path for file_path in self._iter_listed_files(folder_path, rel_paths, on_dir) if self._is_listed_file(file_path))
+
+    def _is_listed_file(self, file_path):
+        try: return self._call_with_deadline(os.path.isfile, file_path)
+        except OSError as e:
+            self.scan_errors.append((file_path, e.strerror or str(e)))
+            return False
+
+    def _iter_archive_files(self, folder_path, on_dir=None):
+        if self.archive is not None and self.archive.archive_path == folder_path:
+            yield from self._iter_listed_files(folder_path, self.archive.rel_paths(), on_dir); return
+        archive = ArchiveSource(folder_path)
+        try: rel_paths = archive.rel_paths()
+        finally: archive.close()
+        yield from self._iter_listed_files(folder_path, rel_paths, on_dir)
+
+    def _iter_listed_files(self, folder_path, rel_paths, on_dir=None):
+        # Filtra una lista de rutas relativas (separadas con "/") con los mismos criterios que el
+        # recorrido de la carpeta (extensiones, ignorados, subdirectorios) y en el mismo orden.
+        opts = self.options
+        if on_dir: on_dir(folder_path)
+        contexts = {"": IgnoreContext.for_root(IgnoreMatcher(opts.ignored_items))}
+        for rel_path in sorted(rel_paths, key=self._git_sort_key):
+            if self.cancel_flag: return
+            directory, _, name = rel_path.rpartition("/")
+            if directory and not opts.include_subdirs: continue
+            context = self._git_dir_context(contexts, directory, folder_path, on_dir)
+            if context is None or context.is_ignored(name, False) or not self.is_supported_file(name): continue
+            yield os.path.join(folder_path, *rel_path.split("/"))
+
+    def _git_dir_context(self, contexts, directory, folder_path, on_dir):
+        # Contexto de ignorados de una carpeta (None si la carpeta o una superior está ignorada).
+        if directory in contexts: return contexts[directory]
+        parent, _, name = directory.rpartition("/")
+        parent_context = self._git_dir_context(contexts, parent, folder_path, on_dir)
+        context = None
+        if parent_context is not None and not parent_context.is_ignored(name, True):
+            context = parent_context.child(name)
+            if on_dir: on_dir(os.path.join(folder_path, *directory.split("/")))
+        contexts[directory] = context
+        return context
+
+    @staticmethod
+    def _git_sort_key(rel_path):
+        # Mismo orden que el recorrido de la carpeta: las carpetas se comparan como "nombre" + os.sep.
+        parts = rel_path.split("/")
+        return tuple(part + os.sep for part in parts[:-1]) + (parts[-1],)
+
+    def _git(self, folder_path, *args):
+        # git lee el repositorio de la unidad: con el mismo plazo que una lectura y atendiendo la
+        # cancelación. Un git colgado se mata y no se espera (puede no terminar hasta que vuelva la unidad).
+        try: process = subprocess.Popen(["git", "-C", folder_path, *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e: raise GitError(f"No se pudo ejecutar git: {e}")
+        read_timeout = self.options.read_timeout
+        started = time.monotonic()
+        while True:
+            try: stdout, stderr = process.communicate(timeout=READ_WAIT_POLL_SECONDS); break
+            except subprocess.TimeoutExpired: pass
+            if self.cancel_flag: process.kill(); return []
+            if read_timeout and time.monotonic() - started > read_timeout:
+                process.kill(); raise GitError(f"git {args[0]} no terminó en {read_timeout} s; la unidad puede no estar respondiendo")
+        if process.returncode != 0:
+            raise GitError(f"git {args[0]} falló: {stderr.decode('utf-8', errors='replace').strip()}")
+        return [os.fsdecode(path) for path in stdout.split(b"\0") if path]
+
+    @staticmethod
+    def _has_gitignore(entries):
+        return any(name == '.gitignore' and not is_dir for name, _, is_dir, _ in entries)
+
+    def _scan_sorted(self, dir_path):
+        # Un directorio que no se puede listar (o que no se listó dentro del plazo) no interrumpe el
+        # recorrido: se omite y se anota en `scan_errors` para avisarlo al terminar.
+        try: entries = self._call_with_deadline(self._list_dir, dir_path)
+        except OSError as e:
+            self.scan_errors.append((dir_path, e.strerror or str(e)))
+            return []
+        entries.sort()
+        return [entry[1:] for entry in entries]
+
+    def _list_dir(self, dir_path):
+        # Los enlaces a carpetas se marcan con "symlink" para no descender en ellos (os.walk sin
+        # followlinks). De los archivos regulares se guarda la entrada (DirEntry) para tomar su stat
+        # sin volver a buscarlos; durante un análisis el stat se toma ya aquí (DirEntry lo recuerda),
+        # dentro del plazo del listado. Las FIFO, sockets y dispositivos se descartan aquí, como hace
+        # git: abrirlos puede bloquear la lectura.
+        entries = []
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try: is_dir = entry.is_dir()
+                except OSError: is_dir = False
+                if is_dir:
+                    entries.append((entry.name + os.sep, entry.name, entry.path,
+                                    "symlink" if entry.is_symlink() else True, False))
+                else:
+                    try: is_file = entry.is_file()
+                    except OSError: is_file = False
+                    if not is_file and self._is_special(entry): continue
+                    if is_file and self.scanned_stats is not None:
+                        try: entry.stat()
+                        except OSError: pass
+                    entries.append((entry.name, entry.name, entry.path, False, entry if is_file else None))
+        return entries
+
+    @staticmethod
+    def _is_special(entry):
+        # Los enlaces rotos no son especiales: siguen apareciendo en el reporte con su error de lectura.
+        try: mode = entry.stat().st_mode
+        except OSError: return False
+        return stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode) or stat.S_ISBLK(mode)
+
+    def is_supported_file(self, filename):
+        return os.path.splitext(filename)[1].lower() in self.supported_extensions
+
+    def read_file_content(self, file_path, digests=None):
+        # Se lee en binario para decidir antes de decodificar: los primeros KB detectan archivos
+        # binarios y los archivos que superan el límite se recortan a su inicio y final.
+        if self.archive is not None:
+            with self.archive.open(file_path) as f: return self._read_stream(f, file_path, self.archive.stat(file_path).st_size, digests)
+        # Los archivos especiales se descartan en el escaneo; si la ruta cambió después (o la lista
+        # viene de otro lado), O_NONBLOCK evita que abrir una FIFO espere a un escritor.
+        fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_NONBLOCK", 0) | getattr(os, "O_BINARY", 0))
+        with open(fd, 'rb') as f:
+            file_stat = os.fstat(fd)
+            if not stat.S_ISREG(file_stat.st_mode): raise OSError(f"'{os.path.basename(file_path)}' no es un archivo regular")
+            return self._read_stream(f, file_path, file_stat.st_size, digests)
+
+    def _read_stream(self, f, file_path, size, digests):
+        opts = self.options
+        if opts.max_file_bytes and size > opts.max_file_bytes:
+            half = opts.max_file_bytes // 2
+            if self.archive is not None: head, tail = self._stream_head_tail(f, half)
+            else:
+                # Con mmap solo se cargan las páginas del inicio y del final, no el archivo completo.
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped: head, tail = mapped[:half], mapped[size - half:]
+            if self.profile: self.profile.note_bytes(len(head) + len(tail))
+            return self._truncated_content(head, tail, size)
+        sample = f.read(BINARY_SNIFF_BYTES)
+        if opts.skip_binary and self._looks_binary(sample):
+            if self.profile: self.profile.note_bytes(len(sample))
+            return self.binary_skipped_content(size)
+        data = sample + f.read()
+        if self.profile: self.profile.note_bytes(len(data))
+        if digests is not None: digests[file_path] = DuplicateIndex.digest(data)
+        if not self.raw_output: return self._decode_measured(data)
+        # Copia directa: validar el UTF-8 cuenta como decodificación.
+        started = time.perf_counter()
+        content = self._utf8_content(data)
+        if content is None: content = self._decode(data)
+        if self.profile: self.profile.add("decodificación (suma de hilos)", time.perf_counter() - started)
+        return content
+
+    def _utf8_content(self, data):
+        # Los archivos ASCII (la mayoría del código) se validan sin decodificar; el resto se decodifica
+        # solo para validarlo. Con "\r" o bytes inválidos se usa la decodificación con reemplazo, y
+        # al numerar líneas también con separadores que bytes.splitlines() no reconoce.
+        if b"\r" in data: return None
+        numbering = self.options.add_line_numbers
+        if data.isascii():
+            if numbering and any(ord(c) in data for c in UNCOMMON_LINE_BREAKS[:5]): return None
+            return Utf8Content((data,), len(data), ASCII_BLANK_RE.match(data) is not None)
+        try: text = data.decode('utf-8')
+        except UnicodeDecodeError: return None
+        if numbering and any(c in text for c in UNCOMMON_LINE_BREAKS): return None
+        return Utf8Content((data,), len(text), text.isspace())
+
+    @staticmethod
+    def _stream_head_tail(f, half):
+        # Miembros comprimidos: se descomprime en bloques conservando solo los últimos `half` bytes.
+        head = f.read(half); tail = bytearray()
+        for chunk in iter(lambda: f.read(ARCHIVE_STREAM_CHUNK), b""):
+            tail += chunk
+            if len(tail) > half: del tail[:len(tail) - half]
+        return head, bytes(tail)
+
+    def _truncated_content(self, head, tail, size):
+        # Los cortes se ajustan a saltos de línea para no partir líneas ni caracteres multibyte.
+        if self.options.skip_binary and self._looks_binary(head[:BINARY_SNIFF_BYTES]): return self.binary_skipped_content(size)
+        head = head[:head.rfind(b"\n") + 1 or len(head)]
+        tail = tail[tail.find(b"\n") + 1:]
+        omitted = size - len(head) - len(tail)
+        marker = f"[... {format_size(omitted)} omitidos de {format_size(size)} (límite por archivo: {format_size(self.options.max_file_bytes)}) ...]"
+        head_text = self._decode_measured(head)
+        if head_text and not head_text.endswith("\n"): head_text += "\n"
+        return f"{head_text}{marker}\n{self._decode_measured(tail)}"
+
+    @staticmethod
+    def _looks_binary(sample):
+        # Igual que git/grep: un byte nulo en el inicio del archivo indica contenido binario.
+        return b"\0" in sample
+
+    @staticmethod
+    def _decode(data):
+        # Equivale a leer en modo texto: UTF-8 con reemplazo y saltos de línea universales.
+        text = data.decode('utf-8', errors='replace')
+        if "\r" in text: text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+
+    def _decode_measured(self, data):
+        if self.profile is None: return self._decode(data)
+        started = time.perf_counter()
+        text = self._decode(data)
+        self.profile.add("decodificación (suma de hilos)", time.perf_counter() - started)
+        return text
+
+    def binary_skipped_content(self, size):
+        return SkippedContent(f"(Archivo binario de {format_size(size)} - omitido)")
+
+    def stalled_skipped_content(self):
+        return SkippedContent(f"(Omitido: la lectura no terminó en {self.options.read_timeout} s; la unidad puede no estar respondiendo)", cacheable=False)
+
+    def budget_skipped_content(self):
+        return SkippedContent(f"(Omitido: el archivo no entra en el límite total de contenido de {format_size(self.options.max_total_bytes)})", cacheable=False)
+
+    def _wants_hash(self, file_stat):
+        # Archivos recortados o vacíos no se deduplican.
+        if self.duplicates is None or file_stat is None or not file_stat.st_size: return False
+        if self.options.max_file_bytes and file_stat.st_size > self.options.max_file_bytes: return False
+        return self.duplicates.wants_hash(file_stat.st_size)
+
+    def duplicate_reference(self, original_path, base_folder):
+        return f"(Contenido idéntico a: {os.path.relpath(original_path, os.path.dirname(base_folder))})"
+
+    def _budget_size(self, file_stat):
+        # Tamaño en disco recortado al límite por archivo: lo que el archivo aporta al reporte.
+        size = file_stat.st_size if file_stat is not None else 0
+        return min(size, self.options.max_file_bytes) if self.options.max_file_bytes else size
+
+    def _charge_budget(self, file_stat):
+        # Se descuenta en el orden del reporte según el tamaño en disco (recortado al límite por
+        # archivo). Un archivo que no entra se omite, pero los siguientes más pequeños sí pueden entrar.
+        opts = self.options
+        if not opts.max_total_bytes: return True
+        size = self._budget_size(file_stat)
+        if self.budget_spent + size > opts.max_total_bytes: return False
+        self.budget_spent += size
+        return True
+
+    def _read_file_safely(self, file_path, digests=None):
+        if self.cancel_flag: return None, AnalysisCancelled("Análisis cancelado")
+        started = time.perf_counter()
+        try: return self.read_file_content(file_path, digests), None
+        except Exception as e: return None, e
+        finally:
+            if self.profile: self.profile.note_read(file_path, time.perf_counter() - started)
+
+    def _wait_for_read(self, file_path, future, pool):
+        # Espera en intervalos cortos para atender la cancelación aunque la lectura esté colgada.
+        # Si la lectura supera su plazo (contado desde que empezó, no desde que se encoló), se
+        # abandona: el archivo queda omitido con una marca y su hilo se reemplaza. None = cancelado.
+        try: return self._wait_with_deadline(future, pool)
+        except AnalysisCancelled: return None
+        except ReadStalled:
+            self.stalled_reads.append(file_path)
+            return self.stalled_skipped_content(), None
+
+    def _wait_with_deadline(self, future, pool):
+        # Resultado de `future`; AnalysisCancelled si se cancela el análisis mientras tanto y
+        # ReadStalled si la tarea supera options.read_timeout (su hilo se abandona y se reemplaza).
+        read_timeout = self.options.read_timeout
+        while True:
+            try: return future.result(timeout=READ_WAIT_POLL_SECONDS)
+            except FutureTimeoutError: pass
+            except CancelledError: raise AnalysisCancelled("Análisis cancelado (escaneo)")
+            if self.cancel_flag: raise AnalysisCancelled("Análisis cancelado (escaneo)")
+            if read_timeout and future.started is not None and time.monotonic() - future.started > read_timeout:
+                pool.abandon(); raise ReadStalled(f"No respondió en {read_timeout} s")
+
+    def _call_with_deadline(self, fn, *args):
+        # Listar una carpeta, leer un .gitignore o tomar un stat también pueden quedar colgados en una
+        # unidad que dejó de responder: se hacen en `metadata_pool` con el mismo plazo que una lectura.
+        # Fuera de un recorrido o análisis se usa un hilo solo para esta llamada.
+        if not self.options.read_timeout: return fn(*args)
+        pool = self.metadata_pool or ReadWorkerPool(1, "folder_analyzer_metadata")
+        try: return self._wait_with_deadline(pool.submit(fn, *args), pool)
+        finally:
+            if pool is not self.metadata_pool: pool.shutdown()
+
+    def _open_metadata_pool(self):
+        # Devuelve True si lo abrió (y quien llama debe cerrarlo). Tantos hilos como el escaneo en
+        # paralelo, que lista varias carpetas a la vez.
+        if self.metadata_pool is not None or not self.options.read_timeout: return False
+        self.metadata_pool = ReadWorkerPool(max(1, self.options.scan_workers), "folder_analyzer_metadata")
+        return True
+
+    def _close_metadata_pool(self):
+        if self.metadata_pool is not None: self.metadata_pool.shutdown(); self.metadata_pool = None
+
+    def read_file_with_deadline(self, file_path):
+        # Lectura suelta (modo vigilancia) con el mismo plazo que durante el análisis.
+        if not self.options.read_timeout: return self._read_file_safely(file_path)
+        pool = ReadWorkerPool(1, "folder_analyzer_reader")
+        try: return self._wait_for_read(file_path, pool.submit(self._read_file_safely, file_path), pool) or (None, AnalysisCancelled("Análisis cancelado"))
+        finally: pool.shutdown()
+
+    def _stat_file(self, file_path):
+        if self.archive is not None: return self.archive.stat(file_path)
+        file_stat = self.scanned_stats.get(file_path) if self.scanned_stats else None
+        if file_stat is not None: return file_stat
+        # Un stat que no termina a tiempo cuenta como sin stat: la lectura tiene su propio plazo.
+        try: return self._call_with_deadline(os.stat, file_path)
+        except OSError: return None
+
+    def _index_status(self, file_stat, content, read_error):
+        if read_error is not None: return INDEX_STATUS_ERROR
+        if isinstance(content, SkippedContent): return INDEX_STATUS_SKIPPED
+        if self.options.max_file_bytes and file_stat is not None and file_stat.st_size > self.options.max_file_bytes: return INDEX_STATUS_TRUNCATED
+        return None
+
+    def _is_cached(self, file_path, file_stat):
+        # Con índice SQLite se necesita el contenido de todos los archivos, y al deduplicar el hash de
+        # lo que se muestra (no de lo que se leyó en otro análisis): la caché no evita lecturas.
+        return self.cache is not None and self.index is None and self.duplicates is None and file_stat is not None and self.cache.is_fresh(file_path, file_stat)
+
+    def file_section_header(self, file_path, base_folder):
+        rel_path = os.path.relpath(file_path, os.path.dirname(base_folder))
+        return f"\n{'='*80}\nArchivo: {os.path.basename(file_path)}\nRuta: {rel_path}\n{'-'*40}"
+
+    def analyze_file_to_result(self, result_lines, file_path, base_folder, content=None, read_error=None, body=None):
+        # Escribe la sección del archivo y devuelve (cuerpo escrito sin el encabezado, éxito). Si
+        # tuvo éxito, el cuerpo no depende de la carpeta base y se puede guardar en la caché.
+        try:
+            filename = os.path.basename(file_path)
+            result_lines.append(self.file_section_header(file_path, base_folder))
+            if body is None:
+                if read_error is not None: raise read_error
+                if content is None: content = self.read_file_content(file_path)
+                render_started = time.perf_counter()
+                body = self.render_file_body(filename, content)
+                if self.profile: self.profile.note_render(file_path, time.perf_counter() - render_started)
+            result_lines.append(body)
+            return body, True
+        except Exception as e:
+            error_body = f"(Error al leer o procesar el archivo '{os.path.basename(file_path)}': {e})"
+            result_lines.append(error_body)
+            return error_body, False
+
+    def render_file_body(self, filename, content):
+        if isinstance(content, SkippedContent): return str(content)
+        # isspace() se detiene en el primer carácter visible; strip() copiaría todo el contenido.
+        if (content.blank if isinstance(content, Utf8Content) else not content or content.isspace()) and not self.options.show_empty_files:
+            return "(Archivo vacío - omitido según configuración)"
+        language = self.get_language_from_extension(os.path.splitext(filename)[1].lower())
+        header = f"Contenido ({language}):\n```{language}"
+        if isinstance(content, Utf8Content): return self._render_utf8_body(header, content)
+        body_lines = [header]
+        if self.options.add_line_numbers:
+            numbering_started = time.perf_counter()
+            numbered = number_lines(content)
+            if numbered: body_lines.append(numbered)
+            if self.profile: self.profile.add("numeración de líneas", time.perf_counter() - numbering_started)
+        else: body_lines.append(content)
+        body_lines.append("```")
+        return "\n".join(body_lines)
+
+    def _render_utf8_body(self, header, content):
+        data = b"".join(content.parts)
+        if not self.options.add_line_numbers:
+            return Utf8Content((f"{header}\n".encode('utf-8'), data, b"\n```"), len(header) + content.chars + 5)
+        numbering_started = time.perf_counter()
+        numbered = number_lines(data)
+        if self.profile: self.profile.add("numeración de líneas", time.perf_counter() - numbering_started)
+        if not numbered: return Utf8Content((f"{header}\n```".encode('utf-8'),), len(header) + 4)
+        # Los bytes agregados (prefijos) y quitados (saltos de línea) son ASCII: un byte por carácter.
+        return Utf8Content((f"{header}\n".encode('utf-8'), numbered, b"\n```"), len(header) + content.chars + len(numbered) - len(data) + 5)
+
+    def get_language_from_extension(self, ext):
+        return LANGUAGE_MAP.get(ext, 'text')
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="folder_analyzer.py --headless",
+                                     description="Analiza una carpeta sin interfaz gráfica y genera el mismo reporte que la aplicación.")
+    parser.add_argument("folder", nargs="?", help="Carpeta (o archivo .zip/.tar) a analizar")
+    parser.add_argument("-o", "--output", help="Archivo de salida (por defecto, salida estándar)")
+    parser.add_argument("--index", metavar="RUTA",
+                        help="Guardar además el análisis en una base SQLite con búsqueda de texto completo (sin -o no se genera el reporte plano)")
+    parser.add_argument("--from-index", metavar="RUTA", help="No analizar: regenerar el reporte plano a partir de un índice SQLite")
+    parser.add_argument("--search", metavar="CONSULTA", help="Con --from-index: listar los archivos que coinciden con la consulta (sintaxis FTS5)")
+    parser.add_argument("--no-subdirs", dest="include_subdirs", action="store_false", help="No incluir subdirectorios")
+    parser.add_argument("--show-empty", dest="show_empty_files", action="store_true", help="Mostrar archivos vacíos")
+    parser.add_argument("--line-numbers", dest="add_line_numbers", action="store_true", help="Agregar números de línea al contenido")
+    parser.add_argument("--no-directory-first", dest="show_directory_first", action="store_false",
+                        help="No mostrar el directorio de archivos al inicio del reporte")
+    parser.add_argument("-i", "--ignore", dest="ignored_items", action="append", default=[], metavar="PATRÓN",
+                        help="Archivo, carpeta o patrón a ignorar (ej: nombre.ext, carpeta/, *.min.js, **/build*/, !conservar.py). Se puede repetir.")
+    parser.add_argument("--gitignore", dest="use_gitignore", action="store_true", help="Respetar los archivos .gitignore encontrados en la carpeta")
+    parser.add_argument("--git", dest="git_files", action="store_true",
+                        help="Analizar solo los archivos seguidos por git (se listan con git ls-files, sin recorrer la carpeta)")
+    parser.add_argument("--changed-since", metavar="REF",
+                        help="Analizar solo los archivos modificados respecto de una referencia de git (commit, rama, tag) y los nuevos sin seguir")
+    parser.add_argument("--workers", dest="read_workers", type=int, default=DEFAULT_READ_WORKERS, metavar="N",
+                        help=f"Hilos de lectura de archivos (1 = lectura secuencial, por defecto {DEFAULT_READ_WORKERS})")
+    parser.add_argument("--scan-workers", type=int, default=DEFAULT_SCAN_WORKERS, metavar="N",
+                        help="Carpetas que se listan a la vez; acelera el escaneo en unidades de red (NFS, SMB). 1 = recorrido secuencial")
+    parser.add_argument("--read-timeout", type=int, default=DEFAULT_READ_TIMEOUT_SECONDS, metavar="S",
+                        help=f"Segundos que puede tardar la lectura de un archivo; si se supera, se omite con una marca (por defecto {DEFAULT_READ_TIMEOUT_SECONDS}, 0 = sin plazo)")
+    parser.add_argument("--read-ahead-mb", type=int, default=DEFAULT_READ_AHEAD_BYTES // (1024 * 1024), metavar="MB",
+                        help="Límite de memoria para lecturas adelantadas, en MB")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, metavar="RUTA",
+                        help=f"Reutilizar secciones de archivos sin cambios desde una caché persistente (por defecto {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024), metavar="MB",
+                        help="Tamaño máximo de la caché, en MB")
+    parser.add_argument("--max-file-kb", type=int, default=DEFAULT_MAX_FILE_BYTES // 1024, metavar="KB",
+                        help="Recortar los archivos más grandes mostrando su inicio y final (por defecto 0 = sin límite)")
+    parser.add_argument("--max-total-mb", type=int, default=DEFAULT_MAX_TOTAL_BYTES // (1024 * 1024), metavar="MB",
+                        help="Límite del contenido total del reporte; los archivos que ya no entran se omiten (0 = sin límite)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="No generar el reporte: escanear y mostrar su tamaño y líneas estimados y los archivos y carpetas que más aportan")
+    parser.add_argument("--confirm-above", type=int, default=0, metavar="MB",
+                        help="Si el reporte estimado supera este tamaño, mostrar la estimación y preguntar antes de generarlo (sin terminal, se cancela)")
+    parser.add_argument("--dedupe", dest="dedupe_identical", action="store_true",
+                        help="Mostrar una sola vez el contenido de archivos idénticos; los demás remiten al primero")
+    parser.add_argument("--skip-binary", dest="skip_binary", action="store_true",
+                        help="Omitir los archivos que parecen binarios (bytes nulos al inicio)")
+    parser.add_argument("--include-binary", dest="skip_binary", action="store_false",
+                        help="Incluir los archivos que parecen binarios (es lo predeterminado)")
+    parser.add_argument("--profile", action="store_true", help="Medir tiempos por fase y mostrar los archivos y carpetas más lentos en stderr")
+    parser.add_argument("--profile-json", metavar="RUTA", help="Guardar el perfil del análisis en formato JSON (implica --profile)")
+    parser.add_argument("--progress", action="store_true", help="Mostrar el progreso en stderr")
+    parser.add_argument("--compress", choices=sorted(COMPRESSION_SUFFIXES),
+                        help="Comprimir el archivo de salida (también se deduce de -o terminado en .gz o .xz)")
+    parser.add_argument("--shard-kb", type=int, default=0, metavar="KB",
+                        help="Dividir la salida en partes de como máximo este tamaño sin comprimir, cortando solo entre archivos, con un manifiesto JSON")
+    parser.add_argument("--shard-lines", type=int, default=0, metavar="N", help="Dividir la salida en partes de como máximo N líneas (igual que --shard-kb)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Seguir vigilando la carpeta y actualizar el archivo de salida con cada cambio (requiere -o)")
+    parser.add_argument("--daemon", nargs="?", const=DEFAULT_DAEMON_SOCKET, metavar="SOCKET",
+                        help=f"Pedir el reporte al servicio local (folder_analyzer_daemon.py) en lugar de analizar en este proceso (por defecto {DEFAULT_DAEMON_SOCKET})")
+    return parser
+
+
+class ProgressPrinter:
+    # Muestra el progreso en stderr a intervalos fijos desde un hilo propio.
+    def __init__(self, progress, interval=PROGRESS_PRINT_INTERVAL_SECONDS):
+        self.progress = progress
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._last_line = None
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set(); self._thread.join()
+        self._print()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval): self._print()
+
+    def _print(self):
+        text, percent = self.progress.snapshot()
+        line = f"[{percent:5.1f}%] {text}"
+        if line != self._last_line: print(line, file=sys.stderr); self._last_line = line
+
+
+def cli_main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if "--headless" in argv: argv.remove("--headless")
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.watch and not args.output: parser.error("--watch requiere -o/--output")
+    compression = args.compress or (compression_from_path(args.output) if args.output else None)
+    sharded = args.shard_kb > 0 or args.shard_lines > 0
+    if (compression or sharded) and not args.output: parser.error("--compress, --shard-kb y --shard-lines requieren -o/--output")
+    if (compression or sharded) and args.watch: parser.error("--watch no se puede combinar con --compress ni con partes")
+    if compression and not args.output.lower().endswith(COMPRESSION_SUFFIXES[compression]): args.output += COMPRESSION_SUFFIXES[compression]
+    if args.search and not args.from_index: parser.error("--search requiere --from-index")
+    if args.from_index: return index_main(args)
+    if not args.folder: parser.error("falta la carpeta a analizar")
+    if args.daemon and (args.cache or args.index or args.profile or args.profile_json):
+        parser.error("--daemon no se puede combinar con --cache, --index ni --profile")
+    if args.estimate and (args.output or args.index or args.watch): parser.error("--estimate no genera el reporte: no se combina con -o, --index ni --watch")
+
+    folder_path = args.folder
+    if is_archive_path(folder_path):
+        if args.watch: parser.error("--watch no se puede usar con un archivo comprimido")
+        if args.git_files or args.changed_since: parser.error("--git y --changed-since no se pueden usar con un archivo comprimido")
+    elif not os.path.isdir(folder_path):
+        print(f"Ruta de carpeta a analizar inválida: {folder_path}", file=sys.stderr)
+        return 1
+
+    options = AnalysisOptions(include_subdirs=args.include_subdirs, show_empty_files=args.show_empty_files,
+                              add_line_numbers=args.add_line_numbers, show_directory_first=args.show_directory_first,
+                              ignored_items=args.ignored_items, read_workers=args.read_workers,
+                              read_ahead_bytes=args.read_ahead_mb * 1024 * 1024, use_gitignore=args.use_gitignore,
+                              max_file_bytes=args.max_file_kb * 1024, max_total_bytes=args.max_total_mb * 1024 * 1024,
+                              skip_binary=args.skip_binary, dedupe_identical=args.dedupe_identical, git_files=args.git_files,
+                              changed_since=args.changed_since, scan_workers=max(1, args.scan_workers), read_timeout=max(0, args.read_timeout))
+    cache = RenderCache(args.cache, args.cache_max_mb * 1024 * 1024) if args.cache else None
+    profile = AnalysisProfile() if args.profile or args.profile_json else None
+    index = AnalysisIndex(args.index) if args.index else None
+    if args.daemon:
+        from folder_analyzer_daemon import DaemonClient
+        # El servicio no comparte el directorio actual: las rutas del reporte parten de la ruta absoluta.
+        folder_path = os.path.abspath(folder_path)
+        engine = DaemonClient(options, args.daemon)
+    else:
+        engine = FolderAnalysisEngine(options, cache=cache, profile=profile, index=index)
+    if args.estimate: return estimate_main(engine, folder_path)
+    if args.confirm_above > 0:
+        engine.confirm_above_bytes = args.confirm_above * 1024 * 1024; engine.confirm_estimate = confirm_estimate_on_console
+    if args.watch: return watch_main(engine, folder_path, args.output)
+    # El archivo de salida se escribe en binario: el contenido UTF-8 válido pasa sin decodificarse.
+    if args.output: out = ShardedReportOutput(args.output, compression, args.shard_kb * 1024, args.shard_lines)
+    elif index: out = open(os.devnull, 'w', encoding='utf-8')
+    else: out = sys.stdout; sys.stdout.reconfigure(encoding='utf-8')
+    progress_printer = ProgressPrinter(engine.progress) if args.progress else None
+    try:
+        if progress_printer: progress_printer.start()
+        engine.analyze(folder_path, out)
+        if isinstance(out, ShardedReportOutput): out.close()
+    except (AnalysisCancelled, NoFilesToAnalyze, GitError, ArchiveError, DaemonError) as e:
+        print(e, file=sys.stderr)
+        if isinstance(out, ShardedReportOutput): out.close(completed=False)
+        return 1
+    finally:
+        if progress_printer: progress_printer.stop()
+        if out is not sys.stdout and not out.closed: out.close(completed=False) if isinstance(out, ShardedReportOutput) else out.close()
+    if sharded: print(f"Análisis guardado en {len(out.shards)} partes; manifiesto: {out.manifest_path}", file=sys.stderr)
+    elif args.output: print(f"Análisis guardado en: {args.output}", file=sys.stderr)
+    if index: print(f"Índice guardado en: {args.index}" + ("" if index.fts else " (sin FTS5: búsqueda simple)"), file=sys.stderr)
+    if cache: print(cache.summary(), file=sys.stderr)
+    if args.daemon: print(engine.summary(), file=sys.stderr)
+    if engine.scan_errors: print(format_scan_errors(engine.scan_errors), file=sys.stderr)
+    if engine.stalled_reads: print(format_stalled_reads(engine.stalled_reads), file=sys.stderr)
+    if engine.duplicates: print(f"Archivos idénticos a uno anterior: {len(engine.duplicates.duplicate_of)}", file=sys.stderr)
+    if profile: print(profile.summary(), file=sys.stderr)
+    if args.profile_json: profile.save_json(args.profile_json); print(f"Perfil guardado en: {args.profile_json}", file=sys.stderr)
+    return 0
+
+
+def confirm_estimate_on_console(estimate):
+    # La pregunta va a stderr: stdout puede ser el propio reporte.
+    print(estimate.summary(limit=5), file=sys.stderr)
+    if not sys.stdin.isatty(): return False
+    print("¿Generar el reporte de todas formas? [s/N] ", end="", file=sys.stderr, flush=True)
+    return sys.stdin.readline().strip().lower() in ("s", "si", "sí", "y", "yes")
+
+
+def estimate_main(engine, folder_path):
+    try: estimate = engine.estimate_folder(folder_path)
+    except (AnalysisCancelled, NoFilesToAnalyze, GitError, ArchiveError, DaemonError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    sys.stdout.reconfigure(encoding='utf-8')
+    print(estimate.summary())
+    if engine.scan_errors: print(format_scan_errors(engine.scan_errors), file=sys.stderr)
+    return 0
+
+
+def index_main(args):
+    try:
+        if args.search:
+            sys.stdout.reconfigure(encoding='utf-8')
+            try: matches = search_index(args.from_index, args.search)
+            except sqlite3.OperationalError as e:
+                print(f"Consulta inválida: {e}", file=sys.stderr)
+                return 1
+            for path, snippet, status in matches:
+                if status: path = f"{path} [{status}]"
+                print(f"{path}: {' '.join(snippet.split())}" if snippet else path)
+            return 0
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as out: export_index_report(args.from_index, out)
+            print(f"Reporte regenerado en: {args.output}", file=sys.stderr)
+        else:
+            sys.stdout.reconfigure(encoding='utf-8'); export_index_report(args.from_index, sys.stdout)
+    except (OSError, sqlite3.Error, KeyError) as e:
+        print(f"No se pudo leer el índice: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _write_output_atomically(spool, output_path):
+    # Se escribe en un temporal y se renombra: quien lea el archivo nunca ve un reporte a medias.
+    tmp_path = f"{output_path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            spool.seek(0); shutil.copyfileobj(spool, out)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+
+def watch_main(engine, folder_path, output_path):
+    from folder_analyzer_watch import LiveReport, create_watcher
+    timestamp = datetime.now()
+    spool = create_report_spool()
+    try:
+        engine.analyze(folder_path, spool, timestamp)
+    except (AnalysisCancelled, NoFilesToAnalyze, GitError, DaemonError) as e:
+        spool.close(); print(e, file=sys.stderr)
+        return 1
+    engine.profile = None # las actualizaciones incrementales no se perfilan
+    live_report = LiveReport(engine, folder_path, spool, engine.sections, timestamp)
+    _write_output_atomically(live_report.spool, output_path)
+    print(f"Análisis guardado en: {output_path}", file=sys.stderr)
+    if engine.scan_errors: print(format_scan_errors(engine.scan_errors), file=sys.stderr)
+    if engine.stalled_reads: print(format_stalled_reads(engine.stalled_reads), file=sys.stderr)
+
+    def on_changes(dirty_paths, rescan):
+        changed = live_report.apply_changes(dirty_paths, rescan)
+        if not changed: return
+        with live_report.lock: _write_output_atomically(live_report.spool, output_path)
+        print(f"[{live_report.timestamp.strftime('%H:%M:%S')}] Reporte actualizado: {changed} archivo(s) modificado(s), "
+              f"{len(live_report.sections)} en total", file=sys.stderr)
+
+    watcher = create_watcher(engine, folder_path, on_changes)
+    print(f"Vigilando cambios en {folder_path} ({watcher.mode}). Ctrl+C para terminar.", file=sys.stderr)
+    watcher.start()
+    try:
+        while watcher.is_alive(): watcher.join(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop(); watcher.join(); live_report.spool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli_main())
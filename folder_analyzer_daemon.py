@@ -0,0 +1,489 @@
+# folder_analyzer_daemon.py
+#
+# Servicio local de análisis: un proceso de larga duración que escucha en un socket Unix y
+# mantiene en memoria el listado de las carpetas y las secciones ya renderizadas. Repetir un
+# análisis (desde la línea de comandos o desde la aplicación) no vuelve a recorrer el árbol ni a
+# leer los archivos que no cambiaron.
+#
+#   python folder_analyzer_daemon.py
+#   python folder_analyzer.py --headless ruta/al/proyecto --daemon -o reporte.txt
+
+import os
+import sys
+import json
+import time
+import codecs
+import signal
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from datetime import datetime
+from folder_analyzer_core import (FolderAnalysisEngine, AnalysisOptions, AnalysisCancelled, NoFilesToAnalyze, GitError, ArchiveError,
+                                  DaemonError, ReportEstimate, ReportEstimateDeclined, Utf8Content, DEFAULT_DAEMON_SOCKET, TIMESTAMP_FORMAT, READ_WAIT_POLL_SECONDS, is_archive_path, render_options_key, format_size)
+
+PROTOCOL_VERSION = 1
+DEFAULT_MEMORY_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_LISTINGS = 32
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+FRAME_HEADER = struct.Struct(">cI") # tipo, longitud
+FRAME_BUFFER_BYTES = 256 * 1024
+PROGRESS_FRAME_SECONDS = 0.25
+# Una carpeta modificada tan cerca del escaneo puede volver a cambiar sin que su fecha se mueva
+# (resolución del sistema de archivos): ese listado no se reutiliza.
+RACY_LISTING_NS = 2 * 10**9
+REMOTE_ERRORS = {cls.__name__: cls for cls in (AnalysisCancelled, NoFilesToAnalyze, GitError, ArchiveError)}
+
+
+class DaemonUnavailable(DaemonError):
+    pass
+
+
+class RemoteFileStat:
+    __slots__ = ('st_size', 'st_mtime', 'st_mtime_ns')
+
+    def __init__(self, size, mtime_ns):
+        self.st_size = size; self.st_mtime_ns = mtime_ns; self.st_mtime = mtime_ns / 1e9
+
+
+class SectionStore:
+    # Secciones renderizadas compartidas por todas las peticiones: (opciones, ruta) -> (tamaño,
+    # mtime, cuerpo). Los cuerpos se guardan ya codificados en UTF-8 (Utf8Content), así una sección
+    # en memoria se envía sin volver a codificarla. Al superar `max_bytes` se expulsan las usadas
+    # hace más tiempo (LRU).
+    def __init__(self, max_bytes=DEFAULT_MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def is_fresh(self, key, file_stat):
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and entry[:2] == (file_stat.st_size, file_stat.st_mtime_ns)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None: return None
+            self.entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key, file_stat, body):
+        data = body.encode('utf-8')
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None: self.nbytes -= len(old[2].parts[0])
+            if len(data) > self.max_bytes: return
+            self.entries[key] = (file_stat.st_size, file_stat.st_mtime_ns, Utf8Content((data,), len(body))); self.nbytes += len(data)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False); self.nbytes -= len(evicted[2].parts[0])
+
+
+class MemoryRenderCache:
+    # Misma interfaz que RenderCache, sobre el SectionStore del servicio. Si una entrada se expulsa
+    # entre is_fresh() y get(), el motor simplemente vuelve a leer el archivo.
+    def __init__(self, store):
+        self.store = store
+        self.options_key = None
+        self.hits = 0
+        self.misses = 0
+
+    def open(self, folder_path, options):
+        self.options_key = render_options_key(options); self.hits = self.misses = 0
+
+    def is_fresh(self, file_path, file_stat):
+        return self.store.is_fresh((self.options_key, file_path), file_stat)
+
+    def get(self, file_path):
+        body = self.store.get((self.options_key, file_path))
+        if body is not None: self.hits += 1
+        return body
+
+    def put(self, file_path, file_stat, body):
+        self.misses += 1
+        self.store.put((self.options_key, file_path), file_stat, body)
+
+    def close(self):
+        pass
+
+    def summary(self):
+        return f"Caché del servicio: {self.hits} aciertos, {self.misses} fallos"
+
+
+class FolderListing:
+    # Archivos de una carpeta para unas opciones de recorrido, junto con la fecha y el tamaño de
+    # cada carpeta recorrida (y de su .gitignore): crear, borrar o renombrar una entrada cambia la
+    # fecha de su carpeta. Mientras ninguna cambie, el listado se reutiliza sin recorrer el árbol.
+    # Las peticiones simultáneas sobre la misma carpeta esperan en el lock un único escaneo.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = None
+        self.stamps = None
+
+    def files_for(self, engine, folder_path):
+        # Devuelve (archivos, se_escaneó).
+        use_gitignore = engine.options.use_gitignore
+        with self.lock:
+            if self.stamps is not None and all(self._stamp(path, use_gitignore) == stamp for path, stamp in self.stamps.items()):
+                return self.files, False
+            self.files = self.stamps = None
+            stamps = {}; started = time.time_ns()
+            if is_archive_path(folder_path):
+                stamps[folder_path] = self._stamp(folder_path, False)
+                files = engine.get_files_list(folder_path)
+            else:
+                files = list(engine.iter_files(folder_path, on_dir=lambda path: stamps.__setitem__(path, self._stamp(path, use_gitignore))))
+            # stamp[::2]: fechas de la carpeta y de su .gitignore.
+            # Un listado con carpetas que no se pudieron leer (p. ej. un corte de red) no se reutiliza.
+            if not engine.scan_errors and all(stamp is not None and max(stamp[::2]) < started - RACY_LISTING_NS for stamp in stamps.values()):
+                self.stamps = stamps
+            self.files = files
+            return files, True
+
+    @staticmethod
+    def _stamp(path, use_gitignore):
+        try: path_stat = os.stat(path)
+        except OSError: return None
+        stamp = (path_stat.st_mtime_ns, path_stat.st_size)
+        if use_gitignore:
+            try: gitignore_stat = os.stat(os.path.join(path, ".gitignore"))
+            except OSError: pass
+            else: stamp += (gitignore_stat.st_mtime_ns, gitignore_stat.st_size)
+        return stamp
+
+
+class FrameWriter:
+    # Destino del reporte dentro del servicio. Lo escrito viaja en tramas (tipo, longitud, datos):
+    # "D" texto del reporte en UTF-8, "S" comienzo de una sección (para que el cliente pueda dividir
+    # la salida en partes), "P" progreso y "E" resultado final en JSON. El reporte se envía en
+    # bloques; el progreso lo envía un hilo aparte cada PROGRESS_FRAME_SECONDS junto con lo que haya
+    # en el búfer, también mientras se escanea o se espera una lectura lenta. Si el cliente cerró la
+    # conexión (canceló), ese envío falla y el análisis se cancela.
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.buffer = bytearray()
+        self.data = bytearray()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def watch_progress(self, engine):
+        threading.Thread(target=self._send_progress, args=(engine,), name="folder_analyzer_daemon_progress", daemon=True).start()
+
+    def _send_progress(self, engine):
+        while not self.stopped.wait(PROGRESS_FRAME_SECONDS):
+            try:
+                with self.lock:
+                    if self.stopped.is_set(): return
+                    self._frame(b"P", json.dumps(engine.progress.snapshot(), ensure_ascii=False).encode('utf-8'))
+                    self._send()
+            except (OSError, ValueError): # ValueError: el servidor ya cerró el archivo
+                engine.cancel_flag = True; return
+
+    def write(self, text):
+        self.write_bytes(text.encode('utf-8'))
+        return len(text)
+
+    def write_bytes(self, data):
+        with self.lock:
+            if len(data) >= FRAME_BUFFER_BYTES:
+                # Un bloque grande (p. ej. una sección en memoria) se envía sin copiarlo al búfer.
+                self._send(); self.wfile.write(FRAME_HEADER.pack(b"D", len(data))); self.wfile.write(data)
+                return
+            self.data += data
+            if len(self.data) >= FRAME_BUFFER_BYTES: self._send()
+
+    def begin_section(self, label):
+        with self.lock:
+            self._frame(b"S", (label or "").encode('utf-8'))
+            if len(self.buffer) >= FRAME_BUFFER_BYTES: self._send()
+
+    def finish(self, status):
+        self.stop()
+        with self.lock:
+            self._frame(b"E", json.dumps(status, ensure_ascii=False).encode('utf-8'))
+            self._send()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _frame(self, kind, payload):
+        self._flush_data()
+        self.buffer += FRAME_HEADER.pack(kind, len(payload)); self.buffer += payload
+
+    def _flush_data(self):
+        if not self.data: return
+        self.buffer += FRAME_HEADER.pack(b"D", len(self.data)); self.buffer += self.data
+        self.data.clear()
+
+    def flush(self):
+        with self.lock: self._send()
+
+    def _send(self):
+        self._flush_data()
+        if self.buffer: self.wfile.write(self.buffer); self.buffer.clear()
+
+
+class AnalysisDaemon:
+    # Estado compartido por todas las conexiones: los listados de las últimas carpetas analizadas
+    # (uno por combinación de carpeta y opciones de recorrido) y las secciones renderizadas.
+    def __init__(self, cache_max_bytes=DEFAULT_MEMORY_CACHE_BYTES, max_listings=DEFAULT_MAX_LISTINGS, log=None):
+        self.sections = SectionStore(cache_max_bytes)
+        self.max_listings = max_listings
+        self.listings = OrderedDict()
+        self.lock = threading.Lock()
+        self.log = log
+        self.requests = 0
+
+    def listing_for(self, options, folder_path):
+        # Con git el listado depende del índice y de las referencias del repositorio: no se guarda.
+        if options.git_files or options.changed_since: return None
+        key = (folder_path, options.include_subdirs, options.use_gitignore, tuple(options.ignored_items))
+        with self.lock:
+            listing = self.listings.pop(key, None) or FolderListing()
+            self.listings[key] = listing
+            while len(self.listings) > self.max_listings: self.listings.popitem(last=False)
+        return listing
+
+    def handle_connection(self, rfile, wfile):
+        output = FrameWriter(wfile)
+        started = time.perf_counter()
+        try:
+            request = json.loads(rfile.readline(MAX_REQUEST_BYTES))
+            if request.get("version") != PROTOCOL_VERSION: raise DaemonError("Versión del protocolo del servicio no compatible")
+            if request.get("command") == "stats": status = self.stats()
+            elif request.get("command") == "estimate": status = self.estimate(request, output)
+            else: status = self.analyze(request, output)
+        except (BrokenPipeError, ConnectionResetError):
+            output.stop(); return # el cliente cerró la conexión (p. ej. canceló el análisis)
+        except (AnalysisCancelled, NoFilesToAnalyze, GitError, ArchiveError, DaemonError) as e:
+            status = {"ok": False, "error": str(e), "kind": type(e).__name__}
+        except Exception as e:
+            status = {"ok": False, "error": f"Error inesperado en el servicio: {e}", "kind": "DaemonError"}
+        if self.log and "files" in status:
+            self.log(f"{status['folder']}: {status['files']} archivos en {time.perf_counter() - started:.3f} s "
+                     f"({'escaneo' if status['scanned'] else 'listado en memoria'}, {status['cache']})")
+        elif self.log and not status["ok"]: self.log(f"Error: {status['error']}")
+        try: output.finish(status)
+        except OSError: pass
+
+    @staticmethod
+    def _request_folder(request):
+        folder_path = os.path.abspath(request["folder"])
+        if not os.path.isdir(folder_path) and not is_archive_path(folder_path): raise DaemonError(f"Ruta de carpeta a analizar inválida: {folder_path}")
+        return folder_path
+
+    def analyze(self, request, output):
+        folder_path = self._request_folder(request)
+        options = AnalysisOptions.from_dict(request.get("options") or {})
+        timestamp = datetime.strptime(request["timestamp"], TIMESTAMP_FORMAT) if request.get("timestamp") else datetime.now()
+        cache = MemoryRenderCache(self.sections)
+        engine = FolderAnalysisEngine(options, cache=cache)
+        # El servicio no pregunta: si la estimación supera el umbral del cliente, devuelve solo la
+        # estimación y el cliente, si se confirma, repite la petición (el listado ya está en memoria).
+        engine.confirm_above_bytes = request.get("confirm_above_bytes") or 0
+        engine.confirm_estimate = lambda estimate: False
+        output.watch_progress(engine)
+        with self.lock: self.requests += 1
+        listing = self.listing_for(options, folder_path)
+        files, scanned = listing.files_for(engine, folder_path) if listing else (None, True)
+        try: file_count = engine.analyze(folder_path, output, timestamp, files=files)
+        except ReportEstimateDeclined as e:
+            return {"ok": True, "folder": folder_path, "declined": True, "scanned": scanned, "estimate": e.estimate.to_dict(),
+                    "scan_errors": engine.scan_errors}
+        sections = [[path, start, end] + ([file_stat.st_size, file_stat.st_mtime_ns] if file_stat is not None else [None, None])
+                    for path, start, end, file_stat in engine.sections]
+        return {"ok": True, "folder": folder_path, "files": file_count, "scanned": scanned, "cache": cache.summary(), "sections": sections,
+                "scan_errors": engine.scan_errors, "stalled_reads": engine.stalled_reads, "estimate": engine.estimate.to_dict()}
+
+    def estimate(self, request, output):
+        folder_path = self._request_folder(request)
+        options = AnalysisOptions.from_dict(request.get("options") or {})
+        engine = FolderAnalysisEngine(options)
+        output.watch_progress(engine)
+        with self.lock: self.requests += 1
+        listing = self.listing_for(options, folder_path)
+        files, scanned = listing.files_for(engine, folder_path) if listing else (None, True)
+        estimate = engine.estimate_folder(folder_path, files)
+        return {"ok": True, "folder": folder_path, "scanned": scanned, "estimate": estimate.to_dict(), "scan_errors": engine.scan_errors}
+
+    def stats(self):
+        with self.lock: listings, requests = len(self.listings), self.requests
+        with self.sections.lock: sections, nbytes = len(self.sections.entries), self.sections.nbytes
+        return {"ok": True, "requests": requests, "listings": listings, "sections": sections, "cached_bytes": nbytes}
+
+
+class FrameReader:
+    # Lado del cliente: cada recv() espera como máximo READ_WAIT_POLL_SECONDS, así la cancelación se
+    # atiende aunque el servicio no envíe nada. El búfer propio (en lugar de makefile()) evita
+    # perder datos a medio leer cuando vence el plazo de un recv().
+    def __init__(self, sock, engine):
+        self.sock = sock
+        self.engine = engine
+        self.buffer = bytearray()
+        self.offset = 0
+        sock.settimeout(READ_WAIT_POLL_SECONDS)
+
+    def read_frame(self):
+        kind, size = FRAME_HEADER.unpack(self._read(FRAME_HEADER.size))
+        return kind, self._read(size)
+
+    def _read(self, size):
+        while len(self.buffer) - self.offset < size:
+            if self.offset: del self.buffer[:self.offset]; self.offset = 0
+            try: chunk = self.sock.recv(max(FRAME_BUFFER_BYTES, size - len(self.buffer)))
+            except socket.timeout:
+                if self.engine.cancel_flag: raise AnalysisCancelled("Análisis cancelado")
+                continue
+            if not chunk: raise DaemonError("El servicio de análisis cerró la conexión antes de terminar")
+            self.buffer += chunk
+        with memoryview(self.buffer) as view: data = bytes(view[self.offset:self.offset + size])
+        self.offset += size
+        return data
+
+
+class DaemonClient(FolderAnalysisEngine):
+    # Motor que pide el reporte al servicio local en lugar de generarlo en este proceso. El resto de
+    # los métodos (los que usa el modo vigilancia para actualizar el reporte) trabaja localmente.
+    def __init__(self, options=None, socket_path=DEFAULT_DAEMON_SOCKET):
+        super().__init__(options)
+        self.socket_path = socket_path
+        self.status = None
+
+    def connect(self):
+        if not hasattr(socket, "AF_UNIX"): raise DaemonUnavailable("Este sistema no admite sockets Unix")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try: sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(f"No se pudo conectar con el servicio de análisis en {self.socket_path}: {e}") from e
+        return sock
+
+    def request(self, request, out=None):
+        # Envía la petición, copia el reporte recibido en `out` y devuelve el resultado final.
+        sock = self.connect()
+        try:
+            sock.sendall(json.dumps(dict(request, version=PROTOCOL_VERSION), ensure_ascii=False).encode('utf-8') + b"\n")
+            frames = FrameReader(sock, self)
+            write_bytes = getattr(out, "write_bytes", None)
+            on_section = getattr(out, "begin_section", None)
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            while True:
+                kind, payload = frames.read_frame()
+                if kind == b"D":
+                    if write_bytes: write_bytes(payload)
+                    else: out.write(decoder.decode(payload))
+                elif kind == b"S":
+                    if on_section: on_section(payload.decode('utf-8') or None)
+                elif kind == b"P":
+                    self.update_progress(*json.loads(payload))
+                elif kind == b"E":
+                    status = json.loads(payload); break
+                if self.cancel_flag: raise AnalysisCancelled("Análisis cancelado")
+        finally:
+            sock.close()
+        if not status["ok"]: raise REMOTE_ERRORS.get(status.get("kind"), DaemonError)(status["error"])
+        return status
+
+    def analyze(self, folder_path, out, timestamp=None, files=None):
+        timestamp = timestamp or datetime.now()
+        self.update_progress("Solicitando el reporte al servicio de análisis...", 0)
+        self.sections = []; self.duplicates = None; self.status = None; self.scan_errors = []; self.stalled_reads = []; self.estimate = None
+        request = {"folder": os.path.abspath(folder_path), "options": self.options.to_dict(), "timestamp": timestamp.strftime(TIMESTAMP_FORMAT)}
+        if self.confirm_estimate and self.confirm_above_bytes: request["confirm_above_bytes"] = self.confirm_above_bytes
+        self.status = self.request(request, out)
+        if self.status.get("declined"):
+            # La estimación superó el umbral: se confirma aquí (puede cambiar el límite total) y se repite.
+            self.estimate = ReportEstimate.from_dict(self.status["estimate"])
+            if not self.confirm_estimate(self.estimate):
+                raise ReportEstimateDeclined(f"Análisis cancelado: {self.estimate.headline()}", self.estimate)
+            del request["confirm_above_bytes"]; request["options"] = self.options.to_dict()
+            self.status = self.request(request, out)
+        self.estimate = ReportEstimate.from_dict(self.status["estimate"])
+        self.sections = [(path, start, end, RemoteFileStat(size, mtime_ns) if size is not None else None)
+                         for path, start, end, size, mtime_ns in self.status["sections"]]
+        self.scan_errors = [tuple(error) for error in self.status["scan_errors"]]
+        self.stalled_reads = self.status["stalled_reads"]
+        return self.status["files"]
+
+    def estimate_folder(self, folder_path, files=None):
+        self.status = None
+        status = self.request({"command": "estimate", "folder": os.path.abspath(folder_path), "options": self.options.to_dict()})
+        self.scan_errors = [tuple(error) for error in status["scan_errors"]]
+        self.estimate = ReportEstimate.from_dict(status["estimate"])
+        return self.estimate
+
+    def stats(self):
+        return self.request({"command": "stats"})
+
+    def summary(self):
+        if self.status is None: return ""
+        return f"Servicio de análisis: {'escaneo nuevo' if self.status['scanned'] else 'listado en memoria'}. {self.status['cache']}"
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.analysis_daemon.handle_connection(self.rfile, self.wfile)
+
+
+if hasattr(socket, "AF_UNIX"):
+    class DaemonServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        block_on_close = False
+
+        def __init__(self, socket_path, analysis_daemon):
+            self.analysis_daemon = analysis_daemon
+            super().__init__(socket_path, _RequestHandler)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Servicio local que mantiene en memoria los listados y las secciones de las carpetas analizadas.")
+    parser.add_argument("--socket", default=DEFAULT_DAEMON_SOCKET, metavar="RUTA", help=f"Socket Unix donde escuchar (por defecto {DEFAULT_DAEMON_SOCKET})")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_MEMORY_CACHE_BYTES // (1024 * 1024), metavar="MB",
+                        help="Memoria máxima para secciones renderizadas, en MB (aprox.)")
+    parser.add_argument("--max-folders", type=int, default=DEFAULT_MAX_LISTINGS, metavar="N",
+                        help=f"Listados de carpetas que se mantienen en memoria (por defecto {DEFAULT_MAX_LISTINGS})")
+    parser.add_argument("--stats", action="store_true", help="No iniciar: mostrar el estado del servicio que ya está escuchando")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if not hasattr(socket, "AF_UNIX"):
+        print("Este sistema no admite sockets Unix.", file=sys.stderr)
+        return 1
+    if args.stats:
+        try: status = DaemonClient(socket_path=args.socket).stats()
+        except DaemonError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f"Peticiones: {status['requests']}  Carpetas en memoria: {status['listings']}  "
+              f"Secciones: {status['sections']} ({format_size(status['cached_bytes'])})")
+        return 0
+    if os.path.exists(args.socket):
+        try: DaemonClient(socket_path=args.socket).stats()
+        except DaemonUnavailable: os.remove(args.socket) # quedó de un servicio que ya no está
+        else:
+            print(f"Ya hay un servicio escuchando en {args.socket}", file=sys.stderr)
+            return 1
+    log = lambda text: print(f"[{datetime.now().strftime('%H:%M:%S')}] {text}", file=sys.stderr)
+    analysis_daemon = AnalysisDaemon(args.cache_mb * 1024 * 1024, args.max_folders, log)
+    old_umask = os.umask(0o177) # el socket solo es accesible para el usuario que inicia el servicio
+    try: server = DaemonServer(args.socket, analysis_daemon)
+    finally: os.umask(old_umask)
+    signal.signal(signal.SIGTERM, lambda *a: sys.exit(0))
+    print(f"Servicio de análisis escuchando en {args.socket}. Ctrl+C para terminar.", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket): os.remove(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
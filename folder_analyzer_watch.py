@@ -0,0 +1,292 @@
+# folder_analyzer_watch.py
+#
+# Modo vigilancia: mantiene un reporte ya generado al día mientras la carpeta cambia,
+# regenerando solo las secciones de los archivos afectados.
+
+import os
+import sys
+import time
+import select
+import struct
+import threading
+from datetime import datetime
+from folder_analyzer_core import ReportWriter, create_report_spool
+
+DEFAULT_DEBOUNCE_SECONDS = 0.5
+DEFAULT_MAX_DELAY_SECONDS = 5.0
+DEFAULT_POLL_INTERVAL_SECONDS = 2.0
+COPY_CHUNK_CHARS = 1024 * 1024
+
+
+class LiveReport:
+    # Reporte "vivo" construido a partir de un análisis completo. Guarda la posición de cada
+    # sección dentro del reporte; al aplicar cambios se escribe un reporte nuevo copiando en
+    # orden las secciones intactas del anterior y renderizando solo los archivos modificados o
+    # nuevos. El encabezado y el directorio de archivos se regeneran (no requieren leer archivos).
+    def __init__(self, engine, folder_path, spool, sections, timestamp, lock=None):
+        self.engine = engine
+        self.folder_path = folder_path
+        self.spool = spool
+        self.sections = list(sections)
+        self.timestamp = timestamp
+        self.lock = lock or threading.Lock()
+
+    def apply_changes(self, dirty_paths, rescan):
+        # Devuelve la cantidad de secciones regeneradas o eliminadas (0 si no hubo cambios reales).
+        engine = self.engine
+        old_stats = {path: file_stat for path, _, _, file_stat in self.sections}
+        if rescan: files = engine.get_files_list(self.folder_path)
+        else: files = [path for path, _, _, _ in self.sections]
+        candidates = set(files) if rescan else {path for path in dirty_paths if path in old_stats}
+        new_stats = {}; to_render = set()
+        for path in candidates:
+            file_stat = engine._stat_file(path)
+            new_stats[path] = file_stat
+            if path not in old_stats or file_stat is None or old_stats[path] is None or \
+               (file_stat.st_size, file_stat.st_mtime_ns) != (old_stats[path].st_size, old_stats[path].st_mtime_ns):
+                to_render.add(path)
+        if not rescan: files = [path for path in files if path not in new_stats or new_stats[path] is not None]
+        current = set(files)
+        removed = len(old_stats) - len(current & old_stats.keys())
+        if engine.duplicates and (to_render or removed):
+            # Las secciones que remiten a un archivo modificado o eliminado vuelven a mostrar su contenido.
+            for path, original in list(engine.duplicates.duplicate_of.items()):
+                if original in to_render or original not in current:
+                    del engine.duplicates.duplicate_of[path]
+                    if path in current: to_render.add(path)
+        if not to_render and not removed: return 0
+
+        timestamp = datetime.now()
+        new_spool = create_report_spool()
+        try:
+            with self.lock:
+                new_sections = self._rewrite(new_spool, files, to_render, new_stats, timestamp)
+                old_spool, self.spool = self.spool, new_spool
+                self.sections = new_sections; self.timestamp = timestamp
+                old_spool.close()
+        except BaseException:
+            new_spool.close(); raise
+        return len(to_render) + removed
+
+    def _rewrite(self, new_spool, files, to_render, new_stats, timestamp):
+        engine = self.engine
+        old_positions = {path: (start, end, file_stat) for path, start, end, file_stat in self.sections}
+        writer = ReportWriter(new_spool)
+        engine.write_report_preamble(writer, self.folder_path, files, timestamp)
+        old = self.spool; old.seek(0); old_position = 0
+        sections = []
+        for path in files:
+            start = writer.position
+            if path in to_render or path not in old_positions:
+                file_stat = new_stats.get(path)
+                content, read_error = engine.read_file_with_deadline(path)
+                engine.analyze_file_to_result(writer, path, self.folder_path, content, read_error)
+            else:
+                # Las secciones están en el mismo orden en ambos reportes: la lectura solo avanza.
+                section_start, section_end, file_stat = old_positions[path]
+                old_position = self._skip(old, old_position, section_start)
+                remaining = section_end - section_start
+                while remaining > 0:
+                    chunk = old.read(min(remaining, COPY_CHUNK_CHARS))
+                    if not chunk: break
+                    writer.write_raw(chunk); remaining -= len(chunk)
+                old_position = section_end
+            sections.append((path, start, writer.position, file_stat))
+        engine.write_report_footer(writer, timestamp)
+        return sections
+
+    @staticmethod
+    def _skip(stream, position, target):
+        while position < target:
+            chunk = stream.read(min(target - position, COPY_CHUNK_CHARS))
+            if not chunk: break
+            position += len(chunk)
+        return position
+
+
+class FolderWatcher:
+    # Hilo que acumula cambios y llama a `callback(rutas_modificadas, reescanear)` una sola vez por
+    # ráfaga: cuando pasan `debounce` segundos sin eventos nuevos, o como máximo `max_delay`
+    # segundos después del primero (para no esperar indefinidamente durante cambios continuos).
+    def __init__(self, engine, folder_path, callback, debounce=DEFAULT_DEBOUNCE_SECONDS, max_delay=DEFAULT_MAX_DELAY_SECONDS):
+        self.engine = engine
+        self.folder_path = folder_path
+        self.callback = callback
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="folder_analyzer_watch")
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def join(self, timeout=None):
+        if self._thread: self._thread.join(timeout)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        dirty = set(); rescan = False; first_event = last_event = None
+        try:
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+                if first_event is None: timeout = 1.0
+                else: timeout = max(0.05, min(self.debounce - (now - last_event), self.max_delay - (now - first_event)))
+                events = self._wait_events(timeout)
+                now = time.monotonic()
+                if events:
+                    event_dirty, event_rescan = events
+                    dirty |= event_dirty; rescan = rescan or event_rescan
+                    last_event = now
+                    if first_event is None: first_event = now
+                if first_event is not None and (now - last_event >= self.debounce or now - first_event >= self.max_delay):
+                    if not self._stop_event.is_set():
+                        try: self.callback(dirty, rescan)
+                        except Exception as e: print(f"Error al actualizar el reporte: {e}", file=sys.stderr)
+                    dirty = set(); rescan = False; first_event = last_event = None
+        finally:
+            self.close()
+
+    def _wait_events(self, timeout):
+        # Lo define cada modo (sondeo, inotify): espera hasta `timeout` segundos y devuelve
+        # (rutas_modificadas, reescanear), o None si no hubo cambios.
+        return None
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(FolderWatcher):
+    mode = "sondeo"
+
+    # Alternativa portable: cada `interval` segundos recorre la carpeta (solo stat, sin leer
+    # archivos) y compara tamaño y fecha de modificación con la pasada anterior. Con .gitignore
+    # también se comparan los .gitignore de las carpetas recorridas: si cambian, se reescanea.
+    def __init__(self, engine, folder_path, callback, interval=DEFAULT_POLL_INTERVAL_SECONDS, **kwargs):
+        super().__init__(engine, folder_path, callback, **kwargs)
+        self.interval = interval
+        self.snapshot = self._take_snapshot()
+        self.next_poll = time.monotonic() + interval
+
+    def _take_snapshot(self):
+        snapshot = {}
+        on_dir = self._snapshot_gitignore(snapshot) if self.engine.options.use_gitignore else None
+        for path in self.engine.iter_files(self.folder_path, on_dir=on_dir):
+            snapshot[path] = self._signature(path)
+        return snapshot
+
+    def _snapshot_gitignore(self, snapshot):
+        def on_dir(dir_path):
+            gitignore_path = os.path.join(dir_path, '.gitignore')
+            signature = self._signature(gitignore_path)
+            if signature is not None: snapshot[gitignore_path] = signature
+        return on_dir
+
+    def _signature(self, path):
+        file_stat = self.engine._stat_file(path)
+        return (file_stat.st_size, file_stat.st_mtime_ns) if file_stat else None
+
+    def _wait_events(self, timeout):
+        wait = self.next_poll - time.monotonic()
+        if wait > 0:
+            self._stop_event.wait(min(timeout, wait))
+            if time.monotonic() < self.next_poll: return None
+        self.next_poll = time.monotonic() + self.interval
+        snapshot = self._take_snapshot()
+        changed = {path for path, signature in snapshot.items() if self.snapshot.get(path, False) != signature}
+        structure_changed = snapshot.keys() != self.snapshot.keys() or any(os.path.basename(path) == '.gitignore' for path in changed)
+        self.snapshot = snapshot
+        if not changed and not structure_changed: return None
+        return changed, structure_changed
+
+
+class InotifyWatcher(FolderWatcher):
+    # Vigilancia con inotify (Linux) mediante ctypes: una marca por carpeta no ignorada. Crear,
+    # borrar o mover entradas provoca un nuevo escaneo; las modificaciones solo marcan el archivo,
+    # salvo las de un .gitignore (con .gitignore activado), que cambian qué se analiza: nuevo
+    # escaneo y marcas para las carpetas que dejaron de estar ignoradas.
+    mode = "inotify"
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    IN_ONLYDIR = 0x01000000
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+                  IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    STRUCTURE_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    def __init__(self, engine, folder_path, callback, **kwargs):
+        super().__init__(engine, folder_path, callback, **kwargs)
+        import ctypes, ctypes.util
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0: raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        self.watched = {}
+        try:
+            for _ in engine.iter_files(folder_path, on_dir=self._add_watch): pass
+        except BaseException:
+            self.close(); raise
+
+    def _add_watch(self, dir_path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dir_path), self.WATCH_MASK)
+        if wd < 0:
+            errno = self._ctypes.get_errno()
+            if errno in (2, 20): return # ENOENT/ENOTDIR: la carpeta desapareció mientras se recorría
+            raise OSError(errno, f"inotify_add_watch falló en {dir_path}")
+        self.watched[wd] = dir_path
+
+    def _wait_events(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable: return None
+        try: data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError: return None
+        dirty = set(); rescan = False; offset = 0
+        while offset + 16 <= len(data):
+            wd, mask, _cookie, name_len = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16:offset + 16 + name_len].rstrip(b"\0")
+            offset += 16 + name_len
+            if mask & self.IN_Q_OVERFLOW: rescan = True; continue
+            dir_path = self.watched.get(wd)
+            if dir_path is None: continue
+            path = os.path.join(dir_path, os.fsdecode(name)) if name else dir_path
+            if mask & self.STRUCTURE_MASK: rescan = True
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    for _ in self.engine.iter_subfolder_files(self.folder_path, path, on_dir=self._add_watch): pass
+            elif name == b'.gitignore' and self.engine.options.use_gitignore:
+                rescan = True; self._watch_unignored(dir_path)
+            else:
+                dirty.add(path)
+        return dirty, rescan
+
+    def _watch_unignored(self, dir_path):
+        # Las marcas de carpetas que pasaron a estar ignoradas se mantienen: sus eventos no afectan
+        # al reporte (el nuevo escaneo ya no las incluye).
+        if dir_path == self.folder_path:
+            for _ in self.engine.iter_files(self.folder_path, on_dir=self._add_watch): pass
+        else:
+            for _ in self.engine.iter_subfolder_files(self.folder_path, dir_path, on_dir=self._add_watch): pass
+
+    def close(self):
+        if self.fd >= 0: os.close(self.fd); self.fd = -1
+
+
+def create_watcher(engine, folder_path, callback, **kwargs):
+    # inotify en Linux; si no está disponible (otra plataforma, límite de marcas agotado), sondeo.
+    if sys.platform.startswith("linux"):
+        try: return InotifyWatcher(engine, folder_path, callback, **kwargs)
+        except (OSError, AttributeError): pass
+    return PollingWatcher(engine, folder_path, callback, **kwargs)